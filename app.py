@@ -1,28 +1,597 @@
-from fastapi import FastAPI
-from sklearn.pipeline import Pipeline
-import uvicorn
-from data_models import PredictionDataset
-import pandas as pd
-import joblib
+import time
+# start of the imports, for the startup breakdown
+imports_started = time.perf_counter()
+import os
+import json
+import logging
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from typing import TYPE_CHECKING
+from fastapi import FastAPI, HTTPException, Response, Depends, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, ValidationError
+from data_models import (PredictionDataset, FastPredictionDataset, BatchPredictionDataset,
+                         ColumnarPredictionDataset, RawTripDataset, RawTripBatchDataset)
+import numpy as np
 from pathlib import Path
+from src.serving.batching import MicroBatcher
+from src.serving.compiled_preprocessor import CompiledPreprocessor, check_parity
+from src.serving.outlier_gate import OutlierGate
+from src.serving.cache import PredictionCache
+from src.serving.lookup_table import DurationLookupTable
+from src.serving.booster import BoosterPredictor
+from src.serving.tree_predictor import ExportedModel
+from src.serving.registry import ModelBundle, ModelRegistry, VersionHeaderMiddleware, VERSION_STATE_KEY
+from src.serving.scoring import ScoringExecutor, Overloaded
+from src.serving import formats
+from src.serving.metrics import (MetricsRegistry, RequestMetricsMiddleware, BATCH_SIZE_BUCKETS,
+                                 CONTENT_TYPE as METRICS_CONTENT_TYPE)
+# pandas, joblib, sklearn, xgboost and the feature code are imported when first needed
+if TYPE_CHECKING:
+    import pandas as pd
 
-app = FastAPI()
+# time spent in every startup step, in seconds
+startup_timings = {'imports': time.perf_counter() - imports_started}
+logger = logging.getLogger("uvicorn.error")
 
 current_file_path = Path(__file__).parent
 
-model_path = current_file_path / "container_models" / "models" / "xgbreg.joblib"
-preprocessor_path = model_path.parent.parent / "transformers" / "preprocessor.joblib"
-output_transformer_path = preprocessor_path.parent / "output_transformer.joblib"
+# artifacts served when no model registry is configured
+artifacts_path = current_file_path / "container_models"
+model_name = "xgbreg.joblib"
+outliers_path = artifacts_path / "transformers" / "outliers.joblib"
+# trees of src/models/export_trees.py for INFERENCE_ENGINE=trees
+exported_model_path = Path(os.getenv("EXPORTED_MODEL_PATH", artifacts_path / "export" / "model"))
+# duration table of src/models/build_lookup_table.py for /predictions/fast
+lookup_table_path = Path(os.getenv("LOOKUP_TABLE_PATH",
+                                   current_file_path / "container_models" / "lookup" / "duration_table.npy"))
 
+# maximum number of trips accepted in a single batch request
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", 10000))
 
-model = joblib.load(model_path)
-preprocessor = joblib.load(preprocessor_path)
-output_transformer = joblib.load(output_transformer_path)
+# scoring runs on a dedicated executor: thread, or process for worker processes
+# that each hold the artifacts
+SCORING_EXECUTOR = os.getenv("SCORING_EXECUTOR", "thread")
+SCORING_WORKERS = int(os.getenv("SCORING_WORKERS", os.cpu_count()))
+# requests allowed to wait for a scoring worker, more get a 503, 0 for no limit
+SCORING_MAX_QUEUE_DEPTH = int(os.getenv("SCORING_MAX_QUEUE_DEPTH", 256))
 
-model_pipe = Pipeline(steps=[
-    ('preprocess',preprocessor),
-    ('regressor',model)
-])
+# merge concurrent single trip requests into micro-batches
+MICRO_BATCHING = os.getenv("MICRO_BATCHING", "0") == "1"
+MICRO_BATCH_MAX_SIZE = int(os.getenv("MICRO_BATCH_MAX_SIZE", 64))
+MICRO_BATCH_MAX_WAIT_MS = float(os.getenv("MICRO_BATCH_MAX_WAIT_MS", 2.0))
+
+# score with the compiled NumPy preprocessor instead of the ColumnTransformer
+FAST_PREPROCESS = os.getenv("FAST_PREPROCESS", "0") == "1"
+
+# regressor call: sklearn (XGBRegressor.predict), booster (native inplace_predict)
+# or trees (NumPy traversal of the trees exported by src/models/export_trees.py)
+INFERENCE_ENGINE = os.getenv("INFERENCE_ENGINE", "sklearn")
+# threads per prediction of the booster engine, and extra booster parameters as json
+BOOSTER_NTHREAD = int(os.getenv("BOOSTER_NTHREAD", 1))
+BOOSTER_PARAMS = json.loads(os.getenv("BOOSTER_PARAMS", "{}"))
+
+# check the coordinates against the training ranges: off, flag, reject or fallback
+OUTLIER_GATE = os.getenv("OUTLIER_GATE", "off")
+OUTLIER_FALLBACK_SPEED_KMH = float(os.getenv("OUTLIER_FALLBACK_SPEED_KMH", 14.0))
+
+# cache of predicted durations, 0 disables it
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", 0))
+PREDICTION_CACHE_TTL_S = float(os.getenv("PREDICTION_CACHE_TTL_S", 300.0))
+# decimals of the coordinates in quantized cache keys, unset for exact keys
+PREDICTION_CACHE_COORD_DECIMALS = os.getenv("PREDICTION_CACHE_COORD_DECIMALS")
+
+# directory of versioned artifacts polled for new models, see src/serving/registry.py
+MODEL_REGISTRY_PATH = os.getenv("MODEL_REGISTRY_PATH")
+MODEL_REGISTRY_POLL_S = float(os.getenv("MODEL_REGISTRY_POLL_S", 30.0))
+
+# load the artifacts after the server starts accepting connections,
+# /health/ready answers 503 until they are loaded
+BACKGROUND_LOADING = os.getenv("BACKGROUND_LOADING", "0") == "1"
+
+# order of the input features expected by the preprocessor
+FEATURE_NAMES = list(PredictionDataset.model_fields)
+
+if INFERENCE_ENGINE not in ("sklearn", "booster", "trees"):
+    raise ValueError(f"Unknown INFERENCE_ENGINE {INFERENCE_ENGINE}, expected sklearn, booster or trees")
+
+# the active model version, loaded by load_artifacts
+model_registry = ModelRegistry(registry_path=MODEL_REGISTRY_PATH,
+                               load_version=lambda path, version: load_bundle(path,version),
+                               poll_interval_s=MODEL_REGISTRY_POLL_S)
+outlier_gate = None
+lookup_table = None
+# executor of the scoring work, started by the lifespan
+scoring_executor = None
+# cached entries of every scoring process of SCORING_EXECUTOR=process
+worker_cache_sizes = {}
+
+# series of /metrics, created once so the hot path only appends to them
+metrics = MetricsRegistry()
+stage_seconds = {stage: metrics.histogram("prediction_stage_seconds",
+                                          "Time spent in every step of a prediction",stage=stage)
+                 for stage in ["parse","raw_features","features","preprocess","predict","inverse_transform"]}
+model_batch_size = metrics.histogram("model_batch_size","Rows per call of the model",
+                                     buckets=BATCH_SIZE_BUCKETS)
+scored_rows = metrics.counter("scored_rows_total","Rows scored by the model")
+artifacts_ready = threading.Event()
+artifacts_lock = threading.Lock()
+
+if PREDICTION_CACHE_SIZE > 0:
+    prediction_cache = PredictionCache(
+        feature_names=FEATURE_NAMES,
+        max_size=PREDICTION_CACHE_SIZE,
+        ttl_seconds=PREDICTION_CACHE_TTL_S,
+        coordinate_decimals=None if PREDICTION_CACHE_COORD_DECIMALS is None
+        else int(PREDICTION_CACHE_COORD_DECIMALS))
+else:
+    prediction_cache = None
+
+
+@contextmanager
+def timed(step:str, timings:dict=startup_timings):
+    # add the duration of a startup step to timings
+    started = time.perf_counter()
+    yield
+    timings[step] = time.perf_counter() - started
+
+
+def load_bundle(version_path:Path, version:str, exported_path:Path=None) -> ModelBundle:
+    """
+    Load and warm up the model artifacts of one version for the configured engines.
+
+    The trees engine with FAST_PREPROCESS only reads the memory mapped
+    exported model, without importing sklearn, xgboost or pandas.
+
+    Parameters:
+    - version_path (Path): Directory with models/, transformers/ and export/.
+    - version (str): Name of the version.
+    - exported_path (Path): Exported trees, export/model of the version by default.
+
+    Returns:
+    - ModelBundle: The loaded artifacts, checked on a probe batch.
+    """
+    bundle = ModelBundle(version=version)
+    timings = bundle.load_timings
+    exported_model = None
+    if INFERENCE_ENGINE == "trees":
+        with timed('exported_model',timings):
+            exported_model = ExportedModel.load(exported_path or version_path / "export" / "model",
+                                                mmap_mode='r')
+        bundle.regressor_engine = exported_model
+        bundle.inverse_transform_output = exported_model.inverse_transform
+
+    # the pickled artifacts are only needed outside of the trees engine with FAST_PREPROCESS
+    if INFERENCE_ENGINE != "trees" or not FAST_PREPROCESS:
+        with timed('import_joblib_sklearn',timings):
+            import joblib
+            # imported apart so the breakdown separates the import from the unpickling
+            import sklearn.compose
+        transformers_path = version_path / "transformers"
+        with timed('preprocessor',timings):
+            bundle.preprocessor = joblib.load(transformers_path / "preprocessor.joblib")
+        with timed('output_transformer',timings):
+            bundle.output_transformer = joblib.load(transformers_path / "output_transformer.joblib")
+        if bundle.inverse_transform_output is None:
+            bundle.inverse_transform_output = bundle.output_transformer.inverse_transform
+    if INFERENCE_ENGINE != "trees":
+        with timed('model',timings):
+            bundle.model = joblib.load(version_path / "models" / model_name)
+    if INFERENCE_ENGINE == "booster":
+        bundle.regressor_engine = BoosterPredictor.from_sklearn(bundle.model,nthread=BOOSTER_NTHREAD,
+                                                                params=BOOSTER_PARAMS)
+
+    if FAST_PREPROCESS and exported_model is not None:
+        # checked against the pipeline when the trees were exported
+        bundle.compiled_preprocessor = exported_model.preprocessor
+    elif FAST_PREPROCESS:
+        with timed('compiled_preprocessor',timings):
+            bundle.compiled_preprocessor = CompiledPreprocessor.from_column_transformer(bundle.preprocessor)
+            # refuse to serve if the compiled path drifts from the pipeline
+            check_parity(bundle.preprocessor, bundle.compiled_preprocessor,
+                         X=bundle.compiled_preprocessor.make_probe(), model=bundle.model)
+
+    with timed('warm_up',timings):
+        warm_up(bundle)
+    return bundle
+
+
+def warm_up(bundle:ModelBundle, n_rows:int=64):
+    # score a probe batch once so the first requests do not pay for lazy initialization
+    probe_source = bundle.compiled_preprocessor
+    if probe_source is None:
+        probe_source = CompiledPreprocessor.from_column_transformer(bundle.preprocessor)
+    X_matrix = probe_source.make_probe(n_rows=n_rows)
+    # the probe is left out of /metrics
+    if bundle.compiled_preprocessor is not None:
+        durations = run_model(bundle.compiled_preprocessor,X_matrix,bundle,record=False)
+    else:
+        import pandas as pd
+
+        durations = run_model(bundle.preprocessor,pd.DataFrame(X_matrix,columns=probe_source.input_names),
+                              bundle,record=False)
+    if not np.isfinite(durations).all():
+        raise ValueError(f"Model version {bundle.version} predicts non finite durations")
+
+
+def load_artifacts():
+    """
+    Load the active model version and the other artifacts, once per process.
+
+    The model comes from the latest version of MODEL_REGISTRY_PATH when it
+    is set, from container_models otherwise.
+    """
+    global outlier_gate, lookup_table
+
+    with artifacts_lock:
+        if artifacts_ready.is_set():
+            return
+        if MODEL_REGISTRY_PATH is not None:
+            model_registry.refresh()
+            if model_registry.active is None:
+                raise FileNotFoundError(f"No loadable model version in {MODEL_REGISTRY_PATH}")
+        else:
+            model_registry.activate(load_bundle(artifacts_path,artifacts_path.name,
+                                                exported_path=exported_model_path))
+        startup_timings.update(model_registry.active.load_timings)
+
+        if OUTLIER_GATE != "off":
+            with timed('outlier_gate'):
+                import joblib
+                outlier_gate = OutlierGate.from_outliers_remover(joblib.load(outliers_path),
+                                                                 mode=OUTLIER_GATE,
+                                                                 fallback_speed_kmh=OUTLIER_FALLBACK_SPEED_KMH)
+
+        # the table is memory mapped, the endpoint is disabled when it was not built
+        if lookup_table_path.exists():
+            with timed('lookup_table'):
+                lookup_table = DurationLookupTable.load(lookup_table_path)
+
+        artifacts_ready.set()
+        logger.info(f"Model version {model_registry.active.version}, startup breakdown: "
+                    + ", ".join(f"{step} {seconds * 1000:.0f}ms" for step, seconds in startup_timings.items()))
+
+
+def active_version():
+    return None if model_registry.active is None else model_registry.active.version
+
+
+def make_matrix(trips:list[PredictionDataset]) -> np.ndarray:
+    # rows in input order, columns in FEATURE_NAMES order
+    started = time.perf_counter()
+    X_matrix = np.array([[getattr(trip,name) for name in FEATURE_NAMES] for trip in trips],
+                        dtype=np.float64)
+    stage_seconds["features"].observe_since(started)
+    return X_matrix
+
+
+def make_dataframe(trips:list[PredictionDataset]) -> "pd.DataFrame":
+    import pandas as pd
+
+    started = time.perf_counter()
+    # one row per trip in the same order as the request
+    X_test = pd.DataFrame(
+        data = [[getattr(trip,name) for name in FEATURE_NAMES] for trip in trips],
+        columns = FEATURE_NAMES
+    )
+    stage_seconds["features"].observe_since(started)
+    return X_test
+
+
+def run_model(preprocessor, X, bundle:ModelBundle, record:bool=True) -> np.ndarray:
+    """
+    Durations in minutes of the rows of X, timing every step.
+
+    Parameters:
+    - preprocessor: The ColumnTransformer or the compiled preprocessor.
+    - X: Input features as a dataframe or a matrix the preprocessor reads.
+    - bundle (ModelBundle): The model version scoring the rows.
+    - record (bool): Add the timings and the batch size to /metrics.
+    """
+    started = time.perf_counter()
+    X_features = preprocessor.transform(X)
+    preprocessed = time.perf_counter()
+    regressor = bundle.regressor_engine if bundle.regressor_engine is not None else bundle.model
+    predictions = regressor.predict(X_features).reshape(-1,1)
+    predicted = time.perf_counter()
+    # convert the predictions back to minutes
+    output_inverse_transformed = bundle.inverse_transform_output(predictions)
+    if not record:
+        return output_inverse_transformed.ravel()
+    stage_seconds["preprocess"].observe(preprocessed - started)
+    stage_seconds["predict"].observe(predicted - preprocessed)
+    stage_seconds["inverse_transform"].observe_since(predicted)
+    model_batch_size.observe(len(predictions))
+    scored_rows.inc(len(predictions))
+    return output_inverse_transformed.ravel()
+
+
+def predict_durations(X_test:"pd.DataFrame", bundle:ModelBundle) -> np.ndarray:
+    # single vectorized pass through the preprocessor and the model
+    return run_model(bundle.preprocessor,X_test,bundle)
+
+
+def predict_durations_fast(X_matrix:np.ndarray, bundle:ModelBundle) -> np.ndarray:
+    # feature matrix built without pandas, straight into the regressor
+    return run_model(bundle.compiled_preprocessor,X_matrix,bundle)
+
+
+def score_trips(trips:list[PredictionDataset], bundle:ModelBundle) -> list[float]:
+    if bundle.compiled_preprocessor is not None:
+        return predict_durations_fast(make_matrix(trips),bundle).tolist()
+    return predict_durations(make_dataframe(trips),bundle).tolist()
+
+
+def predict_trips(trips:list[PredictionDataset]) -> tuple[str,list[float]]:
+    # one version scores the whole batch even if a new one is activated meanwhile,
+    # it is returned with the durations for the X-Model-Version header
+    bundle = model_registry.active
+    if prediction_cache is None:
+        return bundle.version, score_trips(trips,bundle)
+    # the version is part of the key so a new model never answers from old entries
+    keys = [(bundle.version,prediction_cache.make_key(trip)) for trip in trips]
+    durations = [prediction_cache.get(key) for key in keys]
+    # only the trips missing from the cache go through the model
+    missing = [ind for ind,duration in enumerate(durations) if duration is None]
+    if missing:
+        for ind,duration in zip(missing,score_trips([trips[ind] for ind in missing],bundle)):
+            durations[ind] = duration
+            prediction_cache.put(keys[ind],duration)
+    return bundle.version, durations
+
+
+def predict_batched_trips(trips:list[PredictionDataset]) -> list[tuple[str,float]]:
+    # version and duration of every trip of a micro-batch
+    version, durations = predict_trips(trips)
+    return [(version,duration) for duration in durations]
+
+
+def predict_columns(columns:dict) -> tuple[str,np.ndarray]:
+    bundle = model_registry.active
+    started = time.perf_counter()
+    if bundle.compiled_preprocessor is not None:
+        # the columns map directly onto the feature matrix
+        X_matrix = np.column_stack([np.asarray(columns[name],dtype=np.float64)
+                                    for name in FEATURE_NAMES])
+        stage_seconds["features"].observe_since(started)
+        return bundle.version, predict_durations_fast(X_matrix,bundle)
+    import pandas as pd
+
+    # the columns map directly onto the dataframe columns
+    X_test = pd.DataFrame(data={name:columns[name] for name in FEATURE_NAMES})
+    stage_seconds["features"].observe_since(started)
+    return bundle.version, predict_durations(X_test,bundle)
+
+
+def predict_columns_subset(columns:dict, index=None) -> tuple[str,np.ndarray]:
+    # score only the rows at index, or all of them for None
+    if index is None:
+        return predict_columns(columns)
+    return predict_columns({name:np.asarray(values)[index] for name,values in columns.items()})
+
+
+def make_raw_trip_features(trips:list[RawTripDataset]) -> dict:
+    from src.features.trip_features import make_trip_features
+
+    started = time.perf_counter()
+    # derive the model features on the server from the raw trip fields
+    features = make_trip_features(
+        vendor_id=[trip.vendor_id for trip in trips],
+        passenger_count=[trip.passenger_count for trip in trips],
+        pickup_longitude=[trip.pickup_longitude for trip in trips],
+        pickup_latitude=[trip.pickup_latitude for trip in trips],
+        dropoff_longitude=[trip.dropoff_longitude for trip in trips],
+        dropoff_latitude=[trip.dropoff_latitude for trip in trips],
+        pickup_datetime=[trip.pickup_datetime for trip in trips]
+    )
+    stage_seconds["raw_features"].observe_since(started)
+    return features
+
+
+def trip_columns(trips:list, names:list) -> dict:
+    # values of a few fields of every trip
+    return {name:[getattr(trip,name) for trip in trips] for name in names}
+
+
+def record_version(request:Request, version:str):
+    # the X-Model-Version header names the version that scored the trips
+    setattr(request.state,VERSION_STATE_KEY,version)
+
+
+async def predict_gated(request:Request, columns:dict, n_trips:int, predict_subset) -> dict:
+    """
+    Score a batch through the outlier gate.
+
+    Parameters:
+    - request (Request): The request, records the version that scored the trips.
+    - columns (dict): Coordinates and haversine distance of every trip.
+    - n_trips (int): Number of trips in the batch.
+    - predict_subset (callable): Awaitable version and durations of the
+      trips at the given positions, or of all the trips for None.
+
+    Returns:
+    - dict: The response body, durations of rejected trips are null.
+    """
+    async def score(index):
+        version, durations = await predict_subset(index)
+        record_version(request,version)
+        return np.asarray(durations,dtype=np.float64)
+
+    if outlier_gate is None:
+        return {"durations": (await score(None)).tolist()}
+    in_range = outlier_gate.check(columns)
+    if not outlier_gate.short_circuits or in_range.all():
+        durations = await score(None)
+    else:
+        # only the trips within range go through the model
+        durations = np.full(n_trips,np.nan)
+        in_range_index = np.flatnonzero(in_range)
+        if len(in_range_index):
+            durations[in_range_index] = await score(in_range_index)
+        if outlier_gate.mode == "fallback":
+            durations[~in_range] = outlier_gate.fallback_durations(
+                np.asarray(columns["haversine_distance"])[~in_range])
+    return {"durations": [None if np.isnan(duration) else duration
+                          for duration in durations.tolist()],
+            "out_of_range": (~in_range).tolist()}
+
+
+batcher = MicroBatcher(predict_fn=predict_batched_trips,
+                       max_batch_size=MICRO_BATCH_MAX_SIZE,
+                       max_wait_ms=MICRO_BATCH_MAX_WAIT_MS) if MICRO_BATCHING else None
+
+
+def collect_worker_report() -> dict:
+    # metrics and cache counters recorded in a scoring process since its last report
+    report = {'pid': os.getpid(), 'metrics': metrics.take()}
+    if prediction_cache is not None:
+        report['cache'] = prediction_cache.take_counts()
+        report['cache_size'] = prediction_cache.summary()['size']
+    return report
+
+
+def apply_worker_report(report:dict):
+    # add what a scoring process recorded to the series and counters of /metrics and /stats
+    metrics.add(report['metrics'])
+    if 'cache' in report:
+        prediction_cache.add_counts(report['cache'])
+        worker_cache_sizes[report['pid']] = report['cache_size']
+
+
+def init_scoring_process():
+    # worker process of SCORING_EXECUTOR=process, already loaded when forked after the parent
+    load_artifacts()
+    model_registry.start()
+    # drop the values copied from the parent, it reports them itself
+    collect_worker_report()
+
+
+def load_artifacts_in_background():
+    try:
+        load_artifacts()
+    except Exception:
+        # the service stays alive but never becomes ready
+        logger.exception("Loading the model artifacts failed")
+
+
+@asynccontextmanager
+async def lifespan(app:FastAPI):
+    global scoring_executor
+    if BACKGROUND_LOADING:
+        threading.Thread(target=load_artifacts_in_background,daemon=True).start()
+    else:
+        load_artifacts()
+    # every worker process polls for new model versions on its own
+    model_registry.start()
+    scoring_executor = ScoringExecutor(kind=SCORING_EXECUTOR,max_workers=SCORING_WORKERS,
+                                       max_queue_depth=SCORING_MAX_QUEUE_DEPTH,
+                                       initializer=init_scoring_process,
+                                       collect_report=collect_worker_report,
+                                       apply_report=apply_worker_report)
+    if batcher is not None:
+        batcher.call = scoring_executor.call
+        # one batch per scoring worker at a time
+        batcher.max_concurrent_batches = scoring_executor.max_workers
+        await batcher.start()
+    yield
+    if batcher is not None:
+        await batcher.stop()
+    scoring_executor.shutdown()
+    model_registry.stop()
+
+
+app = FastAPI(lifespan=lifespan)
+# every response carries the X-Model-Version header
+app.add_middleware(VersionHeaderMiddleware,get_version=active_version)
+# request counts and latency per endpoint and status for /metrics
+app.add_middleware(RequestMetricsMiddleware,registry=metrics)
+
+
+def check_batch_size(batch_size:int):
+    if batch_size > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413,
+                            detail=f"Batch of {batch_size} trips exceeds the limit of {MAX_BATCH_SIZE}")
+
+@app.exception_handler(Overloaded)
+async def shed_load(request, error:Overloaded):
+    # tell the client to retry instead of queueing without bound
+    return JSONResponse(status_code=503,content={"detail":f"Service overloaded, {error}"},
+                        headers={"Retry-After":"1"})
+
+
+def negotiate(request:Request) -> tuple[str,str]:
+    # formats of the request body and of the response, JSON by default
+    try:
+        request_format = formats.request_format(request.headers.get("content-type"))
+    except formats.UnsupportedFormat as error:
+        raise HTTPException(status_code=415,detail=str(error))
+    try:
+        response_format = formats.response_format(request.headers.get("accept"),default=request_format)
+    except formats.UnsupportedFormat as error:
+        raise HTTPException(status_code=406,detail=str(error))
+    return request_format, response_format
+
+
+def parse_json(model:type[BaseModel], body:bytes):
+    # same 422 response as a body parsed by FastAPI
+    started = time.perf_counter()
+    try:
+        parsed = model.model_validate_json(body)
+    except ValidationError as error:
+        raise RequestValidationError(error.errors(include_url=False))
+    stage_seconds["parse"].observe_since(started)
+    return parsed
+
+
+def read_columns(body:bytes, request_format:str) -> dict:
+    # feature columns of an Arrow or msgpack body
+    started = time.perf_counter()
+    try:
+        columns = formats.decode_columns(body,request_format,FEATURE_NAMES)
+    except formats.UnsupportedFormat as error:
+        raise HTTPException(status_code=415,detail=str(error))
+    except ValueError as error:
+        raise HTTPException(status_code=422,detail=str(error))
+    stage_seconds["parse"].observe_since(started)
+    return columns
+
+
+def format_response(body:dict, response_format:str):
+    if response_format == formats.JSON:
+        return body
+    try:
+        content = formats.encode_response(body,response_format)
+    except formats.UnsupportedFormat as error:
+        raise HTTPException(status_code=406,detail=str(error))
+    return Response(content=content,media_type=response_format)
+
+
+def request_body_schema(model:type[BaseModel], binary_formats:bool=True) -> dict:
+    # documents the JSON schema and the binary formats of a body read from the request
+    schema = model.model_json_schema(ref_template="#/components/schemas/{model}")
+    schema.pop("$defs",None)
+    content = {formats.JSON: {"schema": schema}}
+    if binary_formats:
+        binary = {"schema": {"type": "string", "format": "binary"}}
+        content.update({formats.ARROW: binary, formats.MSGPACK: binary})
+    return {"requestBody": {"required": True, "content": content}}
+
+
+async def predict_binary(request:Request, body:bytes, request_format:str) -> dict:
+    # binary bodies are columnar whatever their layout
+    columns = read_columns(body,request_format)
+    n_trips = len(columns[FEATURE_NAMES[0]])
+    check_batch_size(n_trips)
+    if n_trips == 0:
+        return {"durations": []}
+    return await predict_gated(request,columns,n_trips,
+                               lambda index: scoring_executor.run(predict_columns_subset,columns,index))
+
+
+def require_artifacts():
+    if not artifacts_ready.is_set():
+        raise HTTPException(status_code=503,detail="Model artifacts are still loading")
 
 # Get -> get some response from API
 # Post -> sending something to API
@@ -31,36 +600,195 @@ model_pipe = Pipeline(steps=[
 def home():
     return "Welcome to taxi price prediction app"
 
-@app.post('/predictions')
-def do_predictions(test_data:PredictionDataset):
-    X_test = pd.DataFrame(
-        data = {
-            'vendor_id':test_data.vendor_id,
-            'passenger_count':test_data.passenger_count,
-            'pickup_longitude':test_data.pickup_longitude,
-            'pickup_latitude':test_data.pickup_latitude,
-            'dropoff_longitude':test_data.dropoff_longitude,
-            'dropoff_latitude':test_data.dropoff_latitude,
-            'pickup_hour':test_data.pickup_hour,
-            'pickup_date':test_data.pickup_date,
-            'pickup_month':test_data.pickup_month,
-            'pickup_day':test_data.pickup_day,
-            'is_weekend':test_data.is_weekend,
-            'haversine_distance':test_data.haversine_distance,
-            'euclidean_distance':test_data.euclidean_distance,
-            'manhattan_distance':test_data.manhattan_distance
-         }, index=[0]
-    )
+async def predict_single(test_data:PredictionDataset, request:Request, response:Response) -> str:
+    # one trip through the outlier gate and the micro-batcher or the scoring executor
+    if outlier_gate is not None:
+        in_range = bool(outlier_gate.check(trip_columns([test_data],outlier_gate.column_names))[0])
+        response.headers["X-Out-Of-Range"] = str(not in_range).lower()
+        if not in_range and outlier_gate.mode == "reject":
+            raise HTTPException(status_code=422,
+                                detail="Trip coordinates are outside the range seen in training")
+        if not in_range and outlier_gate.mode == "fallback":
+            fallback_duration = outlier_gate.fallback_durations([test_data.haversine_distance])[0]
+            return f"Trip duration for the trip is {fallback_duration:.2f} minutes"
 
-    predictions = model_pipe.predict(X_test).reshape(-1,1)
+    if batcher is not None:
+        async with scoring_executor.admit():
+            version, output_inverse_transformed = await batcher.submit(test_data)
+    else:
+        version, (output_inverse_transformed,) = await scoring_executor.run(predict_trips,[test_data])
+    record_version(request,version)
 
-    output_inverse_transformed = output_transformer.inverse_transform(predictions)[0].item()
-    
-    
     return f"Trip duration for the trip is {output_inverse_transformed:.2f} minutes"
 
 
+@app.post('/predictions',dependencies=[Depends(require_artifacts)],
+          openapi_extra=request_body_schema(PredictionDataset,binary_formats=False))
+async def do_predictions(request:Request, response:Response):
+    # parsed here rather than by FastAPI so the parse stage is timed
+    test_data = parse_json(PredictionDataset,await request.body())
+    return await predict_single(test_data,request,response)
+
+
+@app.post('/predictions/fast',dependencies=[Depends(require_artifacts)])
+async def do_fast_predictions(test_data:FastPredictionDataset):
+    if lookup_table is None:
+        raise HTTPException(status_code=503,
+                            detail=f"Lookup table not found at {lookup_table_path}")
+    if test_data.vendor_id not in lookup_table.vendor_ids:
+        raise HTTPException(status_code=422,
+                            detail=f"vendor_id must be one of {lookup_table.vendor_ids}")
+    duration = lookup_table.lookup({name:[value] for name,value in test_data.model_dump().items()})[0]
+
+    return f"Trip duration for the trip is {duration:.2f} minutes"
+
+
+@app.post('/predictions/batch',dependencies=[Depends(require_artifacts)],
+          openapi_extra=request_body_schema(BatchPredictionDataset))
+async def do_batch_predictions(request:Request):
+    request_format, response_format = negotiate(request)
+    body = await request.body()
+    if request_format != formats.JSON:
+        return format_response(await predict_binary(request,body,request_format),response_format)
+
+    test_data = parse_json(BatchPredictionDataset,body)
+    check_batch_size(len(test_data.trips))
+    if not test_data.trips:
+        return format_response({"durations": []},response_format)
+
+    trips = test_data.trips
+    gate_columns = trip_columns(trips,outlier_gate.column_names + ["haversine_distance"]) \
+        if outlier_gate is not None else None
+
+    return format_response(await predict_gated(request,gate_columns,len(trips),
+                                               lambda index: scoring_executor.run(
+                                                   predict_trips,trips if index is None
+                                                   else [trips[i] for i in index])),
+                           response_format)
+
+
+@app.post('/predictions/columnar',dependencies=[Depends(require_artifacts)],
+          openapi_extra=request_body_schema(ColumnarPredictionDataset))
+async def do_columnar_predictions(request:Request):
+    request_format, response_format = negotiate(request)
+    body = await request.body()
+    if request_format != formats.JSON:
+        return format_response(await predict_binary(request,body,request_format),response_format)
+
+    test_data = parse_json(ColumnarPredictionDataset,body)
+    check_batch_size(len(test_data))
+    if len(test_data) == 0:
+        return format_response({"durations": []},response_format)
+
+    columns = {name:getattr(test_data,name) for name in FEATURE_NAMES}
+
+    return format_response(await predict_gated(request,columns,len(test_data),
+                                               lambda index: scoring_executor.run(
+                                                   predict_columns_subset,columns,index)),
+                           response_format)
+
+
+@app.post('/predictions/raw',dependencies=[Depends(require_artifacts)],
+          openapi_extra=request_body_schema(RawTripDataset,binary_formats=False))
+async def do_raw_predictions(request:Request, response:Response):
+    test_data = parse_json(RawTripDataset,await request.body())
+    features = await scoring_executor.run(make_raw_trip_features,[test_data])
+    # continue as a regular single trip request so micro-batching applies
+    trip = PredictionDataset.model_construct(**{name:values[0].item()
+                                                for name,values in features.items()})
+    return await predict_single(trip,request,response)
+
+
+@app.post('/predictions/raw/batch',dependencies=[Depends(require_artifacts)],
+          openapi_extra=request_body_schema(RawTripBatchDataset,binary_formats=False))
+async def do_raw_batch_predictions(request:Request):
+    test_data = parse_json(RawTripBatchDataset,await request.body())
+    check_batch_size(len(test_data.trips))
+    if not test_data.trips:
+        return {"durations": []}
+
+    columns = await scoring_executor.run(make_raw_trip_features,test_data.trips)
+
+    return await predict_gated(request,columns,len(test_data.trips),
+                               lambda index: scoring_executor.run(predict_columns_subset,columns,index))
+
+
+@app.get('/health/live')
+def liveness():
+    # the process is up and serving requests
+    return {"status": "alive"}
+
+
+@app.get('/health/ready')
+def readiness(response:Response):
+    # the artifacts are loaded and predictions can be served
+    if not artifacts_ready.is_set():
+        response.status_code = 503
+        return {"status": "loading"}
+    return {"status": "ready",
+            "startup_ms": {step: round(seconds * 1000, 1) for step, seconds in startup_timings.items()}}
+
+
+@app.get('/metrics')
+def prometheus_metrics():
+    # Prometheus text format, the series of this process only
+    return Response(content=metrics.render(),media_type=METRICS_CONTENT_TYPE)
+
+
+@app.get('/stats/model')
+def model_stats():
+    return model_registry.summary()
+
+
+@app.get('/stats/scoring')
+def scoring_stats():
+    return scoring_executor.summary()
+
+
+@app.get('/stats/batching')
+def batching_stats():
+    if batcher is None:
+        return {"enabled": False}
+    return {"enabled": True,
+            "configured_max_batch_size": batcher.max_batch_size,
+            "max_wait_ms": batcher.max_wait_ms,
+            **batcher.stats.summary()}
+
+
+@app.get('/stats/cache')
+def cache_stats():
+    if prediction_cache is None:
+        return {"enabled": False}
+    summary = prediction_cache.summary()
+    if worker_cache_sizes:
+        # with scoring processes every one of them holds its own entries
+        summary['size'] = sum(worker_cache_sizes.values())
+    return {"enabled": True, **summary}
+
+
+@app.get('/stats/outliers')
+def outlier_stats():
+    if outlier_gate is None:
+        return {"enabled": False}
+    return {"enabled": True, **outlier_gate.summary()}
+
+
 if __name__ == "__main__":
-    uvicorn.run(app="app:app",
-                host="0.0.0.0",
-                port=8000)
+    # number of worker processes, more than one serves with a pre-forked pool
+    WORKERS = int(os.getenv("WORKERS", 1))
+    # load the artifacts once before forking so the workers share them
+    PREFORK_PRELOAD = os.getenv("PREFORK_PRELOAD", "1") == "1"
+    PORT = int(os.getenv("PORT", 8000))
+
+    if WORKERS > 1:
+        import sys
+        from src.serving import prefork
+
+        prefork.serve(sys.modules[__name__],host="0.0.0.0",port=PORT,workers=WORKERS,
+                      preload=PREFORK_PRELOAD)
+    else:
+        import uvicorn
+
+        uvicorn.run(app="app:app",
+                    host="0.0.0.0",
+                    port=PORT)
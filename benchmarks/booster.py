@@ -0,0 +1,36 @@
+import joblib
+import numpy as np
+from time import perf_counter
+from src.serving.booster import BoosterPredictor
+from src.serving.compiled_preprocessor import CompiledPreprocessor
+from benchmarks.server import root_path
+
+
+def benchmark(model, X: np.ndarray, repeats: int = 2000, nthread: int = 1) -> dict:
+    """
+    Time single row predictions of the sklearn wrapper against the booster
+    and check that both give the same values on X.
+    """
+    booster_predictor = BoosterPredictor.from_sklearn(model, nthread=nthread)
+    np.testing.assert_array_equal(model.predict(X), booster_predictor.predict(X))
+
+    timings = {}
+    for name, predict in [('sklearn', model.predict), ('booster', booster_predictor.predict)]:
+        start = perf_counter()
+        for ind in range(repeats):
+            predict(X[ind % len(X)][None, :])
+        timings[f'{name}_us'] = (perf_counter() - start) / repeats * 1e6
+    timings['speedup'] = timings['sklearn_us'] / timings['booster_us']
+    return timings
+
+
+if __name__ == "__main__":
+    # single row latency with the artifacts shipped with the container
+    artifacts_path = root_path / 'container_models'
+    preprocessor = joblib.load(artifacts_path / 'transformers' / 'preprocessor.joblib')
+    model = joblib.load(artifacts_path / 'models' / 'xgbreg.joblib')
+    compiled = CompiledPreprocessor.from_column_transformer(preprocessor)
+    X = compiled.transform(compiled.make_probe(n_rows=1000))
+    timings = benchmark(model, X)
+    print(f"single row: sklearn {timings['sklearn_us']:.0f}us, "
+          f"booster {timings['booster_us']:.0f}us, speedup {timings['speedup']:.1f}x")
@@ -0,0 +1,72 @@
+import os
+import sys
+import json
+import subprocess
+from time import perf_counter
+from statistics import median
+from benchmarks.server import root_path
+
+# modules app.py imported at module level before the artifacts were loaded lazily
+EAGER_IMPORTS = ['sklearn.pipeline', 'uvicorn', 'pandas', 'joblib', 'xgboost',
+                 'src.features.trip_features']
+
+# configurations compared by the benchmark, as environment variables of the service
+# and modules imported before the app, `eager` is the startup before lazy loading
+CONFIGURATIONS = {'eager': ({'INFERENCE_ENGINE': 'sklearn', 'FAST_PREPROCESS': '0'}, EAGER_IMPORTS),
+                  'sklearn': ({'INFERENCE_ENGINE': 'sklearn', 'FAST_PREPROCESS': '0'}, []),
+                  'trees_fast': ({'INFERENCE_ENGINE': 'trees', 'FAST_PREPROCESS': '1'}, [])}
+
+# imports the app and loads its artifacts in a fresh interpreter
+STARTUP_SCRIPT = """
+import json, time, warnings, importlib
+warnings.filterwarnings('ignore')
+started = time.perf_counter()
+modules = {eager_imports!r}
+for module in modules:
+    importlib.import_module(module)
+eager_seconds = time.perf_counter() - started
+import app
+app.load_artifacts()
+timings = dict(app.startup_timings, total=time.perf_counter() - started)
+if modules:
+    timings['eager_imports'] = eager_seconds
+print(json.dumps(timings))
+"""
+
+
+def measure_cold_start(env: dict, repeats: int = 5, eager_imports: list = ()) -> dict:
+    """
+    Median time of every startup step over `repeats` fresh processes, in ms.
+
+    Parameters:
+    - env (dict): Environment variables of the service.
+    - repeats (int): Number of processes started.
+    - eager_imports (list): Modules imported before the app, as the service
+      did before the artifacts were loaded lazily.
+
+    Returns:
+    - dict: Step name to median milliseconds, `total` covers the whole
+      import and load and `process` includes the interpreter start.
+    """
+    runs = []
+    for _ in range(repeats):
+        start = perf_counter()
+        script = STARTUP_SCRIPT.format(eager_imports=list(eager_imports))
+        result = subprocess.run([sys.executable, '-c', script], cwd=root_path,
+                                env=dict(os.environ, **env), capture_output=True,
+                                text=True, check=True)
+        timings = json.loads(result.stdout.strip().splitlines()[-1])
+        timings['process'] = perf_counter() - start
+        runs.append(timings)
+    steps = dict.fromkeys(step for timings in runs for step in timings)
+    return {step: median(timings.get(step, 0.0) for timings in runs) * 1000 for step in steps}
+
+
+if __name__ == "__main__":
+    # cold start of the eager baseline, the default service and the trees engine with the compiled preprocessor
+    for name, (env, eager_imports) in CONFIGURATIONS.items():
+        timings = measure_cold_start(env, eager_imports=eager_imports)
+        breakdown = ', '.join(f'{step} {ms:.0f}ms' for step, ms in timings.items()
+                              if step not in ('total', 'process'))
+        print(f"{name}: process {timings['process']:.0f}ms, import and load {timings['total']:.0f}ms "
+              f"({breakdown})")
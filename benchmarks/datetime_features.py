@@ -0,0 +1,53 @@
+import sys
+import numpy as np
+import pandas as pd
+from time import perf_counter
+from src.features.datetime_features import make_datetime_columns, DATETIME_FEATURE_NAMES
+
+
+def datetime_features_apply(dataframe: pd.DataFrame) -> pd.DataFrame:
+    # previous row-wise implementation of the datetime features
+    new_dataframe = dataframe.copy()
+    new_dataframe['pickup_datetime'] = pd.to_datetime(new_dataframe['pickup_datetime'])
+    new_dataframe.loc[:, 'pickup_hour'] = new_dataframe['pickup_datetime'].dt.hour
+    new_dataframe.loc[:, 'pickup_date'] = new_dataframe['pickup_datetime'].dt.day
+    new_dataframe.loc[:, 'pickup_month'] = new_dataframe['pickup_datetime'].dt.month
+    new_dataframe.loc[:, 'pickup_day'] = new_dataframe['pickup_datetime'].dt.weekday
+    new_dataframe.loc[:, 'is_weekend'] = new_dataframe.apply(lambda row: row['pickup_day'] >= 5,
+                                                             axis=1).astype('int')
+    return new_dataframe.drop(columns=['pickup_datetime'])
+
+
+def benchmark(n_rows: int = 1_000_000, seed: int = 42) -> dict:
+    """
+    Time the vectorized features against the previous row-wise implementation
+    on random pickup times and check that both give the same values.
+    """
+    rng = np.random.default_rng(seed)
+    seconds = rng.integers(0, 366 * 24 * 3600, size=n_rows)
+    pickup_datetime = (np.datetime64('2016-01-01T00:00:00') + seconds).astype(str)
+    dataframe = pd.DataFrame({'pickup_datetime': np.char.replace(pickup_datetime, 'T', ' ')})
+
+    start = perf_counter()
+    expected = datetime_features_apply(dataframe)
+    apply_seconds = perf_counter() - start
+
+    start = perf_counter()
+    columns = make_datetime_columns(dataframe['pickup_datetime'])
+    vectorized_seconds = perf_counter() - start
+
+    for name in DATETIME_FEATURE_NAMES:
+        np.testing.assert_array_equal(expected[name].to_numpy(), columns[name])
+
+    return {'rows': n_rows,
+            'apply_seconds': apply_seconds,
+            'vectorized_seconds': vectorized_seconds,
+            'speedup': apply_seconds / vectorized_seconds}
+
+
+if __name__ == "__main__":
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    results = benchmark(n_rows=n_rows)
+    print(f"{results['rows']} rows: row-wise apply {results['apply_seconds']:.2f}s, "
+          f"vectorized {results['vectorized_seconds']:.3f}s, "
+          f"speedup {results['speedup']:.0f}x")
@@ -0,0 +1,66 @@
+import json
+import http.client
+import numpy as np
+from time import perf_counter
+from data_models import PredictionDataset
+from src.serving.formats import JSON, MSGPACK, ARROW
+from benchmarks.server import running_app
+
+
+def make_bodies(n_rows: int, seed: int = 0) -> dict:
+    # the same random trips as a JSON batch, a JSON columnar body, msgpack and Arrow
+    import pyarrow
+    import msgpack
+
+    feature_names = list(PredictionDataset.model_fields)
+    rng = np.random.default_rng(seed)
+    columns = {name: rng.integers(0, 5, n_rows).tolist() for name in feature_names}
+    for name in ['pickup_longitude', 'dropoff_longitude']:
+        columns[name] = rng.uniform(-74.0, -73.9, n_rows).tolist()
+    for name in ['pickup_latitude', 'dropoff_latitude']:
+        columns[name] = rng.uniform(40.7, 40.8, n_rows).tolist()
+    for name in ['haversine_distance', 'euclidean_distance', 'manhattan_distance']:
+        columns[name] = rng.uniform(0.0, 10.0, n_rows).tolist()
+    columns['vendor_id'] = rng.integers(1, 3, n_rows).tolist()
+    columns['passenger_count'] = rng.integers(1, 7, n_rows).tolist()
+    trips = [{name: columns[name][ind] for name in feature_names} for ind in range(n_rows)]
+    table = pyarrow.table(columns)
+    sink = pyarrow.BufferOutputStream()
+    with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return {'json_batch': ('/predictions/batch', JSON, json.dumps({'trips': trips}).encode()),
+            'json_columnar': ('/predictions/columnar', JSON, json.dumps(columns).encode()),
+            'msgpack': ('/predictions/columnar', MSGPACK, msgpack.packb(columns)),
+            'arrow': ('/predictions/columnar', ARROW, sink.getvalue().to_pybytes())}
+
+
+def benchmark(n_rows: int = 10000, repeats: int = 20, port: int = 8100) -> dict:
+    """
+    Rows per second of batch requests of n_rows trips in every format,
+    answered in the same format, against `python app.py` started with
+    the current environment.
+    """
+    bodies = make_bodies(n_rows)
+    with running_app(port, MAX_BATCH_SIZE=str(n_rows)):
+        connection = http.client.HTTPConnection("127.0.0.1", port)
+        rows_per_s = {}
+        for name, (path, fmt, body) in bodies.items():
+            headers = {"Content-Type": fmt, "Accept": fmt}
+            timings = []
+            for _ in range(repeats):
+                start = perf_counter()
+                connection.request("POST", path, body=body, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                timings.append(perf_counter() - start)
+                if response.status != 200:
+                    raise RuntimeError(f"{name} request failed with status {response.status}")
+            rows_per_s[name] = n_rows / float(np.median(timings))
+        connection.close()
+    return rows_per_s
+
+
+if __name__ == "__main__":
+    # request formats compared on batches of 10000 trips
+    for name, rows_per_s in benchmark().items():
+        print(f"{name}: {rows_per_s:,.0f} rows/s")
@@ -0,0 +1,34 @@
+from time import perf_counter
+from src.serving.metrics import MetricsRegistry
+
+
+def instrumentation_overhead(repeats: int = 100000, observations: int = 8) -> dict:
+    """
+    Microseconds spent on the instrumentation of one request: one counter
+    increment and `observations` timed histogram observations, about what
+    the service records for a scored request.
+    """
+    registry = MetricsRegistry()
+    counter = registry.counter("requests_total", "requests")
+    histograms = [registry.histogram("stage_seconds", "stage", stage=str(ind))
+                  for ind in range(observations)]
+    start = perf_counter()
+    for _ in range(repeats):
+        counter.inc()
+        for histogram in histograms:
+            histogram.observe_since(perf_counter())
+    per_request = (perf_counter() - start) / repeats * 1e6
+    render_repeats = max(1, repeats // 100)
+    start = perf_counter()
+    for _ in range(render_repeats):
+        registry.render()
+    return {'per_request_us': per_request,
+            'per_observation_us': per_request / (observations + 1),
+            'render_us': (perf_counter() - start) / render_repeats * 1e6}
+
+
+if __name__ == "__main__":
+    overhead = instrumentation_overhead()
+    print(f"instrumentation per request {overhead['per_request_us']:.2f}us, "
+          f"per observation {overhead['per_observation_us']:.2f}us, "
+          f"rendering /metrics {overhead['render_us']:.0f}us")
@@ -0,0 +1,73 @@
+import os
+import json
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from benchmarks.server import TRIP, running_app
+
+
+def process_memory(pid: int) -> dict:
+    """
+    Resident memory of a process in MiB from /proc/<pid>/smaps_rollup (Linux).
+
+    `rss` counts the shared pages in full, `pss` splits them between the
+    processes that map them and `private` is what the process alone holds.
+    """
+    fields = {}
+    for line in Path(f"/proc/{pid}/smaps_rollup").read_text().splitlines()[1:]:
+        name, value = line.split(":", 1)
+        fields[name] = int(value.split()[0]) / 1024
+    return {'rss': fields['Rss'],
+            'pss': fields['Pss'],
+            'private': fields['Private_Clean'] + fields['Private_Dirty']}
+
+
+def post_requests(port: int, body: bytes, seconds: float) -> int:
+    # one keep-alive client posting single trips for the given time
+    import http.client
+    from time import perf_counter
+
+    connection = http.client.HTTPConnection("127.0.0.1", port)
+    headers = {"Content-Type": "application/json"}
+    requests_sent = 0
+    deadline = perf_counter() + seconds
+    while perf_counter() < deadline:
+        connection.request("POST", "/predictions", body=body, headers=headers)
+        connection.getresponse().read()
+        requests_sent += 1
+    connection.close()
+    return requests_sent
+
+
+def benchmark(workers: int, preload: bool, port: int = 8100, clients: int = 8,
+              seconds: float = 10.0) -> dict:
+    """
+    Start `python app.py` with `workers` processes, measure the memory of
+    every worker and the single trip throughput of `clients` concurrent
+    keep-alive clients.
+    """
+    body = json.dumps(TRIP).encode()
+    with running_app(port, WORKERS=str(workers), PREFORK_PRELOAD="1" if preload else "0") as server:
+        with ProcessPoolExecutor(clients) as executor:
+            counts = list(executor.map(post_requests, [port] * clients, [body] * clients,
+                                       [seconds] * clients))
+        # the workers are the children of the server process in prefork mode
+        children_path = Path(f"/proc/{server.pid}/task/{server.pid}/children")
+        pids = [int(pid) for pid in children_path.read_text().split()] or [server.pid]
+        memory = [process_memory(pid) for pid in pids]
+    return {'workers': workers,
+            'preload': preload,
+            'requests_per_s': sum(counts) / seconds,
+            'worker_rss_mib': sum(m['rss'] for m in memory) / len(memory),
+            'worker_pss_mib': sum(m['pss'] for m in memory) / len(memory),
+            'worker_private_mib': sum(m['private'] for m in memory) / len(memory)}
+
+
+if __name__ == "__main__":
+    # memory and throughput of 1, 2 and 4 workers, with and without preloading
+    print(f"{os.cpu_count()} cores")
+    for workers, preload in [(1, True), (2, True), (2, False), (4, True), (4, False)]:
+        result = benchmark(workers, preload)
+        print(f"workers {workers}, preload {preload}: {result['requests_per_s']:.0f} requests/s, "
+              f"per worker rss {result['worker_rss_mib']:.0f} MiB, "
+              f"pss {result['worker_pss_mib']:.0f} MiB, "
+              f"private {result['worker_private_mib']:.0f} MiB")
@@ -0,0 +1,76 @@
+import json
+import asyncio
+import numpy as np
+from time import perf_counter
+from benchmarks.server import TRIP, running_app
+
+
+async def post_trip(reader, writer, request: bytes) -> tuple:
+    # one request on a keep-alive connection, returns the status and headers
+    writer.write(request)
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("Connection closed by the server")
+    headers = {}
+    while (line := await reader.readline()) not in (b"\r\n", b""):
+        name, value = line.decode().split(":", 1)
+        headers[name.strip().lower()] = value.strip()
+    await reader.readexactly(int(headers.get("content-length", 0)))
+    return int(status_line.split()[1]), headers
+
+
+async def spike(port: int, concurrency: int, seconds: float) -> dict:
+    """
+    Send single trips from `concurrency` clients at once for `seconds` and
+    collect the latency of the answered requests, the number shed and the
+    number of connection errors. The clients speak plain HTTP/1.1 on asyncio
+    streams so they take little CPU from the server.
+    """
+    body = json.dumps(TRIP).encode()
+    request = (f"POST /predictions HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\n"
+               f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n").encode() + body
+    latencies, shed, errors = [], 0, 0
+    deadline = perf_counter() + seconds
+
+    async def send():
+        nonlocal shed, errors
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        while perf_counter() < deadline:
+            start = perf_counter()
+            try:
+                status, headers = await post_trip(reader, writer, request)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                errors += 1
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                continue
+            if status == 503:
+                shed += 1
+                # back off like a client honouring Retry-After
+                await asyncio.sleep(float(headers.get("retry-after", 1)))
+            else:
+                latencies.append(perf_counter() - start)
+        writer.close()
+
+    await asyncio.gather(*[send() for _ in range(concurrency)])
+    latencies_ms = np.array(latencies) * 1000
+    return {'answered_per_s': len(latencies) / seconds,
+            'shed': shed,
+            'errors': errors,
+            'p50_ms': float(np.percentile(latencies_ms, 50)),
+            'p99_ms': float(np.percentile(latencies_ms, 99))}
+
+
+def benchmark(max_queue_depth: int, concurrency: int = 128, seconds: float = 10.0,
+              port: int = 8100, workers: int = 1) -> dict:
+    # start `python app.py` with the given queue limit and send it a spike of requests
+    with running_app(port, SCORING_WORKERS=str(workers),
+                     SCORING_MAX_QUEUE_DEPTH=str(max_queue_depth)):
+        return asyncio.run(spike(port, concurrency, seconds))
+
+
+if __name__ == "__main__":
+    # latency of the answered requests under a spike, without and with a queue limit
+    for max_queue_depth in [0, 8]:
+        result = benchmark(max_queue_depth)
+        print(f"max queue depth {max_queue_depth}: {result['answered_per_s']:.0f} answered/s, "
+              f"{result['shed']} shed, {result['errors']} errors, p50 {result['p50_ms']:.0f}ms, p99 {result['p99_ms']:.0f}ms")
@@ -0,0 +1,42 @@
+import os
+import sys
+import subprocess
+import urllib.request
+from time import sleep
+from pathlib import Path
+from contextlib import contextmanager
+
+# root of the repository, where app.py is started from
+root_path = Path(__file__).parent.parent
+
+# single trip posted by the load generators
+TRIP = {"vendor_id": 1, "passenger_count": 1, "pickup_longitude": -73.98,
+        "pickup_latitude": 40.75, "dropoff_longitude": -73.96, "dropoff_latitude": 40.77,
+        "pickup_hour": 10, "pickup_date": 5, "pickup_month": 3, "pickup_day": 2,
+        "is_weekend": 0, "haversine_distance": 2.5, "euclidean_distance": 0.03,
+        "manhattan_distance": 0.04}
+
+
+@contextmanager
+def running_app(port: int, **env):
+    """
+    Start `python app.py` on `port` with the current environment updated by
+    `env`, wait until it is ready and stop it on exit.
+
+    Yields:
+    - subprocess.Popen: The server process.
+    """
+    server = subprocess.Popen([sys.executable, "app.py"], cwd=root_path,
+                              env=dict(os.environ, PORT=str(port), **env),
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        for _ in range(600):
+            try:
+                urllib.request.urlopen(f"http://127.0.0.1:{port}/health/ready")
+                break
+            except OSError:
+                sleep(0.1)
+        yield server
+    finally:
+        server.terminate()
+        server.wait()
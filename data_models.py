@@ -1,4 +1,9 @@
-from pydantic import BaseModel
+from datetime import datetime
+from zoneinfo import ZoneInfo
+from pydantic import BaseModel, Field, field_validator, model_validator
+
+# pickup times in the training data are local NYC times
+NYC_TIMEZONE = ZoneInfo('America/New_York')
 
 
 class PredictionDataset(BaseModel):
@@ -16,3 +21,69 @@ class PredictionDataset(BaseModel):
     haversine_distance: float
     euclidean_distance: float
     manhattan_distance: float
+
+
+class FastPredictionDataset(BaseModel):
+    # only the fields the lookup table is indexed on,
+    # with one slot per hour and weekday (Monday is 0)
+    vendor_id: int
+    pickup_longitude: float
+    pickup_latitude: float
+    dropoff_longitude: float
+    dropoff_latitude: float
+    pickup_hour: int = Field(ge=0, le=23)
+    pickup_day: int = Field(ge=0, le=6)
+
+
+class BatchPredictionDataset(BaseModel):
+    trips: list[PredictionDataset]
+
+
+class ColumnarPredictionDataset(BaseModel):
+    vendor_id: list[int]
+    passenger_count: list[int]
+    pickup_longitude: list[float]
+    pickup_latitude: list[float]
+    dropoff_longitude: list[float]
+    dropoff_latitude: list[float]
+    pickup_hour: list[int]
+    pickup_date: list[int]
+    pickup_month: list[int]
+    pickup_day: list[int]
+    is_weekend: list[int]
+    haversine_distance: list[float]
+    euclidean_distance: list[float]
+    manhattan_distance: list[float]
+
+    @model_validator(mode='after')
+    def check_column_lengths(self):
+        # every column must describe the same number of trips
+        lengths = {len(getattr(self, name)) for name in type(self).model_fields}
+        if len(lengths) > 1:
+            raise ValueError('All columns must have the same number of values')
+        return self
+
+    def __len__(self):
+        return len(self.vendor_id)
+
+
+class RawTripDataset(BaseModel):
+    vendor_id: int
+    passenger_count: int
+    pickup_longitude: float = Field(ge=-180, le=180)
+    pickup_latitude: float = Field(ge=-90, le=90)
+    dropoff_longitude: float = Field(ge=-180, le=180)
+    dropoff_latitude: float = Field(ge=-90, le=90)
+    pickup_datetime: datetime
+
+    @field_validator('pickup_datetime')
+    @classmethod
+    def to_nyc_local_time(cls, value: datetime) -> datetime:
+        # timezone aware times are converted, naive times are taken as NYC local
+        if value.tzinfo is not None:
+            value = value.astimezone(NYC_TIMEZONE).replace(tzinfo=None)
+        return value
+
+
+class RawTripBatchDataset(BaseModel):
+    trips: list[RawTripDataset]
@@ -1,10 +1,13 @@
 import sys
 import logging
 from yaml import safe_load
+import numpy as np
 import pandas as pd
 from pathlib import Path
 from sklearn.model_selection import train_test_split
 from src.logger import create_log_path, CustomLogger
+from src.data.storage import (read_streaming_params, read_storage_format, data_file_path,
+                              read_data, write_data, iter_chunks, ChunkWriter)
 
 log_file_path = create_log_path('make_dataset')
 # create the custom logger object
@@ -15,7 +18,7 @@ dataset_logger.set_log_level(level=logging.INFO)
 
 
 def load_raw_data(input_path: Path) ->  pd.DataFrame:
-    raw_data = pd.read_csv(input_path)
+    raw_data = read_data(input_path)
     rows, columns = raw_data.shape
     dataset_logger.save_logs(msg=f'{input_path.stem} data read having {rows} rows and {columns} columns',
                              log_level='info')
@@ -37,9 +40,26 @@ def train_val_split(data: pd.DataFrame,
 
 
 
+def streaming_train_val_split(input_path: Path,
+                              train_path: Path,
+                              val_path: Path,
+                              test_size: float,
+                              random_state: int,
+                              chunksize: int):
+    # every row is sent to the val split with probability test_size,
+    # so only one chunk is held in memory at a time
+    rng = np.random.default_rng(random_state)
+    with ChunkWriter(train_path) as train_writer, ChunkWriter(val_path) as val_writer:
+        for chunk in iter_chunks(input_path, chunksize=chunksize):
+            is_val = rng.random(len(chunk)) < test_size
+            train_writer.write(chunk.loc[~is_val])
+            val_writer.write(chunk.loc[is_val])
+    dataset_logger.save_logs(msg=f'Data is split in chunks of {chunksize} rows into train split with {train_writer.rows} rows and val split with {val_writer.rows} rows',
+                             log_level='info')
+
 
 def save_data(data: pd.DataFrame,output_path: Path):
-    data.to_csv(output_path,index=False)
+    write_data(data,output_path)
     dataset_logger.save_logs(msg=f'{output_path.stem + output_path.suffix} data saved successfully to the output folder',
                              log_level='info')
     
@@ -80,18 +100,32 @@ def main():
     interim_data_path.mkdir(exist_ok= True)
     # raw train file path
     raw_df_path = root_path / 'data' / 'raw' / 'extracted' / input_file_name
-    # load the training file
-    raw_df = load_raw_data(input_path= raw_df_path)
     # parameters from params file
     test_size, random_state = read_params('params.yaml')
+    streaming_params = read_streaming_params('params.yaml')
+    storage_format = read_storage_format('params.yaml')
+    # output paths of the splits
+    train_path = data_file_path(interim_data_path, 'train', storage_format)
+    val_path = data_file_path(interim_data_path, 'val', storage_format)
+    if streaming_params['enabled']:
+        # split the file chunk by chunk
+        streaming_train_val_split(input_path= raw_df_path,
+                                  train_path= train_path,
+                                  val_path= val_path,
+                                  test_size= test_size,
+                                  random_state= random_state,
+                                  chunksize= streaming_params['chunksize'])
+        return
+    # load the training file
+    raw_df = load_raw_data(input_path= raw_df_path)
     # split the file to train and validation data
     train_df, val_df = train_val_split(data= raw_df,
                                        test_size= test_size,
                                        random_state= random_state)
     # save the train data to the output path
-    save_data(data= train_df, output_path= interim_data_path / 'train.csv')
+    save_data(data= train_df, output_path= train_path)
     # save the val data to the output path
-    save_data(data= val_df, output_path= interim_data_path / 'val.csv')
+    save_data(data= val_df, output_path= val_path)
     
     
 if __name__ == '__main__':
@@ -0,0 +1,203 @@
+from pathlib import Path
+from yaml import safe_load
+import pandas as pd
+
+DEFAULT_STREAMING_PARAMS = {'enabled': False,
+                            'chunksize': 200000,
+                            'sample_size': 500000,
+                            'random_state': 30}
+
+DEFAULT_STORAGE_FORMAT = 'csv'
+
+# file extension of every supported storage format
+FORMAT_EXTENSIONS = {'csv': '.csv',
+                     'parquet': '.parquet',
+                     'feather': '.feather'}
+
+# dtypes of the known columns, so csv files are not re-inferred on every read
+COLUMN_DTYPES = {'id': 'string',
+                 'vendor_id': 'int64',
+                 'passenger_count': 'int64',
+                 'pickup_datetime': 'string',
+                 'dropoff_datetime': 'string',
+                 'store_and_fwd_flag': 'string',
+                 'pickup_hour': 'int64',
+                 'pickup_date': 'int64',
+                 'pickup_month': 'int64',
+                 'pickup_day': 'int64',
+                 'is_weekend': 'int64',
+                 'pickup_longitude': 'float64',
+                 'pickup_latitude': 'float64',
+                 'dropoff_longitude': 'float64',
+                 'dropoff_latitude': 'float64',
+                 'haversine_distance': 'float64',
+                 'euclidean_distance': 'float64',
+                 'manhattan_distance': 'float64',
+                 'trip_duration': 'float64'}
+
+
+def read_params_section(section: str, params_path='params.yaml') -> dict:
+    """
+    Read one section of the parameters file, empty when the file or the section is missing.
+    """
+    try:
+        with open(params_path) as f:
+            params_file = safe_load(f)
+    except FileNotFoundError:
+        return {}
+    return params_file.get(section) or {}
+
+
+def read_streaming_params(params_path='params.yaml') -> dict:
+    """
+    Read the `streaming` section of the parameters file.
+
+    Missing keys (or a missing file) fall back to DEFAULT_STREAMING_PARAMS so
+    the pipeline keeps its in-memory behaviour by default.
+    """
+    params = dict(DEFAULT_STREAMING_PARAMS)
+    params.update(read_params_section('streaming', params_path))
+    return params
+
+
+def read_storage_format(params_path='params.yaml') -> str:
+    """
+    Read the storage format of the intermediate data from the parameters file.
+    """
+    storage_format = read_params_section('storage', params_path).get('format',
+                                                                      DEFAULT_STORAGE_FORMAT)
+    if storage_format not in FORMAT_EXTENSIONS:
+        raise ValueError(f'Unknown storage format {storage_format}, '
+                         f'expected one of {list(FORMAT_EXTENSIONS)}')
+    return storage_format
+
+
+def data_file_path(directory: Path, split: str, storage_format: str) -> Path:
+    """
+    Path of the file holding a data split (train, val or test) in a directory.
+    """
+    return Path(directory) / (split + FORMAT_EXTENSIONS[storage_format])
+
+
+def _storage_format(path: Path) -> str:
+    # the format of a file is given by its extension
+    suffix = Path(path).suffix
+    for storage_format, extension in FORMAT_EXTENSIONS.items():
+        if suffix == extension:
+            return storage_format
+    raise ValueError(f'Unknown storage format for {path}')
+
+
+def _csv_dtypes(path: Path) -> dict:
+    # only pass the dtypes of the columns present in the file
+    header = pd.read_csv(path, nrows=0).columns
+    return {column: COLUMN_DTYPES[column] for column in header if column in COLUMN_DTYPES}
+
+
+def read_data(path: Path) -> pd.DataFrame:
+    """
+    Read a data file in any of the supported formats.
+
+    Parquet and feather files are memory mapped, csv files are parsed with the
+    dtypes in COLUMN_DTYPES.
+    """
+    storage_format = _storage_format(path)
+    if storage_format == 'csv':
+        return pd.read_csv(path, dtype=_csv_dtypes(path))
+    if storage_format == 'parquet':
+        import pyarrow.parquet as pq
+        table = pq.read_table(path, memory_map=True)
+    else:
+        import pyarrow.feather as feather
+        table = feather.read_table(path, memory_map=True)
+    # split_blocks avoids consolidating the columns into one block copy
+    return table.to_pandas(split_blocks=True)
+
+
+def write_data(dataframe: pd.DataFrame, path: Path):
+    """
+    Write a dataframe in the format given by the extension of path.
+    """
+    storage_format = _storage_format(path)
+    if storage_format == 'csv':
+        dataframe.to_csv(path, index=False)
+    elif storage_format == 'parquet':
+        dataframe.to_parquet(path, index=False)
+    else:
+        # uncompressed, so the memory mapped reads do not copy the columns
+        dataframe.reset_index(drop=True).to_feather(path, compression='uncompressed')
+
+
+def iter_chunks(path: Path, chunksize: int):
+    """
+    Yield the rows of a data file as dataframes of at most chunksize rows.
+    """
+    storage_format = _storage_format(path)
+    if storage_format == 'csv':
+        with pd.read_csv(path, chunksize=chunksize, dtype=_csv_dtypes(path)) as reader:
+            for chunk in reader:
+                yield chunk
+    elif storage_format == 'parquet':
+        import pyarrow.parquet as pq
+        parquet_file = pq.ParquetFile(path, memory_map=True)
+        for batch in parquet_file.iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        import pyarrow.feather as feather
+        # the memory mapped table is only paged in slice by slice
+        table = feather.read_table(path, memory_map=True)
+        for offset in range(0, table.num_rows, chunksize):
+            yield table.slice(offset, chunksize).to_pandas()
+
+
+class ChunkWriter:
+    """
+    Appends dataframe chunks to a single output file.
+
+    The output is the same file a single `write_data` of the concatenated
+    chunks would produce. For parquet and feather every chunk is cast to the
+    schema of the first one.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.storage_format = _storage_format(self.path)
+        self.rows = 0
+        self._header_written = False
+        self._writer = None
+        self._schema = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def write(self, chunk: pd.DataFrame):
+        if self.storage_format == 'csv':
+            chunk.to_csv(self.path, index=False,
+                         mode='a' if self._header_written else 'w',
+                         header=not self._header_written)
+            self._header_written = True
+        else:
+            self._write_arrow(chunk)
+        self.rows += len(chunk)
+
+    def _write_arrow(self, chunk: pd.DataFrame):
+        import pyarrow as pa
+
+        table = pa.Table.from_pandas(chunk, preserve_index=False)
+        if self._writer is None:
+            self._schema = table.schema
+            if self.storage_format == 'parquet':
+                import pyarrow.parquet as pq
+                self._writer = pq.ParquetWriter(self.path, self._schema)
+            else:
+                self._writer = pa.ipc.new_file(str(self.path), self._schema)
+        self._writer.write_table(table.cast(self._schema))
@@ -1,39 +1,86 @@
 import sys
+from functools import partial
 import pandas as pd
 import numpy as np
 from pathlib import Path
-from distances import haversine_distance, euclidean_distance, manhattan_distance
+from src.features.distances import DistanceEngine, DISTANCE_NAMES
+from src.data.storage import (read_streaming_params, read_storage_format, data_file_path,
+                              read_data, write_data, iter_chunks, ChunkWriter)
+from src.features.parallel import read_parallel_params, is_parallel, run_sharded
+from yaml import safe_load
 
-new_feature_names = ['haversine_distance',
-                     'euclidean_distance',
-                     'manhattan_distance']
-
-build_features_list = [haversine_distance,
-                       euclidean_distance,
-                       manhattan_distance]
+# one engine per process so its scratch buffers are reused across chunks
+distance_engine = DistanceEngine(dtype=np.float64)
 
 
 def implement_distances(dataframe:pd.DataFrame, 
                         lat1:pd.Series, 
                         lon1:pd.Series, 
                         lat2:pd.Series, 
-                        lon2:pd.Series) -> pd.DataFrame:
-    dataframe = dataframe.copy()
-    for ind in range(len(build_features_list)):
-        func = build_features_list[ind]
-        dataframe[new_feature_names[ind]] = func(lat1,lon1,
-                                                 lat2,lon2)
+                        lon2:pd.Series,
+                        engine:DistanceEngine=None) -> pd.DataFrame:
+    # all distances in a single pass, added to the dataframe in place
+    engine = engine or distance_engine
+    distances = engine.compute(lat1.to_numpy(),lon1.to_numpy(),
+                               lat2.to_numpy(),lon2.to_numpy())
+    for name, values in zip(engine.names, distances):
+        dataframe[name] = values
     
     return dataframe
 
+def read_distance_dtype(params_path='params.yaml') -> str:
+    # precision of the distance columns
+    with open(params_path) as f:
+        build_params = safe_load(f).get('build_features') or {}
+    return build_params.get('dtype','float64')
+
+def build_features(dataframe:pd.DataFrame, engine:DistanceEngine=None) -> pd.DataFrame:
+    return implement_distances(dataframe=dataframe,
+                               lat1=dataframe['pickup_latitude'],
+                               lon1=dataframe['pickup_longitude'],
+                               lat2=dataframe['dropoff_latitude'],
+                               lon2=dataframe['dropoff_longitude'],
+                               engine=engine)
+
+def build_features_streaming(data_path, save_path, chunksize):
+    # add the distances chunk by chunk and append every chunk to the output
+    with ChunkWriter(save_path) as writer:
+        for chunk in iter_chunks(data_path,chunksize=chunksize):
+            writer.write(build_features(chunk))
+
+def build_features_shard(dataframe:pd.DataFrame, dtype) -> pd.DataFrame:
+    # the worker processes build their own engine with the configured precision
+    return implement_distances(dataframe=dataframe,
+                               lat1=dataframe['pickup_latitude'],
+                               lon1=dataframe['pickup_longitude'],
+                               lat2=dataframe['dropoff_latitude'],
+                               lon2=dataframe['dropoff_longitude'],
+                               engine=DistanceEngine(dtype=dtype))
+
+def build_features_parallel(data_paths, save_paths, dtype, n_workers, shard_rows):
+    # add the distances to all the splits at once on a process pool
+    tasks = [(partial(build_features_shard,dtype=dtype),read_dataframe(data_path))
+             for data_path in data_paths]
+    results = run_sharded(tasks,n_workers=n_workers,shard_rows=shard_rows)
+    for df, save_path in zip(results,save_paths):
+        save_dataframe(df,save_path)
+
 def read_dataframe(path):
-    df = pd.read_csv(path)
+    df = read_data(path)
     return df
 
 def save_dataframe(dataframe:pd.DataFrame, save_path):
-    dataframe.to_csv(save_path,index=False)
+    write_data(dataframe,save_path)
 
 if __name__ == "__main__":
+    # read the streaming parameters
+    streaming_params = read_streaming_params('params.yaml')
+    storage_format = read_storage_format('params.yaml')
+    # precision of the distance columns
+    distance_engine = DistanceEngine(dtype=read_distance_dtype('params.yaml'))
+    parallel_params = read_parallel_params('params.yaml')
+    # the splits are saved after they are all processed in parallel mode
+    data_paths, save_paths = [], []
     for ind in range(1,4):
         # read the input file name from command
         input_file_path = sys.argv[ind]
@@ -43,19 +90,29 @@ if __name__ == "__main__":
         root_path = current_path.parent.parent.parent
         # input data path
         data_path = root_path / input_file_path
-        # get the file name
-        filename = data_path.parts[-1]
-        # call the main function
-        df = read_dataframe(data_path)
-        # build features for dataframe
-        df = implement_distances(dataframe=df,
-                                 lat1=df['pickup_latitude'],
-                                 lon1=df['pickup_longitude'],
-                                 lat2=df['dropoff_latitude'],
-                                 lon2=df['dropoff_longitude'])
+        # get the split name (train, val or test)
+        split = data_path.stem
         # save the dataframe
         output_path = root_path / "data/processed/build-features"
         # make the directory if not available
         output_path.mkdir(parents=True,exist_ok=True)
+        save_path = data_file_path(output_path,split,storage_format)
+        if streaming_params['enabled']:
+            build_features_streaming(data_path,save_path,
+                                     chunksize=streaming_params['chunksize'])
+            continue
+        if is_parallel(parallel_params):
+            data_paths.append(data_path)
+            save_paths.append(save_path)
+            continue
+        # call the main function
+        df = read_dataframe(data_path)
+        # build features for dataframe
+        df = build_features(df)
         # save the data
-        save_dataframe(df,output_path / filename)
\ No newline at end of file
+        save_dataframe(df,save_path)
+    if data_paths:
+        build_features_parallel(data_paths,save_paths,
+                                dtype=distance_engine.dtype,
+                                n_workers=parallel_params['n_workers'],
+                                shard_rows=parallel_params['shard_rows'])
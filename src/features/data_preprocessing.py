@@ -5,6 +5,10 @@ from pathlib import Path
 from sklearn.compose import ColumnTransformer
 from sklearn.preprocessing import OneHotEncoder, StandardScaler, MinMaxScaler, PowerTransformer
 from src.features.outliers_removal import OutliersRemover
+from src.features.sampling import ReservoirSample
+from src.data.storage import read_streaming_params, read_data, write_data, iter_chunks, ChunkWriter
+from src.features.parallel import read_parallel_params, is_parallel, run_sharded
+from functools import partial
 import joblib
 import sys
 
@@ -34,7 +38,7 @@ def remove_outliers(dataframe:pd.DataFrame, percentiles:list, column_names:list)
 #* lat/long - min max scale
 #* distances - Standard scale
 
-def train_preprocessor(data:pd.DataFrame):
+def train_preprocessor(data:pd.DataFrame, ohe_categories='auto'):
     ohe_columns = ['vendor_id']
     standard_scale_columns = ['haversine_distance', 'euclidean_distance',
        'manhattan_distance']
@@ -42,7 +46,7 @@ def train_preprocessor(data:pd.DataFrame):
        'pickup_latitude', 'dropoff_longitude', 'dropoff_latitude']
     
     preprocessor = ColumnTransformer(transformers=[
-        ('one-hot',OneHotEncoder(drop='first',sparse_output=False,handle_unknown='ignore'),ohe_columns),
+        ('one-hot',OneHotEncoder(categories=ohe_categories,drop='first',sparse_output=False,handle_unknown='ignore'),ohe_columns),
         ('min-max',MinMaxScaler(),min_max_scale_columns),
         ('standard-scale',StandardScaler(),standard_scale_columns)
     ],remainder='passthrough',verbose_feature_names_out=False,n_jobs=1)
@@ -68,14 +72,151 @@ def transform_output(target:pd.Series):
     
     return power_transform
 
+def fit_transformers(dataframe:pd.DataFrame, percentiles:list):
+    # make X and y
+    X = dataframe.drop(columns=TARGET)
+    y = dataframe[TARGET]
+    # remove outliers from data
+    outlier_transformer = remove_outliers(dataframe=X,percentiles=percentiles,
+                                          column_names=COLUMN_NAMES)
+    # transform the data
+    df_without_outliers = transform_data(transformer=outlier_transformer,
+                                         data=X)
+    # train the preprocessor on the data
+    preprocessor = train_preprocessor(data=df_without_outliers)
+    # fit the target transformer
+    output_transformer = transform_output(y)
+
+    return outlier_transformer, preprocessor, output_transformer
+
+def apply_transformers(dataframe:pd.DataFrame, preprocessor, output_transformer) -> pd.DataFrame:
+    # the test data has no target column
+    if TARGET not in dataframe.columns:
+        return transform_data(transformer=preprocessor,
+                              data=dataframe)
+    # transform the data
+    X_trans = transform_data(transformer=preprocessor,
+                             data=dataframe.drop(columns=TARGET))
+    # transform the target
+    y_trans = transform_data(transformer=output_transformer,
+                             data=dataframe[TARGET].values.reshape(-1,1))
+    # save the transformed output to the df
+    X_trans[TARGET] = y_trans
+
+    return X_trans
+
+def save_transformers(save_transformers_path, outlier_transformer,
+                      preprocessor, output_transformer):
+    save_transformer(path=save_transformers_path / 'outliers.joblib',
+                     object=outlier_transformer)
+    save_transformer(path=save_transformers_path / 'preprocessor.joblib',
+                     object=preprocessor)
+    save_transformer(path=save_transformers_path / 'output_transformer.joblib',
+                     object=output_transformer)
+
+def partial_fit_preprocessor(preprocessor:ColumnTransformer, data:pd.DataFrame):
+    # update the running statistics of the scalers with another chunk
+    for name, transformer, columns in preprocessor.transformers_:
+        if hasattr(transformer,'partial_fit'):
+            transformer.partial_fit(data[columns])
+
+    return preprocessor
+
+def fit_transformers_streaming(train_path, percentiles:list, chunksize:int,
+                               sample_size:int, random_state=None):
+    # pass 1: outlier quantiles sketched over all the rows, a bounded random
+    # sample of the target for the power transform and the categories of
+    # the one-hot column over the whole file
+    outlier_transformer = OutliersRemover(percentile_values=percentiles,
+                                          col_subset=COLUMN_NAMES,
+                                          quantile_method='tdigest')
+    sample = ReservoirSample(size=sample_size,random_state=random_state)
+    vendor_categories = np.array([])
+    for chunk in iter_chunks(train_path,chunksize=chunksize):
+        outlier_transformer.partial_fit(chunk)
+        sample.update(chunk[[TARGET]])
+        vendor_categories = np.union1d(vendor_categories,chunk['vendor_id'].unique())
+    output_transformer = transform_output(sample.sample[TARGET])
+    # pass 2: exact scaler statistics merged chunk by chunk
+    preprocessor = None
+    for chunk in iter_chunks(train_path,chunksize=chunksize):
+        X_without_outliers = transform_data(transformer=outlier_transformer,
+                                            data=chunk.drop(columns=TARGET))
+        if X_without_outliers.empty:
+            continue
+        if preprocessor is None:
+            preprocessor = train_preprocessor(data=X_without_outliers,
+                                              ohe_categories=[vendor_categories.astype(int)])
+        else:
+            partial_fit_preprocessor(preprocessor,X_without_outliers)
+
+    return outlier_transformer, preprocessor, output_transformer
+
+def transform_data_streaming(input_path, save_path, preprocessor, output_transformer,
+                             chunksize:int):
+    # transform the file chunk by chunk and append every chunk to the output
+    with ChunkWriter(save_path) as writer:
+        for chunk in iter_chunks(input_path,chunksize=chunksize):
+            writer.write(apply_transformers(dataframe=chunk,preprocessor=preprocessor,
+                                            output_transformer=output_transformer))
+
+def main_streaming(input_path, save_transformers_path, save_data_path,
+                   percentiles:list, streaming_params:dict):
+    chunksize = streaming_params['chunksize']
+    for filename in sys.argv[1:]:
+        complete_input_path = input_path / filename
+        if Path(filename).stem == 'train':
+            outlier_transformer, preprocessor, output_transformer = fit_transformers_streaming(
+                train_path=complete_input_path,
+                percentiles=percentiles,
+                chunksize=chunksize,
+                sample_size=streaming_params['sample_size'],
+                random_state=streaming_params['random_state'])
+            # save the transformers
+            save_transformers(save_transformers_path,outlier_transformer,
+                              preprocessor,output_transformer)
+        else:
+            # load the transformers fitted on the train split
+            preprocessor = joblib.load(save_transformers_path / 'preprocessor.joblib')
+            output_transformer = joblib.load(save_transformers_path / 'output_transformer.joblib')
+        # pass 3: transform the split
+        transform_data_streaming(input_path=complete_input_path,
+                                 save_path=save_data_path / filename,
+                                 preprocessor=preprocessor,
+                                 output_transformer=output_transformer,
+                                 chunksize=chunksize)
+
 def read_dataframe(path):
-    df = pd.read_csv(path)
+    df = read_data(path)
     return df
 
 def save_dataframe(dataframe:pd.DataFrame, save_path):
-    dataframe.to_csv(save_path,index=False)
+    write_data(dataframe,save_path)
 
     
+def main_parallel(input_path, filenames, save_transformers_path, save_data_path,
+                  percentiles, parallel_params):
+    # the transformers are fitted on the whole train split first
+    dataframes = {filename: read_dataframe(input_path / filename) for filename in filenames}
+    train_filenames = [filename for filename in filenames if Path(filename).stem == 'train']
+    if train_filenames:
+        outlier_transformer, preprocessor, output_transformer = fit_transformers(
+            dataframe=dataframes[train_filenames[0]],percentiles=percentiles)
+        save_transformers(save_transformers_path,outlier_transformer,
+                          preprocessor,output_transformer)
+    else:
+        preprocessor = joblib.load(save_transformers_path / 'preprocessor.joblib')
+        output_transformer = joblib.load(save_transformers_path / 'output_transformer.joblib')
+    # then all the splits are transformed at once on a process pool
+    transform_shard = partial(apply_transformers,preprocessor=preprocessor,
+                              output_transformer=output_transformer)
+    results = run_sharded([(transform_shard,dataframes[filename]) for filename in filenames],
+                          n_workers=parallel_params['n_workers'],
+                          shard_rows=parallel_params['shard_rows'])
+    for filename, X_trans in zip(filenames,results):
+        save_dataframe(dataframe=X_trans,
+                       save_path=save_data_path / filename)
+
 def main():
     # current file path
     current_path = Path(__file__)
@@ -96,86 +237,48 @@ def main():
     save_data_path = root_path / 'data' / 'processed' / 'final'
     # make directory
     save_data_path.mkdir(exist_ok=True)
+    # bounded memory mode for data larger than memory
+    streaming_params = read_streaming_params('params.yaml')
+    if streaming_params['enabled']:
+        main_streaming(input_path=input_path,
+                       save_transformers_path=save_transformers_path,
+                       save_data_path=save_data_path,
+                       percentiles=percentiles,
+                       streaming_params=streaming_params)
+        return
+    # process pool mode for several cores
+    parallel_params = read_parallel_params('params.yaml')
+    if is_parallel(parallel_params):
+        main_parallel(input_path=input_path,
+                      filenames=sys.argv[1:],
+                      save_transformers_path=save_transformers_path,
+                      save_data_path=save_data_path,
+                      percentiles=percentiles,
+                      parallel_params=parallel_params)
+        return
     
     for filename in sys.argv[1:]:
         complete_input_path = input_path / filename
-        if filename == 'train.csv':
-            df = read_dataframe(complete_input_path)
-            # make X and y
-            X = df.drop(columns=TARGET)
-            y = df[TARGET]
-            # remove outliers from data
-            outlier_transformer = remove_outliers(dataframe=X,percentiles=percentiles,
-                                                  column_names=COLUMN_NAMES)
-            # save the transformer
-            save_transformer(path=save_transformers_path / 'outliers.joblib',
-                             object=outlier_transformer)
-            # transform the data
-            df_without_outliers = transform_data(transformer=outlier_transformer,
-                                                 data=X)                
-            # train the preprocessor on the data
-            preprocessor = train_preprocessor(data=df_without_outliers)
-            # save the preprocessor
-            save_transformer(path=save_transformers_path / 'preprocessor.joblib',
-                             object=preprocessor)
-            # transform the data
-            X_trans = transform_data(transformer=preprocessor,
-                                     data=X)
-            # fit the target transformer
-            output_transformer = transform_output(y)
-            # transform the target
-            y_trans = transform_data(transformer=output_transformer,
-                                     data=y.values.reshape(-1,1))
-            # save the transformed output to the df
-            X_trans['trip_duration'] = y_trans
-            # save the output transformer
-            save_transformer(path=save_transformers_path / 'output_transformer.joblib',
-                             object=output_transformer)
-            
-            # save the transformed data
-            save_dataframe(dataframe=X_trans,
-                           save_path=save_data_path / filename)
-            
-        elif filename == 'val.csv':
-            df = read_dataframe(complete_input_path)
-            # make X and y
-            X = df.drop(columns=TARGET)
-            y = df[TARGET]
-            # load the transfomer
-            outlier_transformer = joblib.load(save_transformers_path / 'outliers.joblib')
-            df_without_outliers = transform_data(transformer=outlier_transformer,
-                                                data=X)                
-            # load the preprocessor
-            preprocessor = joblib.load(save_transformers_path / 'preprocessor.joblib')
-            # transform the data
-            X_trans = transform_data(transformer=preprocessor,
-                                    data=X)
-            # load the output transformer
-            output_transformer = joblib.load(save_transformers_path / 'output_transformer.joblib') 
-            # transform the target
-            y_trans = transform_data(transformer=output_transformer,
-                                    data=y.values.reshape(-1,1))
-            # save the transformed output to the df
-            X_trans['trip_duration'] = y_trans
-            
-            # save the transformed data
-            save_dataframe(dataframe=X_trans,
-                        save_path=save_data_path / filename)
-            
-        elif filename == 'test.csv':
-            df = read_dataframe(complete_input_path)
-            # load the transfomer
-            outlier_transformer = joblib.load(save_transformers_path / 'outliers.joblib')
-            df_without_outliers = transform_data(transformer=outlier_transformer,
-                                                data=df)                
-            # load the preprocessor
+        # the files are named after their split
+        split = Path(filename).stem
+        df = read_dataframe(complete_input_path)
+        if split == 'train':
+            # fit the transformers on the train data
+            outlier_transformer, preprocessor, output_transformer = fit_transformers(
+                dataframe=df,percentiles=percentiles)
+            # save the transformers
+            save_transformers(save_transformers_path,outlier_transformer,
+                              preprocessor,output_transformer)
+        else:
+            # load the transformers fitted on the train data
             preprocessor = joblib.load(save_transformers_path / 'preprocessor.joblib')
-            # transform the data
-            X_trans = transform_data(transformer=preprocessor,
-                                    data=df)
-            # save the transformed data
-            save_dataframe(dataframe=X_trans,
-                        save_path=save_data_path / filename)
+            output_transformer = joblib.load(save_transformers_path / 'output_transformer.joblib')
+        # transform the data
+        X_trans = apply_transformers(dataframe=df,preprocessor=preprocessor,
+                                     output_transformer=output_transformer)
+        # save the transformed data
+        save_dataframe(dataframe=X_trans,
+                       save_path=save_data_path / filename)
             
 if __name__ == "__main__":
     main()
\ No newline at end of file
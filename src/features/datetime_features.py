@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+from pandas.tseries.holiday import USFederalHolidayCalendar
+
+DATETIME_FEATURE_NAMES = ['pickup_hour',
+                          'pickup_date',
+                          'pickup_month',
+                          'pickup_day',
+                          'is_weekend']
+
+# format of the pickup_datetime column in the raw data
+PICKUP_DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+NANOSECONDS_PER_HOUR = 3600 * 10**9
+NANOSECONDS_PER_DAY = 24 * NANOSECONDS_PER_HOUR
+
+# time of day bucket of every hour:
+# 0 night (0-5), 1 morning rush (6-9), 2 midday (10-15), 3 evening rush (16-19), 4 late evening (20-23)
+TIME_OF_DAY_BY_HOUR = np.array([0] * 6 + [1] * 4 + [2] * 6 + [3] * 4 + [4] * 4)
+
+
+def parse_pickup_datetime(pickup_datetime) -> np.ndarray:
+    """
+    Convert pickup times to int64 nanoseconds since the epoch.
+
+    Strings are parsed with the fixed PICKUP_DATETIME_FORMAT instead of
+    inferring the format, and repeated values are parsed once.
+    """
+    values = np.asarray(pickup_datetime)
+    if np.issubdtype(values.dtype, np.datetime64):
+        return values.astype('datetime64[ns]').view('int64')
+    parsed = pd.to_datetime(pickup_datetime, format=PICKUP_DATETIME_FORMAT, cache=True)
+    return np.asarray(parsed, dtype='datetime64[ns]').view('int64')
+
+
+def _civil_from_days(days: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # year, month and day of days since 1970-01-01 in the proleptic Gregorian
+    # calendar, vectorized version of Howard Hinnant's civil_from_days
+    z = days + 719468
+    era = z // 146097
+    day_of_era = z - era * 146097
+    year_of_era = (day_of_era - day_of_era // 1460 + day_of_era // 36524
+                   - day_of_era // 146096) // 365
+    day_of_year = day_of_era - (365 * year_of_era + year_of_era // 4 - year_of_era // 100)
+    shifted_month = (5 * day_of_year + 2) // 153
+    day = day_of_year - (153 * shifted_month + 2) // 5 + 1
+    month = np.where(shifted_month < 10, shifted_month + 3, shifted_month - 9)
+    year = year_of_era + era * 400 + (month <= 2)
+    return year, month, day
+
+
+def make_datetime_columns(pickup_datetime, holidays: bool = False,
+                          time_of_day: bool = False) -> dict:
+    """
+    Calculate the datetime features for a batch of pickup times in one
+    vectorized pass over the int64 timestamps.
+
+    Parameters:
+    - pickup_datetime (array-like): Pickup times as strings, datetimes or datetime64 values.
+    - holidays (bool): Also return `is_holiday` for US federal holidays.
+    - time_of_day (bool): Also return the `time_of_day` bucket of TIME_OF_DAY_BY_HOUR.
+
+    Returns:
+    - dict: Feature name to numpy array, in the order of DATETIME_FEATURE_NAMES
+      followed by the optional features.
+    """
+    timestamps = parse_pickup_datetime(pickup_datetime)
+    days = timestamps // NANOSECONDS_PER_DAY
+    hour = (timestamps - days * NANOSECONDS_PER_DAY) // NANOSECONDS_PER_HOUR
+    _, month, day = _civil_from_days(days)
+    # 1970-01-01 was a Thursday, Monday is 0
+    weekday = (days + 3) % 7
+
+    columns = {'pickup_hour': hour,
+               'pickup_date': day,
+               'pickup_month': month,
+               'pickup_day': weekday,
+               'is_weekend': (weekday >= 5).astype('int64')}
+
+    if holidays:
+        columns['is_holiday'] = _is_holiday(days)
+    if time_of_day:
+        columns['time_of_day'] = TIME_OF_DAY_BY_HOUR[hour]
+    return columns
+
+
+def _is_holiday(days: np.ndarray) -> np.ndarray:
+    if len(days) == 0:
+        return np.zeros(0, dtype='int64')
+    start = np.datetime64(int(days.min()), 'D')
+    end = np.datetime64(int(days.max()), 'D')
+    holiday_days = USFederalHolidayCalendar().holidays(start=start, end=end)
+    holiday_days = np.asarray(holiday_days, dtype='datetime64[D]').view('int64')
+    return np.isin(days, holiday_days).astype('int64')
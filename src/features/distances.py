@@ -1,3 +1,4 @@
+import threading
 import numpy as np
 
 def haversine_distance(lat1:float, lon1:float, lat2:float, lon2:float):
@@ -42,4 +43,145 @@ def manhattan_distance(lat1:float, lon1:float, lat2:float, lon2:float) -> np.flo
     location_2 = (lat2,lon2)
     manhattan = np.abs(location_1[0] - location_2[0]) + np.abs(location_1[1] - location_2[1])
     
-    return manhattan
\ No newline at end of file
+    return manhattan
+
+DISTANCE_NAMES = ['haversine_distance',
+                  'euclidean_distance',
+                  'manhattan_distance']
+
+EARTH_RADIUS_KM = 6371
+
+
+class DistanceEngine:
+    """
+    Computes the haversine, euclidean and manhattan distances (and optionally
+    the bearing) of trips in a single pass over shared coordinate deltas.
+
+    The inputs are processed in slices of `chunksize` rows through scratch
+    buffers that are allocated once and reused across calls, and the results
+    are written into a caller supplied (or a new) output array. The float64
+    results are identical to `haversine_distance`, `euclidean_distance` and
+    `manhattan_distance`. An engine is not thread safe, use one per thread.
+
+    Parameters:
+    - dtype (np.dtype): np.float64 or np.float32 for the computations and the output.
+    - bearing (bool): Also compute the initial bearing in degrees in [0, 360).
+    - chunksize (int): Number of rows processed at a time.
+    """
+
+    def __init__(self, dtype=np.float64, bearing: bool = False, chunksize: int = 65536):
+        self.dtype = np.dtype(dtype)
+        self.bearing = bearing
+        self.chunksize = chunksize
+        self.names = DISTANCE_NAMES + (['bearing'] if bearing else [])
+        self._scratch = None
+
+    def _buffers(self, n_rows: int) -> list:
+        if self._scratch is None or self._scratch.shape[1] < n_rows:
+            self._scratch = np.empty((6, n_rows), dtype=self.dtype)
+        return [buffer[:n_rows] for buffer in self._scratch]
+
+    def compute(self, lat1, lon1, lat2, lon2, out: np.ndarray = None) -> np.ndarray:
+        """
+        Returns:
+        - np.ndarray: Array of shape (len(self.names), n_rows), one row per output.
+        """
+        lat1, lon1, lat2, lon2 = (np.asarray(values) for values in (lat1, lon1, lat2, lon2))
+        n_rows = len(lat1)
+        if out is None:
+            out = np.empty((len(self.names), n_rows), dtype=self.dtype)
+        elif out.shape != (len(self.names), n_rows) or out.dtype != self.dtype:
+            raise ValueError(f'Output buffer must have shape {(len(self.names), n_rows)} '
+                             f'and dtype {self.dtype}')
+        for start in range(0, n_rows, self.chunksize):
+            stop = min(start + self.chunksize, n_rows)
+            self._compute_chunk(lat1[start:stop], lon1[start:stop],
+                                lat2[start:stop], lon2[start:stop],
+                                out[:, start:stop])
+        return out
+
+    def _compute_chunk(self, lat1, lon1, lat2, lon2, out):
+        lat1_rad, lat2_rad, dlat, dlon, first, second = self._buffers(len(lat1))
+        haversine, euclidean, manhattan = out[0], out[1], out[2]
+
+        # deltas in degrees for the euclidean and manhattan distances
+        np.subtract(lat1, lat2, out=dlat, casting='same_kind')
+        np.subtract(lon1, lon2, out=dlon, casting='same_kind')
+        np.abs(dlat, out=manhattan)
+        np.abs(dlon, out=first)
+        manhattan += first
+        np.square(dlat, out=euclidean)
+        np.square(dlon, out=first)
+        euclidean += first
+        np.sqrt(euclidean, out=euclidean)
+
+        # deltas in radians for the haversine distance and the bearing
+        np.radians(lat1, out=lat1_rad, casting='same_kind')
+        np.radians(lat2, out=lat2_rad, casting='same_kind')
+        np.subtract(lat2_rad, lat1_rad, out=dlat)
+        np.radians(lon2, out=dlon, casting='same_kind')
+        np.radians(lon1, out=first, casting='same_kind')
+        dlon -= first
+        # a = sin(dlat / 2)**2 + cos(lat1) * cos(lat2) * sin(dlon / 2)**2
+        np.divide(dlat, 2.0, out=first)
+        np.sin(first, out=first)
+        np.square(first, out=first)
+        np.cos(lat1_rad, out=haversine)
+        np.cos(lat2_rad, out=second)
+        haversine *= second
+        np.divide(dlon, 2.0, out=second)
+        np.sin(second, out=second)
+        np.square(second, out=second)
+        haversine *= second
+        np.add(first, haversine, out=haversine)
+        np.sqrt(haversine, out=haversine)
+        np.arcsin(haversine, out=haversine)
+        haversine *= 2
+        haversine *= EARTH_RADIUS_KM
+
+        if self.bearing:
+            bearing = out[3]
+            # atan2(sin(dlon) * cos(lat2), cos(lat1) * sin(lat2) - sin(lat1) * cos(lat2) * cos(dlon))
+            np.sin(dlon, out=first)
+            np.cos(lat2_rad, out=second)
+            first *= second
+            np.cos(dlon, out=bearing)
+            bearing *= second
+            np.sin(lat1_rad, out=second)
+            bearing *= second
+            np.cos(lat1_rad, out=second)
+            np.sin(lat2_rad, out=dlat)
+            second *= dlat
+            np.subtract(second, bearing, out=bearing)
+            np.arctan2(first, bearing, out=bearing)
+            np.degrees(bearing, out=bearing)
+            bearing += 360
+            np.mod(bearing, 360, out=bearing)
+
+
+# engines by (dtype, bearing) of every thread, so the scratch buffers are reused across calls
+_thread_engines = threading.local()
+
+
+def get_distance_engine(dtype=np.float64, bearing: bool = False) -> DistanceEngine:
+    # the engine of the current thread for these settings, created on first use
+    engines = getattr(_thread_engines, 'engines', None)
+    if engines is None:
+        engines = _thread_engines.engines = {}
+    key = (np.dtype(dtype), bearing)
+    if key not in engines:
+        engines[key] = DistanceEngine(dtype=dtype, bearing=bearing)
+    return engines[key]
+
+
+def compute_distances(lat1, lon1, lat2, lon2, dtype=np.float64, bearing: bool = False) -> dict:
+    """
+    Calculate all the distances of a batch of trips with the engine of the
+    current thread for `dtype` and `bearing`.
+
+    Returns:
+    - dict: Distance name to numpy array.
+    """
+    engine = get_distance_engine(dtype=dtype, bearing=bearing)
+    distances = engine.compute(lat1, lon1, lat2, lon2)
+    return dict(zip(engine.names, distances))
@@ -0,0 +1,57 @@
+import sys
+import logging
+import subprocess
+from yaml import safe_load
+from pathlib import Path
+from src.logger import CustomLogger, create_log_path
+from src.data.storage import read_storage_format
+
+## Logging
+# set the logger path
+log_file_path = create_log_path('feature_pipeline')
+# create the custom logger object
+pipeline_logger = CustomLogger(logger_name='feature_pipeline',
+                               log_filename=log_file_path)
+# set the level of logging to INFO
+pipeline_logger.set_log_level(level=logging.INFO)
+
+
+def read_fused_enabled(input_file) -> bool:
+    with open(input_file) as f:
+        params = safe_load(f)
+    fused_params = params.get('fused_features') or {}
+    return bool(fused_params.get('enabled', False))
+
+
+def staged_commands(input_files:list, storage_format:str) -> list[list]:
+    # the commands of the modify_features, build_features and data_preprocessing
+    # stages, every stage reads the files written by the previous one
+    splits = [Path(input_file).stem for input_file in input_files]
+    return [['src/features/modify_features.py', *input_files],
+            ['src/features/build_features.py',
+             *[f'data/processed/transformations/{split}.{storage_format}' for split in splits]],
+            ['src/features/data_preprocessing.py',
+             *[f'{split}.{storage_format}' for split in splits]]]
+
+
+def main():
+    # current file path
+    current_path = Path(__file__)
+    # root directory path
+    root_path = current_path.parent.parent.parent
+    # input files of the modify_features stage
+    input_files = sys.argv[1:]
+    if read_fused_enabled('params.yaml'):
+        from src.features.fused_features import run_fused_features
+        # the later stages of the pipeline read the intermediate files too
+        run_fused_features(root_path, input_files, emit_intermediates=True)
+        pipeline_logger.save_logs(msg='features built by the fused stage', log_level='info')
+        return
+    storage_format = read_storage_format('params.yaml')
+    for command in staged_commands(input_files, storage_format):
+        subprocess.run([sys.executable, *command], cwd=root_path, check=True)
+        pipeline_logger.save_logs(msg=f'{Path(command[0]).stem} stage finished', log_level='info')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import sys
+import joblib
+import logging
+from yaml import safe_load
+from pathlib import Path
+from src.logger import CustomLogger, create_log_path
+from src.data.storage import read_storage_format, data_file_path, read_data, write_data
+from src.features.modify_features import input_modifications, target_modifications
+from src.features.build_features import build_features, read_distance_dtype
+from src.features.distances import DistanceEngine
+from src.features.data_preprocessing import fit_transformers, apply_transformers, save_transformers
+
+# the splits are processed in this order so the transformers are fitted
+# on the train split before val and test are transformed
+SPLIT_ORDER = ['train', 'val', 'test']
+
+## Logging
+# set the logger path
+log_file_path = create_log_path('fused_features')
+# create the custom logger object
+fused_logger = CustomLogger(logger_name='fused_features',
+                            log_filename=log_file_path)
+# set the level of logging to INFO
+fused_logger.set_log_level(level=logging.INFO)
+
+
+def read_params(input_file) -> tuple[list, bool]:
+    with open(input_file) as f:
+        params = safe_load(f)
+    percentiles = list(params['data_preprocessing']['percentiles'])
+    fused_params = params.get('fused_features') or {}
+    emit_intermediates = bool(fused_params.get('emit_intermediates', False))
+    return percentiles, emit_intermediates
+
+
+def run_fused_features(root_path:Path, input_files:list, emit_intermediates:bool):
+    """
+    Run the modify_features, build_features and data_preprocessing stages
+    on the input files in one pass per split.
+
+    Parameters:
+    - root_path (Path): Root directory of the project.
+    - input_files (list): Input files of the modify_features stage,
+      relative to root_path.
+    - emit_intermediates (bool): Also write the outputs of the
+      modify_features and build_features stages.
+    """
+    # parameters from params file
+    percentiles, _ = read_params('params.yaml')
+    storage_format = read_storage_format('params.yaml')
+    # distances in the precision of the build_features stage
+    distance_engine = DistanceEngine(dtype=read_distance_dtype('params.yaml'))
+    # output paths, the intermediate ones are only written for debugging
+    transformations_path = root_path / 'data' / 'processed' / 'transformations'
+    build_features_path = root_path / 'data' / 'processed' / 'build-features'
+    save_data_path = root_path / 'data' / 'processed' / 'final'
+    save_transformers_path = root_path / 'models' / 'transformers'
+    for path in [save_data_path, save_transformers_path]:
+        path.mkdir(parents=True, exist_ok=True)
+    if emit_intermediates:
+        for path in [transformations_path, build_features_path]:
+            path.mkdir(parents=True, exist_ok=True)
+
+    # input files by split name
+    input_paths = {Path(path).stem: root_path / path for path in input_files}
+    preprocessor = output_transformer = None
+    for split in sorted(input_paths, key=SPLIT_ORDER.index):
+        # read the split once
+        df = read_data(input_paths[split])
+        # modify_features stage
+        df = input_modifications(dataframe=df)
+        if split in ('train', 'val'):
+            df = target_modifications(dataframe=df)
+        if emit_intermediates:
+            write_data(df, data_file_path(transformations_path, split, storage_format))
+        # build_features stage
+        df = build_features(df, engine=distance_engine)
+        if emit_intermediates:
+            write_data(df, data_file_path(build_features_path, split, storage_format))
+        # data_preprocessing stage
+        if split == 'train':
+            outlier_transformer, preprocessor, output_transformer = fit_transformers(
+                dataframe=df, percentiles=percentiles)
+            save_transformers(save_transformers_path, outlier_transformer,
+                              preprocessor, output_transformer)
+        elif preprocessor is None:
+            # the train split was not passed, use the saved transformers
+            preprocessor = joblib.load(save_transformers_path / 'preprocessor.joblib')
+            output_transformer = joblib.load(save_transformers_path / 'output_transformer.joblib')
+        df = apply_transformers(dataframe=df, preprocessor=preprocessor,
+                                output_transformer=output_transformer)
+        write_data(df, data_file_path(save_data_path, split, storage_format))
+        fused_logger.save_logs(msg=f'{split} split processed in a single pass with shape {df.shape}',
+                               log_level='info')
+
+
+def main():
+    # current file path
+    current_path = Path(__file__)
+    # root directory path
+    root_path = current_path.parent.parent.parent
+    _, emit_intermediates = read_params('params.yaml')
+    run_fused_features(root_path, sys.argv[1:], emit_intermediates=emit_intermediates)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,22 @@
 import sys
 import logging
+from functools import partial
 import numpy as np
 import pandas as pd
 import seaborn as sns
 import matplotlib.pyplot as plt
 from pathlib import Path
 from src.logger import CustomLogger, create_log_path
+from src.features.datetime_features import make_datetime_columns, PICKUP_DATETIME_FORMAT
+from src.data.storage import (read_streaming_params, read_storage_format, data_file_path,
+                              read_data as read_data_file, write_data, iter_chunks, ChunkWriter)
+from src.features.parallel import read_parallel_params, is_parallel, run_sharded
 
 
 TARGET_COLUMN = 'trip_duration'
 PLOT_PATH = Path("reports/figures/target_distribution.png")
+# root directory path
+root_path = Path(__file__).parent.parent.parent
 
 ## Logging
 # set the logger path
@@ -34,7 +41,8 @@ def drop_above_two_hundred_minutes(dataframe: pd.DataFrame, target_column: str)
     # max value of target column to checjk the outliers are removed
     max_value = new_dataframe[target_column].max()
     modify_logger.save_logs(msg=f'The max value in target column after transformation is {max_value} and the state of transformation is {max_value <= 200}')
-    if max_value <= 200:
+    # a chunk can be left without rows after filtering
+    if new_dataframe.empty or max_value <= 200:
         return new_dataframe
     else:
         raise ValueError('Outlier target values not removed from the data')        
@@ -78,16 +86,12 @@ def make_datetime_features(dataframe: pd.DataFrame) -> pd.DataFrame:
     # number of rows and column before transformation
     original_number_of_rows, original_number_of_columns = new_dataframe.shape
     
-    # convert the column to datetime column
-    new_dataframe['pickup_datetime'] = pd.to_datetime(new_dataframe['pickup_datetime'])
-    modify_logger.save_logs(msg=f'pickup_datetime column converted to datetime {new_dataframe["pickup_datetime"].dtype}')
-    
-    # do the modifications
-    new_dataframe.loc[:,'pickup_hour'] = new_dataframe['pickup_datetime'].dt.hour 
-    new_dataframe.loc[:,'pickup_date'] = new_dataframe['pickup_datetime'].dt.day
-    new_dataframe.loc[:,'pickup_month'] = new_dataframe['pickup_datetime'].dt.month
-    new_dataframe.loc[:,'pickup_day'] = new_dataframe['pickup_datetime'].dt.weekday
-    new_dataframe.loc[:,'is_weekend'] = new_dataframe.apply(lambda row: row['pickup_day'] >= 5,axis=1).astype('int')
+    # parse the column with the fixed format and compute all the features
+    # in one vectorized pass, shared with the prediction service
+    datetime_columns = make_datetime_columns(new_dataframe['pickup_datetime'])
+    modify_logger.save_logs(msg=f'pickup_datetime column parsed with format {PICKUP_DATETIME_FORMAT}')
+    for column_name, values in datetime_columns.items():
+        new_dataframe[column_name] = values
     
     # drop the redundant date time column
     new_dataframe = new_dataframe.drop(columns=['pickup_datetime'])
@@ -124,25 +128,27 @@ def input_modifications(dataframe: pd.DataFrame) -> pd.DataFrame:
     return df_with_datetime_features
 
    
-def target_modifications(dataframe: pd.DataFrame, target_column: str=TARGET_COLUMN) -> pd.DataFrame:
+def target_modifications(dataframe: pd.DataFrame, target_column: str=TARGET_COLUMN,
+                         plot: bool=True) -> pd.DataFrame:
     # convert the target column from seconds to minutes
     minutes_dataframe = convert_target_to_minutes(dataframe,target_column)
     # remove target values greater than 200
     target_outliers_removed_df = drop_above_two_hundred_minutes(minutes_dataframe,target_column)
     # plot the target column
-    plot_target(dataframe=target_outliers_removed_df,target_column=target_column,
-                save_path=root_path / PLOT_PATH)
+    if plot:
+        plot_target(dataframe=target_outliers_removed_df,target_column=target_column,
+                    save_path=root_path / PLOT_PATH)
     modify_logger.save_logs('Modifications with the target feature complete')
     return target_outliers_removed_df
 
 # read the dataframe from location
 def read_data(data_path):
-    df = pd.read_csv(data_path)
+    df = read_data_file(data_path)
     return df
 
 # save the dataframe to location
 def save_data(dataframe: pd.DataFrame,save_path: Path):
-    dataframe.to_csv(save_path,index=False)
+    write_data(dataframe,save_path)
     
     
 # TODO 1. Make a function to read the dataframe from the dvc.yaml file
@@ -151,21 +157,62 @@ def save_data(dataframe: pd.DataFrame,save_path: Path):
 # ? Should logging be added to each function or the main function for specific steps
 
 
-def main(data_path,filename):
+def main(data_path,split):
     # read the data into dataframe
     df = read_data(data_path)
     # do the modifications on the input data
     df_input_modifications = input_modifications(dataframe=df)
     # check whether the input file has target column
-    if (filename == "train.csv") or (filename == "val.csv"):
+    if split in ("train","val"):
         df_final = target_modifications(dataframe=df_input_modifications)  
     else:
         df_final = df_input_modifications
         
     return df_final
-        
+
+
+def main_streaming(data_path,split,save_path,chunksize):
+    # modify the data chunk by chunk and append every chunk to the output
+    with ChunkWriter(save_path) as writer:
+        for chunk in iter_chunks(data_path,chunksize=chunksize):
+            df_input_modifications = input_modifications(dataframe=chunk)
+            if split in ("train","val"):
+                # the distribution plot needs the whole target, skip it per chunk
+                df_input_modifications = target_modifications(dataframe=df_input_modifications,
+                                                              plot=False)
+            writer.write(df_input_modifications)
+    modify_logger.save_logs(msg=f'{split} split modified in chunks of {chunksize} rows, {writer.rows} rows written')
+
+
+def modify_shard(dataframe,split):
+    # row-wise modifications of a part of a split, the plot is made on the whole target
+    df_final = input_modifications(dataframe=dataframe)
+    if split in ("train","val"):
+        df_final = target_modifications(dataframe=df_final,plot=False)
+    return df_final
+
+
+def main_parallel(data_paths,save_paths,n_workers,shard_rows):
+    # modify all the splits at once on a process pool
+    splits = [data_path.stem for data_path in data_paths]
+    tasks = [(partial(modify_shard,split=split),read_data(data_path))
+             for split, data_path in zip(splits,data_paths)]
+    results = run_sharded(tasks,n_workers=n_workers,shard_rows=shard_rows)
+    for split, df_final, save_path in zip(splits,results,save_paths):
+        if split in ("train","val"):
+            plot_target(dataframe=df_final,target_column=TARGET_COLUMN,
+                        save_path=root_path / PLOT_PATH)
+        save_data(df_final,save_path)
+        modify_logger.save_logs(msg=f'{save_path.name} saved at the destination folder')
+
 
 if __name__ == "__main__":
+    # read the streaming and parallel parameters
+    streaming_params = read_streaming_params('params.yaml')
+    parallel_params = read_parallel_params('params.yaml')
+    storage_format = read_storage_format('params.yaml')
+    # the splits are saved after they are all processed in parallel mode
+    data_paths, save_paths = [], []
     for ind in range(1,4):
         # read the input file name from command
         input_file_path = sys.argv[ind]
@@ -175,14 +222,28 @@ if __name__ == "__main__":
         root_path = current_path.parent.parent.parent
         # input data path
         data_path = root_path / input_file_path
-        # get the file name
-        filename = data_path.parts[-1]
-        # call the main function
-        df_final = main(data_path=data_path,filename=filename)
+        # get the split name (train, val or test)
+        split = data_path.stem
         # save the dataframe
         output_path = root_path / "data/processed/transformations"
         # make the directory if not available
         output_path.mkdir(parents=True,exist_ok=True)
+        save_path = data_file_path(output_path,split,storage_format)
+        if streaming_params['enabled']:
+            main_streaming(data_path=data_path,split=split,
+                           save_path=save_path,
+                           chunksize=streaming_params['chunksize'])
+            continue
+        if is_parallel(parallel_params):
+            data_paths.append(data_path)
+            save_paths.append(save_path)
+            continue
+        # call the main function
+        df_final = main(data_path=data_path,split=split)
         # save the data
-        save_data(df_final,output_path / filename)
-        modify_logger.save_logs(msg=f'{filename} saved at the destination folder')
\ No newline at end of file
+        save_data(df_final,save_path)
+        modify_logger.save_logs(msg=f'{save_path.name} saved at the destination folder')
+    if data_paths:
+        main_parallel(data_paths=data_paths,save_paths=save_paths,
+                      n_workers=parallel_params['n_workers'],
+                      shard_rows=parallel_params['shard_rows'])
@@ -1,33 +1,59 @@
 from sklearn.base import BaseEstimator, TransformerMixin, OneToOneFeatureMixin
 import pandas as pd
 import numpy as np
+from src.features.tdigest import TDigest
 
 class OutliersRemover(TransformerMixin,OneToOneFeatureMixin, BaseEstimator):
-    
-    def __init__(self, percentile_values:list,col_subset:list):
+    """
+    Removes the rows with a value outside the percentile range in any of the
+    columns of col_subset.
+
+    With quantile_method='exact' the bounds are the exact quantiles of the
+    data passed to fit. With quantile_method='tdigest' the bounds are
+    approximated by one t-digest per column, which can also be updated chunk
+    by chunk with partial_fit for data larger than memory.
+    """
+
+    def __init__(self, percentile_values:list,col_subset:list,
+                 quantile_method:str='exact',compression:float=1000):
         self.percentile_values = percentile_values
         self.col_subset = col_subset
-        
+        self.quantile_method = quantile_method
+        self.compression = compression
+
     def fit(self,X,y=None):
-        # make a copy of X
-        X = X.copy()
-    
-        self.quantiles_ = []
-        
-        for col in self.col_subset:
-            lower_bound = X.loc[:,col].quantile(q=self.percentile_values[0])
-            upper_bound = X.loc[:,col].quantile(q=self.percentile_values[1])
-            
-            self.quantiles_.append((lower_bound,upper_bound))
-                  
-        return self 
-        
+        if self.quantile_method == 'tdigest':
+            # start new sketches and fit them on the whole data
+            self.digests_ = [TDigest(compression=self.compression) for _ in self.col_subset]
+            return self.partial_fit(X)
+        if self.quantile_method != 'exact':
+            raise ValueError(f'Unknown quantile method {self.quantile_method}')
+        # lower and upper bounds of all the columns in a single call
+        bounds = np.nanquantile(X.loc[:,self.col_subset].to_numpy(dtype=np.float64),
+                                q=self.percentile_values,axis=0)
+        self.quantiles_ = [(float(lower_bound),float(upper_bound))
+                           for lower_bound, upper_bound in bounds.T]
+
+        return self
+
+    def partial_fit(self,X,y=None):
+        # update the column sketches with another chunk
+        if not hasattr(self,'digests_'):
+            self.digests_ = [TDigest(compression=self.compression) for _ in self.col_subset]
+        for digest, col in zip(self.digests_,self.col_subset):
+            digest.update(X[col].to_numpy())
+        self.quantiles_ = [tuple(float(bound) for bound in digest.quantile(self.percentile_values))
+                           for digest in self.digests_]
+
+        return self
+
     def transform(self,X):
-        X = X.copy()
-       
-        for ind,col in enumerate(self.col_subset):
-            lower_bound, upper_bound = self.quantiles_[ind]
-            filter_df = X[(X.loc[:,col] >= lower_bound) & (X.loc[:,col] <= upper_bound)]
-            X = filter_df
-            
-        return X
\ No newline at end of file
+        # a row is kept when all its values are within bounds
+        mask = np.ones(len(X),dtype=bool)
+        for col, (lower_bound, upper_bound) in zip(self.col_subset,self.quantiles_):
+            values = X[col].to_numpy()
+            mask &= (values >= lower_bound) & (values <= upper_bound)
+        if mask.all():
+            return X
+
+        return X.iloc[np.flatnonzero(mask)]
@@ -0,0 +1,66 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from src.data.storage import read_params_section
+
+DEFAULT_PARALLEL_PARAMS = {'n_workers': 1,
+                           'shard_rows': 0}
+
+
+def read_parallel_params(params_path='params.yaml') -> dict:
+    """
+    Read the `parallel` section of the parameters file.
+
+    `n_workers` of 1 keeps the sequential per-split loops, 0 uses every core.
+    `shard_rows` of 0 gives one task per split, otherwise a split is cut
+    into row ranges of at most shard_rows rows.
+    """
+    params = dict(DEFAULT_PARALLEL_PARAMS)
+    params.update(read_params_section('parallel', params_path))
+    if params['n_workers'] == 0:
+        params['n_workers'] = os.cpu_count()
+    return params
+
+
+def is_parallel(parallel_params: dict) -> bool:
+    return parallel_params['n_workers'] > 1
+
+
+def split_rows(dataframe: pd.DataFrame, shard_rows: int) -> list[pd.DataFrame]:
+    """
+    Cut a dataframe into consecutive row ranges of at most shard_rows rows.
+    """
+    if shard_rows <= 0 or len(dataframe) <= shard_rows:
+        return [dataframe]
+    bounds = np.arange(0, len(dataframe), shard_rows)
+    return [dataframe.iloc[start:start + shard_rows] for start in bounds]
+
+
+def run_sharded(tasks: list, n_workers: int, shard_rows: int = 0) -> list[pd.DataFrame]:
+    """
+    Apply row-wise functions to dataframes on a process pool.
+
+    Every dataframe is cut into row shards and all the shards of all the
+    tasks share the same pool, so small splits do not wait for the large
+    one. The shards are concatenated back in their original order, which
+    makes the output the same as calling every function on its whole
+    dataframe.
+
+    Parameters:
+    - tasks (list): (function, dataframe) pairs, the function must be
+      picklable (module level or a functools.partial of one).
+    - n_workers (int): Number of worker processes.
+    - shard_rows (int): Maximum rows per shard, 0 for one shard per dataframe.
+
+    Returns:
+    - list: The output dataframe of every task, in the order of tasks.
+    """
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        futures = [[executor.submit(function, shard) for shard in split_rows(dataframe, shard_rows)]
+                   for function, dataframe in tasks]
+        results = []
+        for task_futures in futures:
+            shards = [future.result() for future in task_futures]
+            results.append(shards[0] if len(shards) == 1 else pd.concat(shards))
+    return results
@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+
+
+class ReservoirSample:
+    """
+    Uniform random sample of bounded size over a stream of dataframe chunks.
+
+    Every row gets a random key and the rows with the `size` smallest keys
+    are kept, which is the same as sampling `size` rows from the whole stream
+    without replacement.
+
+    Parameters:
+    - size (int): Maximum number of rows kept in the sample.
+    - random_state (int): Seed for the random keys.
+    """
+
+    def __init__(self, size: int, random_state=None):
+        self.size = size
+        self.sample = None
+        self.rows_seen = 0
+        self._keys = None
+        self._rng = np.random.default_rng(random_state)
+
+    def update(self, chunk: pd.DataFrame):
+        keys = self._rng.random(len(chunk))
+        self.rows_seen += len(chunk)
+        if self.sample is not None:
+            chunk = pd.concat([self.sample, chunk], ignore_index=True)
+            keys = np.concatenate([self._keys, keys])
+        if len(chunk) > self.size:
+            # keep the rows with the smallest keys, in their original order
+            keep = np.sort(np.argpartition(keys, self.size)[:self.size])
+            chunk = chunk.iloc[keep].reset_index(drop=True)
+            keys = keys[keep]
+        self.sample = chunk
+        self._keys = keys
+        return self
@@ -0,0 +1,80 @@
+import numpy as np
+
+
+class TDigest:
+    """
+    Mergeable sketch of a distribution for approximate quantiles with
+    bounded memory (Dunning's merging t-digest).
+
+    Values are kept as weighted centroids. The k1 scale function
+    k(q) = compression / (2 pi) * asin(2q - 1) limits every centroid to a
+    unit range of k, so centroids are small near the tails and the extreme
+    quantiles stay accurate. At most about compression / 2 centroids are kept
+    after each update, whatever the number of values seen.
+
+    Parameters:
+    - compression (float): Accuracy of the sketch, higher keeps more centroids.
+    """
+
+    def __init__(self, compression: float = 1000):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.count = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def update(self, values):
+        """
+        Add a batch of values, NaN values are ignored.
+        """
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return self
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        self._compress(np.concatenate([self.means, values]),
+                       np.concatenate([self.weights, np.ones(len(values))]))
+        return self
+
+    def merge(self, other: 'TDigest'):
+        """
+        Add the centroids of another digest, for sketches built on separate chunks.
+        """
+        if other.count == 0:
+            return self
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress(np.concatenate([self.means, other.means]),
+                       np.concatenate([self.weights, other.weights]))
+        return self
+
+    def _compress(self, means: np.ndarray, weights: np.ndarray):
+        order = np.argsort(means, kind='stable')
+        means = means[order]
+        weights = weights[order]
+        total = weights.sum()
+        # scale function at the quantile of the center of every centroid
+        q = (np.cumsum(weights) - weights / 2) / total
+        k = self.compression / (2 * np.pi) * np.arcsin(2 * q - 1)
+        # neighbours in the same unit range of k are merged into one centroid
+        cluster = np.floor(k - k[0]).astype(np.int64)
+        starts = np.flatnonzero(np.r_[True, cluster[1:] != cluster[:-1]])
+        merged_weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / merged_weights
+        self.weights = merged_weights
+        self.count = total
+
+    def quantile(self, q) -> np.ndarray:
+        """
+        Approximate quantiles, interpolated between the centroid centers and
+        the exact minimum and maximum.
+        """
+        q = np.asarray(q, dtype=np.float64)
+        if self.count == 0:
+            return np.full(q.shape, np.nan)
+        centers = np.cumsum(self.weights) - self.weights / 2
+        positions = np.concatenate([[0.0], centers, [self.count]])
+        values = np.concatenate([[self.min], self.means, [self.max]])
+        return np.interp(q * self.count, positions, values)
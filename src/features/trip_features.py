@@ -0,0 +1,49 @@
+import numpy as np
+from src.features.distances import compute_distances
+from src.features.datetime_features import make_datetime_columns
+
+# input features of the model in the order of the training data
+TRIP_FEATURE_NAMES = ['vendor_id',
+                      'passenger_count',
+                      'pickup_longitude',
+                      'pickup_latitude',
+                      'dropoff_longitude',
+                      'dropoff_latitude',
+                      'pickup_hour',
+                      'pickup_date',
+                      'pickup_month',
+                      'pickup_day',
+                      'is_weekend',
+                      'haversine_distance',
+                      'euclidean_distance',
+                      'manhattan_distance']
+
+
+def make_trip_features(vendor_id, passenger_count,
+                       pickup_longitude, pickup_latitude,
+                       dropoff_longitude, dropoff_latitude,
+                       pickup_datetime) -> dict:
+    """
+    Derive the model features for a batch of raw trips with the same code
+    used by the training pipeline.
+
+    Returns:
+    - dict: Feature name to numpy array, in the order of TRIP_FEATURE_NAMES.
+    """
+    pickup_longitude = np.asarray(pickup_longitude, dtype=np.float64)
+    pickup_latitude = np.asarray(pickup_latitude, dtype=np.float64)
+    dropoff_longitude = np.asarray(dropoff_longitude, dtype=np.float64)
+    dropoff_latitude = np.asarray(dropoff_latitude, dtype=np.float64)
+
+    features = {'vendor_id': np.asarray(vendor_id),
+                'passenger_count': np.asarray(passenger_count),
+                'pickup_longitude': pickup_longitude,
+                'pickup_latitude': pickup_latitude,
+                'dropoff_longitude': dropoff_longitude,
+                'dropoff_latitude': dropoff_latitude}
+    features.update(make_datetime_columns(pickup_datetime))
+
+    features.update(compute_distances(pickup_latitude, pickup_longitude,
+                                      dropoff_latitude, dropoff_longitude))
+
+    return features
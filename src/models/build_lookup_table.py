@@ -0,0 +1,144 @@
+import sys
+import json
+import joblib
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from src.data.storage import read_data, read_params_section
+from src.features.distances import compute_distances
+from src.serving.compiled_preprocessor import CompiledPreprocessor
+from src.serving.lookup_table import DurationLookupTable, COORDINATE_NAMES, HOURS, WEEKDAYS
+from src.models.scoring_utils import predict_minutes
+
+
+TARGET = 'trip_duration'
+model_name = 'xgbreg.joblib'
+
+# features that are not on the grid take these values
+DEFAULT_LOOKUP_PARAMS = {'grid_size': 16,
+                         'vendor_ids': [1, 2],
+                         'passenger_count': 1,
+                         'pickup_month': 3,
+                         'pickup_date': 15}
+
+
+def read_lookup_params(params_path='params.yaml') -> dict:
+    params = dict(DEFAULT_LOOKUP_PARAMS)
+    params.update(read_params_section('lookup_table', params_path))
+    return params
+
+
+def make_grid_features(grid:DurationLookupTable, pickup_cell:int, input_names:list,
+                       lookup_params:dict) -> np.ndarray:
+    # feature matrix of every dropoff cell x hour x weekday x vendor for one
+    # pickup cell, in the row order of table[pickup_cell]
+    pickup_latitudes, pickup_longitudes = grid.cell_centers()
+    dropoff_latitudes, dropoff_longitudes = grid.cell_centers(dropoff=True)
+    n_dropoff_cells = len(dropoff_latitudes)
+    # the distances only depend on the dropoff cell
+    distances = compute_distances(np.full(n_dropoff_cells,pickup_latitudes[pickup_cell]),
+                                  np.full(n_dropoff_cells,pickup_longitudes[pickup_cell]),
+                                  dropoff_latitudes,dropoff_longitudes)
+    dropoff_cell, hour, weekday, vendor = (index.ravel() for index in np.meshgrid(
+        np.arange(n_dropoff_cells),np.arange(HOURS),np.arange(WEEKDAYS),
+        np.arange(len(grid.vendor_ids)),indexing='ij'))
+    columns = {'vendor_id': np.asarray(grid.vendor_ids)[vendor],
+               'passenger_count': lookup_params['passenger_count'],
+               'pickup_latitude': pickup_latitudes[pickup_cell],
+               'pickup_longitude': pickup_longitudes[pickup_cell],
+               'dropoff_latitude': dropoff_latitudes[dropoff_cell],
+               'dropoff_longitude': dropoff_longitudes[dropoff_cell],
+               'pickup_hour': hour,
+               'pickup_date': lookup_params['pickup_date'],
+               'pickup_month': lookup_params['pickup_month'],
+               'pickup_day': weekday,
+               'is_weekend': (weekday >= 5).astype(int)}
+    columns.update({name: values[dropoff_cell] for name, values in distances.items()})
+    X = np.empty((len(dropoff_cell),len(input_names)))
+    for ind, name in enumerate(input_names):
+        X[:,ind] = columns[name]
+    return X
+
+
+def build_table(model, preprocessor, output_transformer, bounds, lookup_params:dict) -> DurationLookupTable:
+    grid_size = lookup_params['grid_size']
+    n_cells = grid_size * grid_size
+    vendor_ids = lookup_params['vendor_ids']
+    grid = DurationLookupTable(table=np.empty((n_cells,n_cells,HOURS,WEEKDAYS,len(vendor_ids)),
+                                              dtype=np.float16),
+                               bounds=bounds,grid_size=grid_size,vendor_ids=vendor_ids)
+    # the compiled preprocessor gives the same features without the dataframe overhead
+    compiled_preprocessor = CompiledPreprocessor.from_column_transformer(preprocessor)
+    for pickup_cell in range(n_cells):
+        X = make_grid_features(grid,pickup_cell,compiled_preprocessor.input_names,lookup_params)
+        durations = predict_minutes(model,compiled_preprocessor,output_transformer,X)
+        grid.table[pickup_cell] = durations.reshape(grid.table.shape[1:])
+    return grid
+
+
+def error_summary(errors:np.ndarray) -> dict:
+    absolute_errors = np.abs(errors)
+    return {'mae': float(absolute_errors.mean()),
+            'rmse': float(np.sqrt(np.mean(errors ** 2))),
+            'p50_abs': float(np.percentile(absolute_errors,50)),
+            'p90_abs': float(np.percentile(absolute_errors,90)),
+            'p99_abs': float(np.percentile(absolute_errors,99))}
+
+
+def error_report(grid:DurationLookupTable, model, preprocessor, output_transformer,
+                 data:pd.DataFrame) -> dict:
+    # accuracy given up by the table against the full model, in minutes
+    X = data[list(preprocessor.feature_names_in_)]
+    model_durations = predict_minutes(model,preprocessor,output_transformer,X)
+    table_durations = grid.lookup({name: data[name].to_numpy() for name in data.columns})
+    outside_grid = np.zeros(len(data),dtype=bool)
+    for ind, name in enumerate(COORDINATE_NAMES):
+        lower, upper = grid.bounds[ind]
+        outside_grid |= (data[name].to_numpy() < lower) | (data[name].to_numpy() > upper)
+    report = {'rows': len(data),
+              'grid_size': grid.grid_size,
+              'outside_grid_fraction': float(outside_grid.mean()),
+              'table_vs_model': error_summary(table_durations - model_durations)}
+    if TARGET in data.columns:
+        actual = data[TARGET].to_numpy()
+        report['model_vs_actual'] = error_summary(model_durations - actual)
+        report['table_vs_actual'] = error_summary(table_durations - actual)
+    return report
+
+
+def main():
+    # current file path
+    current_path = Path(__file__)
+    # root directory path
+    root_path = current_path.parent.parent.parent
+    lookup_params = read_lookup_params('params.yaml')
+    # artifacts directory, models by default or container_models for the image
+    artifacts_path = root_path / (sys.argv[2] if len(sys.argv) > 2 else 'models')
+    # load the trained model and transformers
+    model = joblib.load(artifacts_path / 'models' / model_name)
+    transformers_path = artifacts_path / 'transformers'
+    preprocessor = joblib.load(transformers_path / 'preprocessor.joblib')
+    output_transformer = joblib.load(transformers_path / 'output_transformer.joblib')
+    # the grid covers the coordinates kept by the outlier removal in training
+    outlier_transformer = joblib.load(transformers_path / 'outliers.joblib')
+    grid = build_table(model,preprocessor,output_transformer,
+                       bounds=outlier_transformer.quantiles_,
+                       lookup_params=lookup_params)
+    # save the table
+    table_output_path = artifacts_path / 'lookup'
+    table_output_path.mkdir(exist_ok=True)
+    grid.save(table_output_path / 'duration_table.npy')
+    # compare the table with the model on the validation data
+    data = read_data(root_path / 'data' / 'processed' / 'build-features' / sys.argv[1])
+    report = error_report(grid,model,preprocessor,output_transformer,data)
+    report_path = root_path / 'reports' / 'lookup_table_error.json'
+    report_path.parent.mkdir(exist_ok=True)
+    with open(report_path,'w') as f:
+        json.dump(report,f,indent=2)
+
+    print(f"\nLookup table of {grid.table.nbytes / 2**20:.1f} MiB, "
+          f"MAE against the model on {sys.argv[1]} is {report['table_vs_model']['mae']:.2f} minutes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+import os
+import sys
+import joblib
+import numpy as np
+import pandas as pd
+from time import perf_counter
+from collections import deque
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from src.data.storage import read_params_section, iter_chunks, ChunkWriter
+from src.features.trip_features import make_trip_features, TRIP_FEATURE_NAMES
+from src.models.scoring_utils import predict_minutes, set_model_threads
+from src.serving.compiled_preprocessor import CompiledPreprocessor, check_parity
+
+
+model_name = 'xgbreg.joblib'
+ID_COLUMN = 'id'
+PREDICTION_COLUMN = 'predicted_duration'
+
+# raw trip columns the features are derived from, as in data/raw/extracted
+RAW_COLUMNS = ['vendor_id',
+               'passenger_count',
+               'pickup_longitude',
+               'pickup_latitude',
+               'dropoff_longitude',
+               'dropoff_latitude',
+               'pickup_datetime']
+
+DEFAULT_BULK_SCORING_PARAMS = {'chunksize': 200000,
+                               'n_workers': 0,
+                               'max_pending_chunks': 0,
+                               'model_threads': 1}
+
+# artifacts of the current process, loaded once by init_worker
+worker_artifacts = None
+
+
+def read_bulk_scoring_params(params_path='params.yaml') -> dict:
+    """
+    Read the `bulk_scoring` section of the parameters file.
+
+    `n_workers` of 0 uses every core and 1 scores in the main process.
+    `max_pending_chunks` of 0 allows two chunks per worker to be read ahead.
+    """
+    params = dict(DEFAULT_BULK_SCORING_PARAMS)
+    params.update(read_params_section('bulk_scoring', params_path))
+    if params['n_workers'] == 0:
+        params['n_workers'] = os.cpu_count()
+    if params['max_pending_chunks'] == 0:
+        params['max_pending_chunks'] = 2 * params['n_workers']
+    return params
+
+
+def load_scoring_artifacts(artifacts_path:Path, model_threads:int=None) -> dict:
+    """
+    Load the model and the transformers saved by the training pipeline.
+
+    Parameters:
+    - artifacts_path (Path): Directory with models/ and transformers/, like `models`.
+    - model_threads (int): Threads of the model per process, None keeps its setting.
+
+    Returns:
+    - dict: model, compiled preprocessor and output transformer.
+    """
+    artifacts_path = Path(artifacts_path)
+    model = joblib.load(artifacts_path / 'models' / model_name)
+    if model_threads is not None:
+        # several processes each using every core would oversubscribe the machine
+        set_model_threads(model,model_threads)
+    transformers_path = artifacts_path / 'transformers'
+    preprocessor = joblib.load(transformers_path / 'preprocessor.joblib')
+    output_transformer = joblib.load(transformers_path / 'output_transformer.joblib')
+    # the compiled preprocessor gives the same features without the dataframe overhead
+    compiled_preprocessor = CompiledPreprocessor.from_column_transformer(preprocessor)
+    check_parity(preprocessor,compiled_preprocessor,X=compiled_preprocessor.make_probe(),model=model)
+    return {'model': model,
+            'preprocessor': compiled_preprocessor,
+            'output_transformer': output_transformer}
+
+
+def init_worker(artifacts_path:Path, model_threads:int):
+    global worker_artifacts
+    worker_artifacts = load_scoring_artifacts(artifacts_path,model_threads)
+
+
+def make_feature_matrix(chunk:pd.DataFrame, input_names:list) -> np.ndarray:
+    """
+    Model input features of a chunk of raw or processed trips.
+
+    Processed trips (data/processed/build-features) already have the
+    features, raw trips (data/raw/extracted) get them from the same code
+    as the training pipeline and the API. No row is dropped, so the output
+    has one row per input trip.
+    """
+    if all(name in chunk.columns for name in TRIP_FEATURE_NAMES):
+        features = {name: chunk[name].to_numpy() for name in TRIP_FEATURE_NAMES}
+    else:
+        missing = [name for name in RAW_COLUMNS if name not in chunk.columns]
+        if missing:
+            raise ValueError(f'Trips need either the features {TRIP_FEATURE_NAMES} '
+                             f'or the raw columns {RAW_COLUMNS}, missing {missing}')
+        features = make_trip_features(**{name: chunk[name].to_numpy() for name in RAW_COLUMNS})
+    return np.column_stack([np.asarray(features[name],dtype=np.float64) for name in input_names])
+
+
+def score_chunk(chunk:pd.DataFrame) -> pd.DataFrame:
+    # predictions in minutes of one chunk, with the trip ids when the input has them
+    X = make_feature_matrix(chunk,worker_artifacts['preprocessor'].input_names)
+    durations = predict_minutes(worker_artifacts['model'],worker_artifacts['preprocessor'],
+                                worker_artifacts['output_transformer'],X)
+    scored = pd.DataFrame({PREDICTION_COLUMN: durations})
+    if ID_COLUMN in chunk.columns:
+        scored.insert(0,ID_COLUMN,chunk[ID_COLUMN].to_numpy())
+    return scored
+
+
+def needed_columns(chunk:pd.DataFrame) -> pd.DataFrame:
+    # only the columns used for scoring are sent to the workers
+    return chunk[[name for name in chunk.columns
+                  if name in TRIP_FEATURE_NAMES or name in RAW_COLUMNS or name == ID_COLUMN]]
+
+
+def score_file(input_path:Path, output_path:Path, artifacts_path:Path, params:dict,
+               report=print) -> dict:
+    """
+    Score every trip of a file chunk by chunk and write the predictions in
+    the order of the input.
+
+    Chunks are scored on a process pool whose workers load the artifacts
+    once. At most `max_pending_chunks` chunks are read ahead of the writer,
+    so the memory used does not depend on the size of the file.
+
+    Parameters:
+    - input_path (Path): CSV, parquet or feather file of raw or processed trips.
+    - output_path (Path): Output file, its extension gives the format.
+    - artifacts_path (Path): Directory with models/ and transformers/.
+    - params (dict): The `bulk_scoring` parameters.
+    - report (callable): Receives a progress line after every chunk.
+
+    Returns:
+    - dict: Rows scored, seconds taken and rows per second.
+    """
+    chunks = (needed_columns(chunk) for chunk in iter_chunks(input_path,chunksize=params['chunksize']))
+    start = perf_counter()
+
+    def write(writer:ChunkWriter, scored:pd.DataFrame):
+        writer.write(scored)
+        elapsed = perf_counter() - start
+        report(f'{writer.rows:,} rows scored in {elapsed:.1f}s, {writer.rows / elapsed:,.0f} rows/s')
+
+    with ChunkWriter(output_path) as writer:
+        if params['n_workers'] == 1:
+            init_worker(artifacts_path,params['model_threads'])
+            for chunk in chunks:
+                write(writer,score_chunk(chunk))
+        else:
+            with ProcessPoolExecutor(max_workers=params['n_workers'],initializer=init_worker,
+                                     initargs=(artifacts_path,params['model_threads'])) as executor:
+                # futures in input order, the oldest is written before more chunks are read
+                pending = deque()
+                for chunk in chunks:
+                    pending.append(executor.submit(score_chunk,chunk))
+                    if len(pending) >= params['max_pending_chunks']:
+                        write(writer,pending.popleft().result())
+                while pending:
+                    write(writer,pending.popleft().result())
+        rows = writer.rows
+    elapsed = perf_counter() - start
+    return {'rows': rows,
+            'seconds': elapsed,
+            'rows_per_s': rows / elapsed if elapsed else 0.0}
+
+
+def main():
+    # current file path
+    current_path = Path(__file__)
+    # root directory path
+    root_path = current_path.parent.parent.parent
+    # input trips and output predictions
+    input_path = Path(sys.argv[1])
+    output_path = Path(sys.argv[2])
+    # artifacts of the training pipeline, models/ by default
+    artifacts_path = Path(sys.argv[3]) if len(sys.argv) > 3 else root_path / 'models'
+    params = read_bulk_scoring_params('params.yaml')
+    output_path.parent.mkdir(parents=True,exist_ok=True)
+    stats = score_file(input_path,output_path,artifacts_path,params,
+                       report=lambda line: print(line,file=sys.stderr,flush=True))
+
+    print(f"\nScored {stats['rows']:,} trips of {input_path} into {output_path} "
+          f"in {stats['seconds']:.1f}s, {stats['rows_per_s']:,.0f} rows/s "
+          f"with {params['n_workers']} workers")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import os
+import numpy as np
+from time import perf_counter
+from concurrent.futures import ThreadPoolExecutor
+from src.data.storage import read_params_section
+
+DEFAULT_CV_PARAMS = {'folds': 10,
+                     'thread_budget': 0,
+                     'fold_jobs': 0}
+
+
+def read_cv_params(params_path='params.yaml') -> dict:
+    """
+    Read the `cross_validation` section of the parameters file.
+
+    `thread_budget` of 0 uses every core. `fold_jobs` of 0 trains as many
+    folds at once as the budget allows, up to the number of folds.
+    """
+    params = dict(DEFAULT_CV_PARAMS)
+    params.update(read_params_section('cross_validation', params_path))
+    if params['thread_budget'] == 0:
+        params['thread_budget'] = os.cpu_count()
+    return params
+
+
+def split_thread_budget(thread_budget: int, folds: int, fold_jobs: int = 0) -> tuple[int, int]:
+    """
+    Split a number of threads between folds trained at once and threads per fold.
+
+    Returns:
+    - tuple: (fold_jobs, nthread) with fold_jobs * nthread <= thread_budget.
+    """
+    if fold_jobs <= 0:
+        fold_jobs = min(folds, thread_budget)
+    fold_jobs = max(1, min(fold_jobs, folds, thread_budget))
+    return fold_jobs, max(1, thread_budget // fold_jobs)
+
+
+def kfold_indices(n_rows: int, folds: int) -> list[tuple[np.ndarray, np.ndarray]]:
+    # consecutive folds without shuffling, the splits of cross_val_score(cv=folds)
+    from sklearn.model_selection import KFold
+
+    return list(KFold(n_splits=folds).split(np.empty((n_rows, 0))))
+
+
+def cross_validate(model, X, y, folds: int = 10, thread_budget: int = None,
+                   fold_jobs: int = 0) -> dict:
+    """
+    R² of every fold of a K-fold cross validation of an XGBoost regressor
+    within a fixed number of threads.
+
+    The training data is converted to a DMatrix once, every fold trains and
+    scores on row slices of it. `fold_jobs` folds are trained at once on
+    threads, XGBoost releases the GIL while training, and each of them uses
+    `thread_budget // fold_jobs` threads, instead of every fold using every
+    core.
+
+    Parameters:
+    - model (XGBRegressor): Gives the training parameters and the number of rounds.
+    - X, y: Training features and target.
+    - folds (int): Number of folds.
+    - thread_budget (int): Threads for the whole cross validation, every core when None.
+    - fold_jobs (int): Folds trained at once, 0 chooses from the budget.
+
+    Returns:
+    - dict: r2 and seconds of every fold, fold_jobs and nthread.
+    """
+    import xgboost as xgb
+    from sklearn.metrics import r2_score
+
+    fold_jobs, nthread = split_thread_budget(thread_budget or os.cpu_count(), folds, fold_jobs)
+    params = {name: value for name, value in model.get_xgb_params().items() if value is not None}
+    params.pop('n_jobs', None)
+    params['nthread'] = nthread
+    num_boost_round = model.get_num_boosting_rounds()
+    dmatrix = xgb.DMatrix(X, label=y, nthread=thread_budget or os.cpu_count())
+    labels = np.asarray(y, dtype=np.float64)
+
+    def run_fold(indices: tuple[np.ndarray, np.ndarray]) -> tuple[float, float]:
+        train_index, test_index = indices
+        start = perf_counter()
+        booster = xgb.train(params, dmatrix.slice(train_index), num_boost_round=num_boost_round)
+        predictions = booster.predict(dmatrix.slice(test_index))
+        return r2_score(labels[test_index], predictions), perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=fold_jobs) as executor:
+        results = list(executor.map(run_fold, kfold_indices(len(labels), folds)))
+    return {'r2': [float(r2) for r2, _ in results],
+            'seconds': [seconds for _, seconds in results],
+            'fold_jobs': fold_jobs,
+            'nthread': nthread}
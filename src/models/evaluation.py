@@ -0,0 +1,92 @@
+import numpy as np
+
+
+class RegressionMetrics:
+    """
+    Mergeable state of the regression metrics of one or several slices.
+
+    Every slice keeps its row count, the running mean and sum of squared
+    deviations of the actual values (merged with the parallel formula of
+    Chan et al.) and the sums of the squared, absolute and squared log
+    errors. Chunks can be added with `update` and states computed on
+    different chunks or files combined with `merge`, which gives the same
+    metrics as a single pass over all the rows.
+
+    Parameters:
+    - n_slices (int): Number of slices, the rows are assigned to one with
+      the `slices` argument of `update`.
+    """
+
+    def __init__(self, n_slices: int = 1):
+        self.count = np.zeros(n_slices, dtype=np.int64)
+        self.mean_actual = np.zeros(n_slices)
+        self.m2_actual = np.zeros(n_slices)
+        self.sum_squared_error = np.zeros(n_slices)
+        self.sum_absolute_error = np.zeros(n_slices)
+        self.sum_squared_log_error = np.zeros(n_slices)
+
+    def _combine(self, count, mean_actual, m2_actual, sum_squared_error,
+                 sum_absolute_error, sum_squared_log_error):
+        total = self.count + count
+        with np.errstate(invalid='ignore', divide='ignore'):
+            delta = mean_actual - self.mean_actual
+            self.mean_actual = np.where(total > 0, self.mean_actual + delta * count / total, 0.0)
+            self.m2_actual = np.where(total > 0,
+                                      self.m2_actual + m2_actual + delta ** 2 * self.count * count / total,
+                                      0.0)
+        self.count = total
+        self.sum_squared_error += sum_squared_error
+        self.sum_absolute_error += sum_absolute_error
+        self.sum_squared_log_error += sum_squared_log_error
+
+    def update(self, actual: np.ndarray, predicted: np.ndarray, slices: np.ndarray = None):
+        """
+        Add a chunk of actual and predicted values.
+
+        Parameters:
+        - actual, predicted (np.ndarray): Values of the chunk.
+        - slices (np.ndarray): Slice index of every row, all rows go to slice 0 when None.
+        """
+        actual = np.asarray(actual, dtype=np.float64)
+        predicted = np.asarray(predicted, dtype=np.float64)
+        n_slices = len(self.count)
+        slices = np.zeros(len(actual), dtype=np.intp) if slices is None else np.asarray(slices)
+
+        def per_slice(weights=None):
+            return np.bincount(slices, weights=weights, minlength=n_slices)
+
+        count = per_slice().astype(np.int64)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean_actual = np.where(count > 0, per_slice(actual) / count, 0.0)
+        errors = predicted - actual
+        # negative durations are clipped to 0 before taking the log
+        log_errors = np.log1p(np.clip(predicted, 0, None)) - np.log1p(np.clip(actual, 0, None))
+        self._combine(count, mean_actual,
+                      per_slice((actual - mean_actual[slices]) ** 2),
+                      per_slice(errors ** 2),
+                      per_slice(np.abs(errors)),
+                      per_slice(log_errors ** 2))
+
+    def merge(self, other: 'RegressionMetrics') -> 'RegressionMetrics':
+        # add the rows counted by another state with the same slices
+        self._combine(other.count, other.mean_actual, other.m2_actual, other.sum_squared_error,
+                      other.sum_absolute_error, other.sum_squared_log_error)
+        return self
+
+    def results(self) -> list[dict]:
+        """
+        Returns:
+        - list: rows, r2, rmse, mae and rmsle of every slice, None for an empty slice.
+        """
+        results = []
+        for ind, count in enumerate(self.count.tolist()):
+            if count == 0:
+                results.append({'rows': 0, 'r2': None, 'rmse': None, 'mae': None, 'rmsle': None})
+                continue
+            m2_actual = self.m2_actual[ind]
+            results.append({'rows': count,
+                            'r2': float(1 - self.sum_squared_error[ind] / m2_actual) if m2_actual > 0 else None,
+                            'rmse': float(np.sqrt(self.sum_squared_error[ind] / count)),
+                            'mae': float(self.sum_absolute_error[ind] / count),
+                            'rmsle': float(np.sqrt(self.sum_squared_log_error[ind] / count))})
+        return results
@@ -0,0 +1,144 @@
+import sys
+import json
+import joblib
+import numpy as np
+from pathlib import Path
+from src.serving.compiled_preprocessor import CompiledPreprocessor
+from src.serving.tree_predictor import TreeEnsemble, ExportedModel
+
+
+model_name = 'xgbreg.joblib'
+
+
+def tree_depth(left:np.ndarray, right:np.ndarray, root:int=0) -> int:
+    # number of splits on the longest path from the root
+    depth, level = 0, [root]
+    while True:
+        level = [child for node in level if left[node] >= 0
+                 for child in (left[node], right[node])]
+        if not level:
+            return depth
+        depth += 1
+
+
+def concatenate_trees(trees:list, **kwargs) -> TreeEnsemble:
+    # shift the child indices of every tree by the nodes before it
+    offsets = np.cumsum([0] + [len(tree['left']) for tree in trees[:-1]])
+    columns = {name: [] for name in ['feature','threshold','left','right','default_left','value']}
+    for offset, tree in zip(offsets,trees):
+        is_leaf = tree['left'] < 0
+        for name in ['left','right']:
+            columns[name].append(np.where(is_leaf,-1,tree[name] + offset))
+        # leaves point at feature 0 so the traversal can gather without masking
+        columns['feature'].append(np.where(is_leaf,0,tree['feature']))
+        for name in ['threshold','default_left','value']:
+            columns[name].append(tree[name])
+    return TreeEnsemble(roots=offsets,
+                        max_depth=max(tree_depth(tree['left'],tree['right']) for tree in trees),
+                        **{name: np.concatenate(values) for name, values in columns.items()},
+                        **kwargs)
+
+
+def export_xgboost(model) -> TreeEnsemble:
+    # the json model keeps the float32 thresholds and leaf values exactly
+    booster = model.get_booster()
+    learner = json.loads(booster.save_raw(raw_format='json'))['learner']
+    objective = learner['objective']['name']
+    if objective != 'reg:squarederror':
+        raise ValueError(f'Objective {objective} is not supported')
+    gradient_booster = learner['gradient_booster']
+    if gradient_booster['name'] != 'gbtree':
+        raise ValueError(f"Booster {gradient_booster['name']} is not supported")
+    trees = []
+    for tree in gradient_booster['model']['trees']:
+        if any(tree['split_type']):
+            raise ValueError('Categorical splits are not supported')
+        left = np.array(tree['left_children'])
+        # leaves keep their value in split_conditions
+        split_conditions = np.array(tree['split_conditions'],dtype=np.float32)
+        trees.append({'feature': np.array(tree['split_indices']),
+                      'threshold': split_conditions,
+                      'left': left,
+                      'right': np.array(tree['right_children']),
+                      'default_left': np.array(tree['default_left'],dtype=bool),
+                      'value': np.where(left < 0,split_conditions,0)})
+    best_iteration = getattr(model,'best_iteration',None)
+    if best_iteration is not None:
+        trees = trees[:best_iteration + 1]
+    # base_score is saved as '5E-1' or '[5E-1]' depending on the version
+    base_score = float(learner['learner_model_param']['base_score'].strip('[]'))
+    return concatenate_trees(trees,base_score=np.float32(base_score),
+                             comparison='less',aggregation='sum')
+
+
+def export_random_forest(model) -> TreeEnsemble:
+    trees = []
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        missing_go_to_left = getattr(tree,'missing_go_to_left',
+                                     np.zeros(tree.node_count,dtype=bool))
+        trees.append({'feature': tree.feature,
+                      'threshold': tree.threshold,
+                      'left': tree.children_left,
+                      'right': tree.children_right,
+                      'default_left': np.asarray(missing_go_to_left,dtype=bool),
+                      'value': tree.value[:,0,0]})
+    return concatenate_trees(trees,comparison='less_equal',aggregation='mean')
+
+
+def export_model(model, preprocessor, output_transformer) -> ExportedModel:
+    from sklearn.ensemble import RandomForestRegressor
+
+    if isinstance(model,RandomForestRegressor):
+        trees = export_random_forest(model)
+    else:
+        trees = export_xgboost(model)
+    if output_transformer.method != 'yeo-johnson' or not output_transformer.standardize:
+        raise ValueError('Only a standardized yeo-johnson target transform is supported')
+    return ExportedModel(preprocessor=CompiledPreprocessor.from_column_transformer(preprocessor),
+                         trees=trees,
+                         output_mean=output_transformer._scaler.mean_,
+                         output_scale=output_transformer._scaler.scale_,
+                         output_lambdas=output_transformer.lambdas_)
+
+
+def check_exported_model(exported:ExportedModel, model, preprocessor, output_transformer,
+                         n_rows:int=10000) -> float:
+    # the exported model has to give the same minutes as the original one
+    import pandas as pd
+
+    X = exported.preprocessor.make_probe(n_rows=n_rows)
+    X_frame = pd.DataFrame(X,columns=exported.preprocessor.input_names)
+    expected = output_transformer.inverse_transform(
+        model.predict(preprocessor.transform(X_frame)).reshape(-1,1)).ravel()
+    actual = exported.predict_durations(X)
+    max_difference = float(np.max(np.abs(expected - actual)))
+    if max_difference > 0:
+        raise AssertionError(f'Exported model differs by {max_difference} minutes')
+    return max_difference
+
+
+def main():
+    # current file path
+    current_path = Path(__file__)
+    # root directory path
+    root_path = current_path.parent.parent.parent
+    # artifacts directory, models by default or container_models for the image
+    artifacts_path = root_path / (sys.argv[1] if len(sys.argv) > 1 else 'models')
+    model = joblib.load(artifacts_path / 'models' / model_name)
+    preprocessor = joblib.load(artifacts_path / 'transformers' / 'preprocessor.joblib')
+    output_transformer = joblib.load(artifacts_path / 'transformers' / 'output_transformer.joblib')
+    # export and check against the original model
+    exported = export_model(model,preprocessor,output_transformer)
+    max_difference = check_exported_model(exported,model,preprocessor,output_transformer)
+    # save the exported model
+    export_path = artifacts_path / 'export'
+    export_path.mkdir(exist_ok=True)
+    exported.save(export_path / 'model')
+
+    print(f'\nExported {len(exported.trees.roots)} trees of depth up to {exported.trees.max_depth}, '
+          f'max abs difference {max_difference} minutes')
+
+
+if __name__ == "__main__":
+    main()
@@ -1,58 +1,149 @@
+import os
 import sys
+import json
 import joblib
+import numpy as np
 import pandas as pd
 from pathlib import Path
-from sklearn.metrics import r2_score
+from concurrent.futures import ProcessPoolExecutor
+from src.data.storage import read_streaming_params, iter_chunks
+from src.features.parallel import read_parallel_params
+from src.models.evaluation import RegressionMetrics
+from src.models.scoring_utils import set_model_threads
 
 
 TARGET = 'trip_duration'
 model_name = 'xgbreg.joblib'
+HOUR_COLUMN = 'pickup_hour'
+VENDOR_COLUMN = 'vendor_id'
+HOURS = 24
+
+# artifacts of the current process, loaded once by init_evaluator
+evaluator_artifacts = None
+
+
+def load_vendors(transformers_path:Path) -> list:
+    # the one-hot columns of the processed data only keep the vendors after the first one
+    preprocessor = joblib.load(transformers_path / 'preprocessor.joblib')
+    return preprocessor.named_transformers_['one-hot'].categories_[0].tolist()
+
+
+def load_evaluation_artifacts(root_path:Path, model_threads:int=None) -> dict:
+    """
+    Load the model, the target transformer and the vendor categories.
+
+    Parameters:
+    - root_path (Path): Root of the project with models/models and models/transformers.
+    - model_threads (int): Threads of the model, None keeps its setting.
+    """
+    model = joblib.load(root_path / 'models' / 'models' / model_name)
+    if model_threads is not None:
+        set_model_threads(model,model_threads)
+    transformers_path = root_path / 'models' / 'transformers'
+    output_transformer = joblib.load(transformers_path / 'output_transformer.joblib')
+    return {'model': model,
+            'output_transformer': output_transformer,
+            'vendors': load_vendors(transformers_path)}
+
+
+def init_evaluator(root_path:Path, model_threads:int=None):
+    global evaluator_artifacts
+    evaluator_artifacts = load_evaluation_artifacts(root_path,model_threads)
+
+
+def vendor_index(chunk:pd.DataFrame, vendors:list) -> np.ndarray:
+    # index in vendors of every row, the dropped first vendor has no column and stays 0
+    index = np.zeros(len(chunk),dtype=np.intp)
+    for ind, vendor in enumerate(vendors[1:],start=1):
+        column = f'{VENDOR_COLUMN}_{vendor}'
+        if column in chunk.columns:
+            index[chunk[column].to_numpy() == 1] = ind
+    return index
+
+
+def evaluate_file(data_path:Path, chunksize:int) -> dict:
+    """
+    Score a processed file chunk by chunk and accumulate its metrics.
+
+    The predictions and the target are converted back to minutes before
+    the errors are computed.
+
+    Returns:
+    - dict: RegressionMetrics of all the rows, of every pickup hour and of every vendor.
+    """
+    model = evaluator_artifacts['model']
+    output_transformer = evaluator_artifacts['output_transformer']
+    vendors = evaluator_artifacts['vendors']
+    metrics = {'all': RegressionMetrics(),
+               'by_hour': RegressionMetrics(HOURS),
+               'by_vendor': RegressionMetrics(len(vendors))}
+    for chunk in iter_chunks(data_path,chunksize=chunksize):
+        X = chunk.drop(columns=TARGET)
+        # convert the predictions and the target back to minutes
+        predicted = output_transformer.inverse_transform(model.predict(X).reshape(-1,1)).ravel()
+        actual = output_transformer.inverse_transform(chunk[TARGET].to_numpy().reshape(-1,1)).ravel()
+        metrics['all'].update(actual,predicted)
+        metrics['by_hour'].update(actual,predicted,
+                                  slices=np.clip(chunk[HOUR_COLUMN].to_numpy().astype(np.intp),0,HOURS - 1))
+        metrics['by_vendor'].update(actual,predicted,slices=vendor_index(chunk,vendors))
+    return metrics
+
+
+def metrics_report(metrics:dict, vendors:list) -> dict:
+    # overall metrics with the slices nested by hour and vendor
+    report = metrics['all'].results()[0]
+    report['by_hour'] = {str(hour): result for hour, result in enumerate(metrics['by_hour'].results())}
+    report['by_vendor'] = {str(vendor): result
+                           for vendor, result in zip(vendors,metrics['by_vendor'].results())}
+    return report
+
+
+def evaluate_files(data_paths:list, root_path:Path, chunksize:int, n_workers:int) -> list[dict]:
+    """
+    Evaluate the files, in parallel on up to n_workers processes.
+
+    Every process loads the artifacts once and evaluates whole files, the
+    model threads are split between the processes.
+
+    Returns:
+    - list: RegressionMetrics of every file, in the order of data_paths.
+    """
+    n_workers = min(n_workers,len(data_paths))
+    if n_workers <= 1:
+        init_evaluator(root_path)
+        return [evaluate_file(data_path,chunksize) for data_path in data_paths]
+    model_threads = max(1,os.cpu_count() // n_workers)
+    with ProcessPoolExecutor(max_workers=n_workers,initializer=init_evaluator,
+                             initargs=(root_path,model_threads)) as executor:
+        return list(executor.map(evaluate_file,data_paths,[chunksize] * len(data_paths)))
+
 
-def load_dataframe(path):
-    df = pd.read_csv(path)
-    return df
-    
-    
-def make_X_y(dataframe:pd.DataFrame,target_column:str):
-    df_copy = dataframe.copy()
-    
-    X = df_copy.drop(columns=target_column)
-    y = df_copy[target_column]
-    
-    return X, y
-
-def get_predictions(model,X:pd.DataFrame):
-    # get predictions on data
-    y_pred = model.predict(X)
-    
-    return y_pred
-    
-def calculate_r2_score(y_actual,y_predicted):
-    score = r2_score(y_actual,y_predicted)
-    return score
-    
 def main():
     # current file path
     current_path = Path(__file__)
     # root directory path
     root_path = current_path.parent.parent.parent
-    for ind in range(1,3):
-        # read input file path
-        data_path = root_path / 'data/processed/final' /sys.argv[ind]
-        # load the data 
-        data = load_dataframe(data_path)
-        # split the data into X and y
-        X_test, y_test = make_X_y(dataframe=data,target_column=TARGET)
-        # model path
-        model_path = root_path / 'models' / 'models' / model_name
-        # load the model
-        model = joblib.load(model_path)
-        # get predictions from model
-        y_pred = get_predictions(model=model,X=X_test)
-        # calcuate the r2 score
-        score = calculate_r2_score(y_actual=y_test,y_predicted=y_pred)
-        
-        print(f'\nThe score for dataset {sys.argv[ind]} is {score}')
-    
+    # input files
+    filenames = sys.argv[1:]
+    data_paths = [root_path / 'data/processed/final' / filename for filename in filenames]
+    chunksize = read_streaming_params('params.yaml')['chunksize']
+    n_workers = read_parallel_params('params.yaml')['n_workers']
+    # score every file once and compute all the metrics in the same pass
+    file_metrics = evaluate_files(data_paths,root_path,chunksize,n_workers)
+    vendors = load_vendors(root_path / 'models' / 'transformers')
+    report = {Path(filename).stem: metrics_report(metrics,vendors)
+              for filename, metrics in zip(filenames,file_metrics)}
+    # metrics file tracked by dvc
+    report_path = root_path / 'reports' / 'metrics.json'
+    report_path.parent.mkdir(exist_ok=True)
+    with open(report_path,'w') as f:
+        json.dump(report,f,indent=2)
+
+    for filename in filenames:
+        result = report[Path(filename).stem]
+        print(f"\nThe score for dataset {filename} is R2 {result['r2']:.4f}, "
+              f"RMSE {result['rmse']:.2f}, MAE {result['mae']:.2f} minutes, RMSLE {result['rmsle']:.4f}")
+
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
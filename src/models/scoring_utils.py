@@ -0,0 +1,27 @@
+import numpy as np
+
+
+def predict_minutes(model, preprocessor, output_transformer, X) -> np.ndarray:
+    # preprocess, predict and convert the predictions back to minutes
+    predictions = model.predict(preprocessor.transform(X)).reshape(-1,1)
+    return output_transformer.inverse_transform(predictions).ravel()
+
+
+def set_model_threads(model, model_threads:int):
+    """
+    Limit the threads a trained model predicts with.
+
+    XGBoost models get the `nthread` of their booster, set directly because
+    models pickled by older versions of xgboost fail in `set_params`.
+    Other estimators get their `n_jobs`, like RandomForestRegressor.
+
+    Raises:
+    - TypeError: If the model has neither a booster nor an `n_jobs` parameter.
+    """
+    if hasattr(model,'get_booster'):
+        model.get_booster().set_param({'nthread': model_threads})
+    elif hasattr(model,'get_params') and 'n_jobs' in model.get_params():
+        model.set_params(n_jobs=model_threads)
+    else:
+        raise TypeError(f'Cannot set the threads of a {type(model).__name__} model, '
+                        f'it has neither an XGBoost booster nor an n_jobs parameter')
@@ -5,13 +5,14 @@ from yaml import safe_load
 from xgboost import XGBRegressor
 from sklearn.ensemble import RandomForestRegressor
 from pathlib import Path
+from src.data.storage import read_data
 
 
 TARGET = 'trip_duration'
 
 
 def load_dataframe(path):
-    df = pd.read_csv(path)
+    df = read_data(path)
     return df
     
     
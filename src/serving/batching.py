@@ -0,0 +1,197 @@
+import asyncio
+from collections import deque
+from dataclasses import dataclass, field
+
+import numpy as np
+
+
+@dataclass
+class _PendingItem:
+    item: object
+    future: asyncio.Future
+    enqueued_at: float
+
+
+@dataclass
+class BatchingStats:
+    """
+    Running statistics of the batches executed by a MicroBatcher.
+
+    Queueing delay is the time between a request entering the queue and its
+    batch being handed to the worker thread.
+    """
+    window: int = 1000
+    batches: int = 0
+    rows: int = 0
+    largest_batch_size: int = 0
+    max_queue_delay_ms: float = 0.0
+    recent_batch_sizes: deque = field(init=False)
+    recent_queue_delays_ms: deque = field(init=False)
+
+    def __post_init__(self):
+        self.recent_batch_sizes = deque(maxlen=self.window)
+        self.recent_queue_delays_ms = deque(maxlen=self.window)
+
+    def record(self, batch_size: int, queue_delays_ms: list):
+        self.batches += 1
+        self.rows += batch_size
+        self.largest_batch_size = max(self.largest_batch_size, batch_size)
+        self.max_queue_delay_ms = max(self.max_queue_delay_ms, max(queue_delays_ms))
+        self.recent_batch_sizes.append(batch_size)
+        self.recent_queue_delays_ms.extend(queue_delays_ms)
+
+    def summary(self) -> dict:
+        summary = {
+            'batches': self.batches,
+            'rows': self.rows,
+            'mean_batch_size': self.rows / self.batches if self.batches else 0.0,
+            'largest_batch_size': self.largest_batch_size,
+            'max_queue_delay_ms': self.max_queue_delay_ms,
+        }
+        # percentiles over the most recent batches only
+        if self.recent_queue_delays_ms:
+            delays = np.fromiter(self.recent_queue_delays_ms, dtype=float)
+            sizes = np.fromiter(self.recent_batch_sizes, dtype=float)
+            summary['p50_batch_size'] = float(np.percentile(sizes, 50))
+            summary['p50_queue_delay_ms'] = float(np.percentile(delays, 50))
+            summary['p99_queue_delay_ms'] = float(np.percentile(delays, 99))
+        return summary
+
+
+class MicroBatcher:
+    """
+    Merges concurrent single-item requests into batches.
+
+    Items are held for at most `max_wait_ms` after the oldest one arrived, or
+    until `max_batch_size` items are waiting, and are then passed as one list
+    to `predict_fn` in a worker thread. `predict_fn` must return one result
+    per item in the same order; every caller gets its own result back.
+
+    Up to `max_concurrent_batches` batches are scored at the same time, so a
+    multi-worker executor is kept busy. While they are all running, new
+    items keep queueing and go out together in the next batch.
+
+    Parameters:
+    - predict_fn (callable): Function scoring a list of items.
+    - max_batch_size (int): Maximum number of items in one batch.
+    - max_wait_ms (float): Maximum time the oldest item waits for a batch to fill.
+    - executor (concurrent.futures.Executor): Executor running predict_fn, the
+      loop's default executor when None.
+    - max_concurrent_batches (int): Batches scored at the same time, usually
+      the number of workers of the executor.
+    - call (coroutine function): Runs predict_fn on a batch instead of the
+      executor, for example ScoringExecutor.call.
+    """
+
+    def __init__(self, predict_fn, max_batch_size: int = 64,
+                 max_wait_ms: float = 2.0, executor=None, max_concurrent_batches: int = 1,
+                 call=None):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.executor = executor
+        self.call = call
+        self.max_concurrent_batches = max_concurrent_batches
+        self.stats = BatchingStats()
+        self._pending = deque()
+        self._wakeup = None
+        self._worker = None
+        self._slots = None
+        self._in_flight = set()
+
+    async def start(self):
+        self._wakeup = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.max_concurrent_batches)
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        # batches being scored finish, their callers get their results
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+        # fail whatever is still waiting instead of leaving callers hanging
+        while self._pending:
+            pending = self._pending.popleft()
+            if not pending.future.done():
+                pending.future.set_exception(RuntimeError('Micro-batcher stopped'))
+
+    async def submit(self, item):
+        """
+        Queue a single item and wait for its result.
+        """
+        if self._worker is None:
+            raise RuntimeError('Micro-batcher is not running')
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append(_PendingItem(item=item, future=future,
+                                          enqueued_at=loop.time()))
+        self._wakeup.set()
+        return await future
+
+    async def _next_batch(self) -> list:
+        loop = asyncio.get_running_loop()
+        # wait for the first item
+        while not self._pending:
+            self._wakeup.clear()
+            await self._wakeup.wait()
+        # keep collecting until the batch is full or the oldest item is due
+        deadline = self._pending[0].enqueued_at + self.max_wait_ms / 1000
+        while len(self._pending) < self.max_batch_size:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                break
+        batch_size = min(len(self._pending), self.max_batch_size)
+        return [self._pending.popleft() for _ in range(batch_size)]
+
+    async def _score(self, batch: list):
+        items = [pending.item for pending in batch]
+        try:
+            if self.call is not None:
+                results = await self.call(self.predict_fn, items)
+            else:
+                results = await asyncio.get_running_loop().run_in_executor(self.executor,
+                                                                           self.predict_fn, items)
+        except Exception as e:
+            for pending in batch:
+                if not pending.future.done():
+                    pending.future.set_exception(e)
+            return
+        finally:
+            self._slots.release()
+        for pending, result in zip(batch, results):
+            if not pending.future.done():
+                pending.future.set_result(result)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # wait for a free slot first, items arriving meanwhile join the next batch
+            await self._slots.acquire()
+            try:
+                batch = await self._next_batch()
+            except asyncio.CancelledError:
+                self._slots.release()
+                raise
+            # callers that went away do not need to be scored
+            batch = [pending for pending in batch if not pending.future.done()]
+            if not batch:
+                self._slots.release()
+                continue
+            dispatched_at = loop.time()
+            self.stats.record(batch_size=len(batch),
+                              queue_delays_ms=[(dispatched_at - pending.enqueued_at) * 1000
+                                               for pending in batch])
+            task = asyncio.create_task(self._score(batch))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
@@ -0,0 +1,47 @@
+import numpy as np
+
+
+class BoosterPredictor:
+    """
+    Predictions straight from the native XGBoost Booster with
+    `inplace_predict`, skipping the sklearn wrapper and the DMatrix
+    conversion.
+
+    The booster gets its own thread count, so several worker processes on
+    one machine do not each start a thread per core for single rows.
+
+    Parameters:
+    - booster (xgboost.Booster): Trained booster, copied before its
+      parameters are changed.
+    - nthread (int): Threads used per prediction call, None keeps the booster setting.
+    - params (dict): Extra booster parameters, for example {'device': 'cpu'}.
+    - iteration_range (tuple): Trees used, (0, 0) for all of them.
+    """
+
+    def __init__(self, booster, nthread=None, params=None, iteration_range=(0, 0)):
+        self.booster = booster.copy()
+        booster_params = dict(params or {})
+        if nthread is not None:
+            booster_params['nthread'] = nthread
+        if booster_params:
+            self.booster.set_param(booster_params)
+        self.iteration_range = tuple(iteration_range)
+
+    @classmethod
+    def from_sklearn(cls, model, **kwargs):
+        """
+        Take the booster of a fitted XGBRegressor, using the same trees as
+        its predict method.
+        """
+        best_iteration = getattr(model, 'best_iteration', None)
+        if 'iteration_range' not in kwargs and best_iteration is not None:
+            kwargs['iteration_range'] = (0, best_iteration + 1)
+        return cls(model.get_booster(), **kwargs)
+
+    def predict(self, X) -> np.ndarray:
+        """
+        Predict from a 2D feature matrix in the column order of the model.
+        """
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        return self.booster.inplace_predict(X, iteration_range=self.iteration_range,
+                                            validate_features=False)
@@ -0,0 +1,108 @@
+import threading
+import time
+from collections import OrderedDict
+
+COORDINATE_FIELDS = ['pickup_latitude',
+                     'pickup_longitude',
+                     'dropoff_latitude',
+                     'dropoff_longitude']
+
+# fields kept as they are in a quantized key
+QUANTIZED_KEY_FIELDS = ['vendor_id',
+                        'pickup_hour',
+                        'pickup_day']
+
+
+class PredictionCache:
+    """
+    Thread safe LRU cache of predicted durations with a time to live.
+
+    By default the key holds every model feature, so a cached duration is
+    exactly the one the model would return. With coordinate_decimals set,
+    trips with the same vendor, pickup hour and weekday whose coordinates
+    round to the same values share a key, trading accuracy for hits.
+
+    Parameters:
+    - feature_names (list): Fields of the exact key.
+    - max_size (int): Maximum number of cached durations.
+    - ttl_seconds (float): Time after which a cached duration expires.
+    - coordinate_decimals (int): Decimals kept in quantized keys, None for exact keys.
+    - clock (callable): Source of the current time in seconds.
+    """
+
+    def __init__(self, feature_names, max_size: int = 100000, ttl_seconds: float = 300.0,
+                 coordinate_decimals=None, clock=time.monotonic):
+        self.feature_names = list(feature_names)
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.coordinate_decimals = coordinate_decimals
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def make_key(self, trip) -> tuple:
+        if self.coordinate_decimals is None:
+            return tuple(getattr(trip, name) for name in self.feature_names)
+        return (tuple(getattr(trip, name) for name in QUANTIZED_KEY_FIELDS)
+                + tuple(round(getattr(trip, name), self.coordinate_decimals)
+                        for name in COORDINATE_FIELDS))
+
+    def get(self, key):
+        """
+        Cached duration of a key, None when missing or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            duration, expires_at = entry
+            if expires_at <= self.clock():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            # most recently used entries are at the end
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return duration
+
+    def put(self, key, duration: float):
+        with self._lock:
+            self._entries[key] = (duration, self.clock() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def take_counts(self) -> dict:
+        # counters since the last call, for sending them to another process
+        with self._lock:
+            counts = {'hits': self.hits, 'misses': self.misses,
+                      'evictions': self.evictions, 'expirations': self.expirations}
+            self.hits = self.misses = self.evictions = self.expirations = 0
+        return counts
+
+    def add_counts(self, counts: dict):
+        with self._lock:
+            self.hits += counts['hits']
+            self.misses += counts['misses']
+            self.evictions += counts['evictions']
+            self.expirations += counts['expirations']
+
+    def summary(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'size': len(self._entries),
+                    'max_size': self.max_size,
+                    'ttl_seconds': self.ttl_seconds,
+                    'coordinate_decimals': self.coordinate_decimals,
+                    'hits': self.hits,
+                    'misses': self.misses,
+                    'hit_rate': self.hits / lookups if lookups else 0.0,
+                    'evictions': self.evictions,
+                    'expirations': self.expirations}
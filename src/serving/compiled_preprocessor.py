@@ -0,0 +1,185 @@
+import numpy as np
+
+# names of the arrays that describe a compiled preprocessor
+ARRAY_NAMES = ['source_index', 'center', 'divisor', 'scale', 'offset', 'is_one_hot', 'category']
+
+
+class CompiledPreprocessor:
+    """
+    Flat NumPy version of the fitted ColumnTransformer from
+    `src.features.data_preprocessing.train_preprocessor`.
+
+    Every output column j is computed from a single input column as
+        out[:, j] = (X[:, source_index[j]] - center[j]) / divisor[j] * scale[j] + offset[j]
+    except the one-hot columns, which are `X[:, source_index[j]] == category[j]`.
+    The two affine steps keep the operation order of MinMaxScaler and
+    StandardScaler so the output matches the ColumnTransformer bit for bit
+    before the cast to float32.
+
+    Parameters:
+    - input_names (list): Input column names in the order of the rows passed to transform.
+    - output_names (list): Output column names in the order expected by the model.
+    - source_index (np.ndarray): Input column used by every output column.
+    - center, divisor, scale, offset (np.ndarray): Affine parameters per output column.
+    - is_one_hot (np.ndarray): Boolean mask of the one-hot output columns.
+    - category (np.ndarray): Category value of the one-hot output columns.
+    """
+
+    def __init__(self, input_names, output_names, source_index,
+                 center, divisor, scale, offset, is_one_hot, category):
+        self.input_names = list(input_names)
+        self.output_names = list(output_names)
+        self.source_index = np.asarray(source_index, dtype=np.intp)
+        self.center = np.asarray(center, dtype=np.float64)
+        self.divisor = np.asarray(divisor, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self.offset = np.asarray(offset, dtype=np.float64)
+        self.is_one_hot = np.asarray(is_one_hot, dtype=bool)
+        self.category = np.asarray(category, dtype=np.float64)
+
+    @classmethod
+    def from_column_transformer(cls, preprocessor):
+        """
+        Read the fitted parameters of the ColumnTransformer into flat arrays.
+        """
+        # sklearn is only needed to compile, not to transform
+        from sklearn.preprocessing import OneHotEncoder, MinMaxScaler, StandardScaler, FunctionTransformer
+
+        input_names = list(preprocessor.feature_names_in_)
+        columns = {name: [] for name in ARRAY_NAMES}
+
+        def add_column(source, center=0.0, divisor=1.0, scale=1.0, offset=0.0,
+                       is_one_hot=False, category=np.nan):
+            for name, value in zip(columns, [source, center, divisor, scale,
+                                             offset, is_one_hot, category]):
+                columns[name].append(value)
+
+        for name, transformer, column_spec in preprocessor.transformers_:
+            if transformer == 'drop':
+                continue
+            # column specs can be names or positions of the input columns
+            sources = [input_names.index(col) if isinstance(col, str) else int(col)
+                       for col in column_spec]
+            if len(sources) == 0:
+                continue
+            if transformer == 'passthrough' or (
+                    isinstance(transformer, FunctionTransformer) and transformer.func is None):
+                for source in sources:
+                    add_column(source)
+            elif isinstance(transformer, OneHotEncoder):
+                if getattr(transformer, 'infrequent_categories_', None) is not None and \
+                        any(cats is not None for cats in transformer.infrequent_categories_):
+                    raise ValueError(f'Infrequent categories in {name} are not supported')
+                drop_idx = transformer.drop_idx_
+                for i, source in enumerate(sources):
+                    for j, category in enumerate(transformer.categories_[i]):
+                        if drop_idx is not None and drop_idx[i] is not None and j == drop_idx[i]:
+                            continue
+                        add_column(source, is_one_hot=True, category=float(category))
+            elif isinstance(transformer, MinMaxScaler):
+                if transformer.clip:
+                    raise ValueError(f'Clipping in {name} is not supported')
+                for i, source in enumerate(sources):
+                    add_column(source, scale=transformer.scale_[i], offset=transformer.min_[i])
+            elif isinstance(transformer, StandardScaler):
+                for i, source in enumerate(sources):
+                    center = transformer.mean_[i] if transformer.with_mean else 0.0
+                    divisor = transformer.scale_[i] if transformer.with_std else 1.0
+                    add_column(source, center=center, divisor=divisor)
+            else:
+                raise ValueError(f'Transformer {name} of type {type(transformer).__name__} '
+                                 'cannot be compiled')
+
+        return cls(input_names=input_names,
+                   output_names=list(preprocessor.get_feature_names_out()),
+                   **columns)
+
+    @classmethod
+    def from_arrays(cls, arrays: dict, prefix: str = ''):
+        """
+        Rebuild a compiled preprocessor from the arrays of `to_arrays`.
+        """
+        return cls(input_names=arrays[prefix + 'input_names'].tolist(),
+                   output_names=arrays[prefix + 'output_names'].tolist(),
+                   **{name: arrays[prefix + name] for name in ARRAY_NAMES})
+
+    def to_arrays(self, prefix: str = '') -> dict:
+        """
+        The parameters as plain numpy arrays, for saving with np.savez.
+        """
+        arrays = {prefix + 'input_names': np.array(self.input_names),
+                  prefix + 'output_names': np.array(self.output_names)}
+        arrays.update({prefix + name: getattr(self, name) for name in ARRAY_NAMES})
+        return arrays
+
+    def transform(self, X: np.ndarray) -> np.ndarray:
+        """
+        Transform a 2D array with the columns in `input_names` order into the
+        float32 feature matrix of the model.
+        """
+        gathered = np.asarray(X, dtype=np.float64)[:, self.source_index]
+        output = (gathered - self.center) / self.divisor * self.scale + self.offset
+        output[:, self.is_one_hot] = gathered[:, self.is_one_hot] == self.category[self.is_one_hot]
+        return output.astype(np.float32)
+
+    def make_probe(self, n_rows: int = 1000, seed: int = 42) -> np.ndarray:
+        """
+        Random inputs spread around the fitted statistics, including unseen
+        categories, for checking the compiled transform against the original.
+        """
+        rng = np.random.default_rng(seed)
+        X = rng.integers(0, 24, size=(n_rows, len(self.input_names))).astype(np.float64)
+        for j, source in enumerate(self.source_index):
+            if self.is_one_hot[j]:
+                continue
+            # invert the affine map of a uniform draw in the output space
+            z = rng.uniform(-0.5, 1.5, size=n_rows)
+            X[:, source] = (z - self.offset[j]) / self.scale[j] * self.divisor[j] + self.center[j]
+        for source in np.unique(self.source_index[self.is_one_hot]):
+            categories = self.category[self.is_one_hot & (self.source_index == source)]
+            choices = np.append(categories, categories.max() + 1)
+            X[:, source] = rng.choice(choices, size=n_rows)
+        return X
+
+
+def check_parity(preprocessor, compiled: CompiledPreprocessor, X: np.ndarray,
+                 model=None, atol: float = 1e-5) -> float:
+    """
+    Compare the compiled transform with the ColumnTransformer and, when a
+    model is given, the predictions made from both.
+
+    Returns:
+    - float: The largest absolute difference found.
+
+    Raises:
+    - AssertionError: If the difference is larger than atol.
+    """
+    import pandas as pd
+
+    X_frame = pd.DataFrame(X, columns=compiled.input_names)
+    expected = np.asarray(preprocessor.transform(X_frame), dtype=np.float32)
+    actual = compiled.transform(X)
+    max_difference = float(np.max(np.abs(expected - actual)))
+    if model is not None:
+        expected_predictions = model.predict(preprocessor.transform(X_frame))
+        actual_predictions = model.predict(actual)
+        max_difference = max(max_difference,
+                             float(np.max(np.abs(expected_predictions - actual_predictions))))
+    if max_difference > atol:
+        raise AssertionError(f'Compiled preprocessor differs by {max_difference} (atol={atol})')
+    return max_difference
+
+
+if __name__ == "__main__":
+    import joblib
+    from pathlib import Path
+
+    # check the compiled transform against the artifacts shipped with the container
+    root_path = Path(__file__).parent.parent.parent
+    artifacts_path = root_path / 'container_models'
+    preprocessor = joblib.load(artifacts_path / 'transformers' / 'preprocessor.joblib')
+    model = joblib.load(artifacts_path / 'models' / 'xgbreg.joblib')
+    compiled = CompiledPreprocessor.from_column_transformer(preprocessor)
+    max_difference = check_parity(preprocessor, compiled,
+                                  X=compiled.make_probe(n_rows=10000), model=model)
+    print(f'Compiled preprocessor matches the pipeline, max abs difference {max_difference}')
@@ -0,0 +1,149 @@
+import numpy as np
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+ARROW = "application/vnd.apache.arrow.stream"
+
+# accepted media types and the format they map to
+MEDIA_TYPES = {JSON: JSON,
+               MSGPACK: MSGPACK,
+               "application/x-msgpack": MSGPACK,
+               ARROW: ARROW}
+
+
+class UnsupportedFormat(Exception):
+    """
+    Raised for a media type the API does not read or write, or whose
+    library (msgpack, pyarrow) is not installed.
+    """
+
+
+def media_type(header: str) -> str:
+    # media type without parameters such as charset
+    return header.split(";", 1)[0].strip().lower()
+
+
+def request_format(content_type: str = None) -> str:
+    """
+    Format of a request body from its Content-Type header, JSON when missing.
+    """
+    if not content_type:
+        return JSON
+    name = media_type(content_type)
+    if name not in MEDIA_TYPES:
+        raise UnsupportedFormat(f"Content-Type {name} is not supported, use one of {sorted(MEDIA_TYPES)}")
+    return MEDIA_TYPES[name]
+
+
+def response_format(accept: str = None, default: str = JSON) -> str:
+    """
+    Format of the response from the Accept header, in the order the client
+    listed the types. Without a usable Accept the response uses `default`,
+    the format of the request.
+    """
+    if not accept:
+        return default
+    for entry in accept.split(","):
+        name = media_type(entry)
+        if name in MEDIA_TYPES:
+            return MEDIA_TYPES[name]
+        if name in ("*/*", "application/*"):
+            return default
+    raise UnsupportedFormat(f"None of the accepted types {accept} is supported")
+
+
+def import_format_library(fmt: str):
+    # the binary formats are optional, JSON works without them
+    try:
+        if fmt == MSGPACK:
+            import msgpack
+            return msgpack
+        import pyarrow
+        import pyarrow.ipc
+        return pyarrow
+    except ImportError as error:
+        raise UnsupportedFormat(f"{fmt} needs the {error.name} package") from error
+
+
+def to_column(values, name: str) -> np.ndarray:
+    # numeric column without missing values
+    try:
+        column = np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        raise ValueError(f"Column {name} must only contain numbers") from None
+    if column.ndim != 1 or np.isnan(column).any():
+        raise ValueError(f"Column {name} must be a flat list of numbers without missing values")
+    return column
+
+
+def decode_columns(body: bytes, fmt: str, names: list) -> dict:
+    """
+    Feature columns of a binary request body.
+
+    Parameters:
+    - body (bytes): Arrow IPC stream with one column per feature, or a
+      msgpack map of columns, or a msgpack map with a `trips` list of maps.
+    - fmt (str): MSGPACK or ARROW.
+    - names (list): The feature columns to read.
+
+    Returns:
+    - dict: float64 array of every feature, all of the same length.
+    """
+    library = import_format_library(fmt)
+    if fmt == ARROW:
+        try:
+            table = library.ipc.open_stream(body).read_all()
+        except library.ArrowInvalid as error:
+            raise ValueError(f"Invalid Arrow IPC stream: {error}") from None
+        missing = [name for name in names if name not in table.column_names]
+        if missing:
+            raise ValueError(f"Missing columns {missing}")
+        # every column is converted straight from the Arrow buffers
+        return {name: to_column(table.column(name).to_numpy(), name) for name in names}
+
+    try:
+        data = library.unpackb(body)
+    except ValueError as error:
+        raise ValueError(f"Invalid msgpack body ({type(error).__name__})") from None
+    if isinstance(data, dict) and isinstance(data.get("trips"), list):
+        trips = data["trips"]
+        if not all(isinstance(trip, dict) for trip in trips):
+            raise ValueError("Every trip must be a map")
+        # every field is required, like in the JSON trips
+        for ind, trip in enumerate(trips):
+            missing = [name for name in names if name not in trip]
+            if missing:
+                raise ValueError(f"Trip {ind} is missing the fields {missing}")
+        data = {name: [trip[name] for trip in trips] for name in names}
+    if not isinstance(data, dict):
+        raise ValueError("The body must be a map of columns or a map with a trips list")
+    missing = [name for name in names if name not in data]
+    if missing:
+        raise ValueError(f"Missing columns {missing}")
+    not_lists = [name for name in names if not isinstance(data[name], (list, tuple))]
+    if not_lists:
+        raise ValueError(f"Columns {not_lists} must be lists")
+    columns = {name: to_column([np.nan if value is None else value for value in data[name]], name)
+               for name in names}
+    if len({len(column) for column in columns.values()}) > 1:
+        raise ValueError("All columns must have the same number of values")
+    return columns
+
+
+def encode_response(body: dict, fmt: str) -> bytes:
+    """
+    Binary response body. msgpack keeps the JSON structure, Arrow gets one
+    row per trip with a `duration` column (null when not scored) and an
+    `out_of_range` column when the outlier gate is on.
+    """
+    library = import_format_library(fmt)
+    if fmt == MSGPACK:
+        return library.packb(body)
+    columns = {"duration": library.array(body["durations"], type=library.float64())}
+    if "out_of_range" in body:
+        columns["out_of_range"] = library.array(body["out_of_range"], type=library.bool_())
+    table = library.table(columns)
+    sink = library.BufferOutputStream()
+    with library.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
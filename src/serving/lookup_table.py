@@ -0,0 +1,125 @@
+import json
+from pathlib import Path
+
+import numpy as np
+
+# coordinate columns in the order of the OutliersRemover bounds
+COORDINATE_NAMES = ['pickup_latitude',
+                    'pickup_longitude',
+                    'dropoff_latitude',
+                    'dropoff_longitude']
+
+HOURS = 24
+WEEKDAYS = 7
+
+
+class DurationLookupTable:
+    """
+    Trip durations precomputed on a grid of pickup cell x dropoff cell x
+    pickup hour x weekday x vendor.
+
+    The pickup and dropoff areas are each cut into grid_size x grid_size
+    cells between the bounds of their coordinates. A trip is answered by
+    the value at its five indices, coordinates outside the bounds fall in
+    the nearest border cell.
+
+    Parameters:
+    - table (np.ndarray): Durations in minutes with shape
+      (grid_size**2, grid_size**2, HOURS, WEEKDAYS, len(vendor_ids)).
+    - bounds (array-like): (lower, upper) of every column in COORDINATE_NAMES.
+    - grid_size (int): Number of cells along each coordinate.
+    - vendor_ids (list): Vendors of the last axis of the table.
+    """
+
+    def __init__(self, table: np.ndarray, bounds, grid_size: int, vendor_ids: list):
+        self.table = table
+        self.bounds = np.asarray(bounds, dtype=np.float64)
+        self.grid_size = grid_size
+        self.vendor_ids = [int(vendor_id) for vendor_id in vendor_ids]
+        n_cells = grid_size * grid_size
+        if table.shape != (n_cells, n_cells, HOURS, WEEKDAYS, len(self.vendor_ids)):
+            raise ValueError(f'Table of shape {table.shape} does not match a grid of size {grid_size} '
+                             f'and {len(self.vendor_ids)} vendors')
+
+    @classmethod
+    def load(cls, path: Path):
+        """
+        Memory map a table saved with `save`, the values are only paged in
+        when they are looked up.
+        """
+        path = Path(path)
+        with open(path.with_suffix('.json')) as f:
+            metadata = json.load(f)
+        return cls(table=np.load(path, mmap_mode='r'),
+                   bounds=metadata['bounds'],
+                   grid_size=metadata['grid_size'],
+                   vendor_ids=metadata['vendor_ids'])
+
+    def save(self, path: Path):
+        path = Path(path)
+        np.save(path, self.table)
+        with open(path.with_suffix('.json'), 'w') as f:
+            json.dump({'grid_size': self.grid_size,
+                       'vendor_ids': self.vendor_ids,
+                       'coordinate_names': COORDINATE_NAMES,
+                       'bounds': self.bounds.tolist()}, f, indent=2)
+
+    def _cell_coordinate(self, values, column: int) -> np.ndarray:
+        lower, upper = self.bounds[column]
+        position = (np.asarray(values, dtype=np.float64) - lower) / (upper - lower) * self.grid_size
+        return np.clip(np.floor(position), 0, self.grid_size - 1).astype(np.intp)
+
+    def cell_index(self, latitude, longitude, dropoff: bool = False) -> np.ndarray:
+        """
+        Cell of every point, cells are numbered latitude-major.
+        """
+        column = 2 if dropoff else 0
+        return (self._cell_coordinate(latitude, column) * self.grid_size
+                + self._cell_coordinate(longitude, column + 1))
+
+    def cell_centers(self, dropoff: bool = False) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Latitude and longitude of the center of every cell, in cell order.
+        """
+        column = 2 if dropoff else 0
+        steps = (np.arange(self.grid_size) + 0.5) / self.grid_size
+        latitudes = self.bounds[column, 0] + steps * (self.bounds[column, 1] - self.bounds[column, 0])
+        longitudes = self.bounds[column + 1, 0] + steps * (self.bounds[column + 1, 1]
+                                                           - self.bounds[column + 1, 0])
+        return np.repeat(latitudes, self.grid_size), np.tile(longitudes, self.grid_size)
+
+    def vendor_index(self, vendor_id) -> np.ndarray:
+        """
+        Position of every vendor on the last axis of the table.
+
+        Raises:
+        - ValueError: If a vendor is not in the table.
+        """
+        vendor_id = np.asarray(vendor_id)
+        known_vendors = np.asarray(self.vendor_ids)
+        if not np.isin(vendor_id, known_vendors).all():
+            raise ValueError(f'vendor_id must be one of {self.vendor_ids}')
+        order = np.argsort(known_vendors)
+        return order[np.searchsorted(known_vendors, vendor_id, sorter=order)].astype(np.intp)
+
+    def lookup(self, columns: dict) -> np.ndarray:
+        """
+        Durations of a batch of trips.
+
+        Parameters:
+        - columns (dict): The coordinates, `pickup_hour`, `pickup_day`
+          (Monday is 0) and `vendor_id` of every trip.
+
+        Raises:
+        - ValueError: If an hour, weekday or vendor is not in the table.
+        """
+        pickup_cell = self.cell_index(columns['pickup_latitude'], columns['pickup_longitude'])
+        dropoff_cell = self.cell_index(columns['dropoff_latitude'], columns['dropoff_longitude'],
+                                       dropoff=True)
+        hour = np.asarray(columns['pickup_hour'], dtype=np.intp)
+        weekday = np.asarray(columns['pickup_day'], dtype=np.intp)
+        # negative indices would silently read another slot
+        if ((hour < 0) | (hour >= HOURS)).any() or ((weekday < 0) | (weekday >= WEEKDAYS)).any():
+            raise ValueError(f'pickup_hour must be in 0-{HOURS - 1} and pickup_day in 0-{WEEKDAYS - 1}')
+        vendor = self.vendor_index(columns['vendor_id'])
+        return self.table[pickup_cell, dropoff_cell, hour, weekday, vendor].astype(np.float64)
@@ -0,0 +1,258 @@
+import threading
+from collections import deque
+from time import perf_counter
+
+import numpy as np
+
+# upper bounds in seconds of the latency buckets, 50us to 10s
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# upper bounds of the batch size buckets, powers of two up to 16384
+BATCH_SIZE_BUCKETS = tuple(2 ** power for power in range(15))
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels.items()) + "}"
+
+
+class Counter:
+    """
+    Monotonic count, for example of requests or scored rows.
+
+    Increments are appended to a deque, which is thread safe without a
+    lock, and summed when the counter is read or the deque gets long.
+    """
+
+    def __init__(self, labels: dict = None, flush_size: int = 4096):
+        self.labels = labels or {}
+        self.flush_size = flush_size
+        self._value = 0
+        self._pending = deque()
+        self._lock = threading.Lock()
+
+    def inc(self, amount: int = 1):
+        self._pending.append(amount)
+        if len(self._pending) >= self.flush_size:
+            self.flush()
+
+    def flush(self):
+        # one thread at a time moves the pending increments into the total
+        with self._lock:
+            pending = self._pending
+            self._value += sum(pending.popleft() for _ in range(len(pending)))
+
+    @property
+    def value(self) -> int:
+        self.flush()
+        return self._value
+
+    def take(self) -> int:
+        # count since the last take, for sending the increments to another process
+        self.flush()
+        with self._lock:
+            value, self._value = self._value, 0
+        return value
+
+    def add(self, value: int):
+        self.inc(value)
+
+    def samples(self, name: str) -> list:
+        return [f"{name}{format_labels(self.labels)} {self.value}"]
+
+
+class Histogram:
+    """
+    Distribution over fixed buckets.
+
+    Like Counter, an observation only appends the value to a deque. The
+    values are sorted into the buckets together with NumPy when the
+    histogram is read or the deque gets long, so the hot path costs a
+    fraction of a microsecond.
+
+    Parameters:
+    - buckets (tuple): Sorted upper bounds, a value falls in the first
+      bucket whose bound is greater or equal to it.
+    - labels (dict): Labels of this series.
+    - flush_size (int): Pending values that trigger a flush.
+    """
+
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS, labels: dict = None, flush_size: int = 4096):
+        self.buckets = tuple(buckets)
+        self.labels = labels or {}
+        self.flush_size = flush_size
+        # the last count is the +Inf bucket
+        self.counts = np.zeros(len(self.buckets) + 1, dtype=np.int64)
+        self.sum = 0.0
+        self._bounds = np.array(self.buckets, dtype=np.float64)
+        self._pending = deque()
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        self._pending.append(value)
+        if len(self._pending) >= self.flush_size:
+            self.flush()
+
+    def observe_since(self, start: float):
+        # seconds elapsed since a perf_counter() reading
+        self.observe(perf_counter() - start)
+
+    def flush(self):
+        # one thread at a time moves the pending values into the buckets
+        with self._lock:
+            pending = self._pending
+            values = np.fromiter((pending.popleft() for _ in range(len(pending))), dtype=np.float64)
+            if len(values):
+                self.counts += np.bincount(np.searchsorted(self._bounds, values, side='left'),
+                                           minlength=len(self.counts))
+                self.sum += float(values.sum())
+
+    def take(self) -> tuple:
+        # bucket counts and sum since the last take, for sending them to another process
+        self.flush()
+        with self._lock:
+            counts, total = self.counts.tolist(), self.sum
+            self.counts = np.zeros_like(self.counts)
+            self.sum = 0.0
+        return counts, total
+
+    def add(self, delta: tuple):
+        counts, total = delta
+        with self._lock:
+            self.counts += np.asarray(counts, dtype=np.int64)
+            self.sum += total
+
+    def samples(self, name: str) -> list:
+        self.flush()
+        counts, total = self.counts.tolist(), self.sum
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(float(bound))
+            lines.append(f"{name}_bucket{format_labels({**self.labels, 'le': le})} {cumulative}")
+        lines.append(f"{name}_sum{format_labels(self.labels)} {total}")
+        lines.append(f"{name}_count{format_labels(self.labels)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Named counters and histograms rendered in the Prometheus text format.
+
+    Every series is created once, for example at import, and kept by the
+    caller, so the hot path never looks a metric up by name. Series of one
+    name differ by their labels.
+    """
+
+    def __init__(self):
+        self._families = {}
+        self._lock = threading.Lock()
+
+    def _add(self, name: str, kind: str, documentation: str, series):
+        with self._lock:
+            family = self._families.setdefault(name, {'kind': kind, 'documentation': documentation,
+                                                      'series': {}})
+            key = tuple(sorted(series.labels.items()))
+            # the same name and labels always give the same series
+            return family['series'].setdefault(key, series)
+
+    def counter(self, name: str, documentation: str, **labels) -> Counter:
+        return self._add(name, 'counter', documentation, Counter(labels))
+
+    def histogram(self, name: str, documentation: str, buckets: tuple = LATENCY_BUCKETS,
+                  **labels) -> Histogram:
+        return self._add(name, 'histogram', documentation, Histogram(buckets, labels))
+
+    def take(self) -> list:
+        """
+        Everything recorded since the last take, with what is needed to
+        create the series elsewhere, and reset the series. A scoring process
+        sends it back to the serving process, which passes it to `add`.
+        """
+        with self._lock:
+            families = {name: dict(family, series=list(family['series'].values()))
+                        for name, family in self._families.items()}
+        deltas = []
+        for name, family in families.items():
+            for series in family['series']:
+                delta = series.take()
+                if delta == 0 or (isinstance(delta, tuple) and not any(delta[0])):
+                    continue
+                deltas.append((name, family['kind'], family['documentation'], series.labels,
+                               getattr(series, 'buckets', None), delta))
+        return deltas
+
+    def add(self, deltas: list):
+        # merge the output of `take` of another registry
+        for name, kind, documentation, labels, buckets, delta in deltas:
+            if kind == 'counter':
+                series = self.counter(name, documentation, **labels)
+            else:
+                series = self.histogram(name, documentation, buckets, **labels)
+            series.add(delta)
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            families = {name: dict(family, series=list(family['series'].values()))
+                        for name, family in self._families.items()}
+        for name, family in families.items():
+            lines.append(f"# HELP {name} {family['documentation']}")
+            lines.append(f"# TYPE {name} {family['kind']}")
+            for series in family['series']:
+                lines.extend(series.samples(name))
+        return "\n".join(lines) + "\n"
+
+
+class RequestMetricsMiddleware:
+    """
+    ASGI middleware counting the HTTP requests and timing them per endpoint
+    and status code.
+
+    The endpoint is the path of the matched route, requests that match no
+    route are counted as "other" so unknown URLs do not create new series.
+
+    Parameters:
+    - app: The ASGI application.
+    - registry (MetricsRegistry): Where the series are created.
+    """
+
+    def __init__(self, app, registry: MetricsRegistry):
+        self.app = app
+        self.registry = registry
+        self._series = {}
+
+    def series(self, endpoint: str, status: int) -> tuple:
+        key = (endpoint, status)
+        if key not in self._series:
+            self._series[key] = (
+                self.registry.counter("http_requests_total", "HTTP requests by endpoint and status",
+                                      endpoint=endpoint, status=status),
+                self.registry.histogram("http_request_duration_seconds",
+                                        "Time from the request to the end of the response",
+                                        endpoint=endpoint, status=status))
+        return self._series[key]
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start = perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # the router stores the matched route in the scope
+            endpoint = getattr(scope.get("route"), "path", "other")
+            requests, duration = self.series(endpoint, status)
+            requests.inc()
+            duration.observe_since(start)
@@ -0,0 +1,88 @@
+import threading
+
+import numpy as np
+
+GATE_MODES = ('off', 'flag', 'reject', 'fallback')
+
+# longest trip kept in the training data, see drop_above_two_hundred_minutes
+MAX_TRIP_MINUTES = 200.0
+
+
+class OutlierGate:
+    """
+    Bounding-box check of the trip coordinates against the ranges the
+    OutliersRemover kept in training, run before the model.
+
+    Modes:
+    - flag: every trip is scored, the out of range ones are reported.
+    - reject: out of range trips are not scored.
+    - fallback: out of range trips get a distance / speed estimate instead
+      of a model prediction.
+
+    Parameters:
+    - column_names (list): Coordinate columns checked.
+    - lower, upper (array-like): Inclusive bounds of every column.
+    - mode (str): One of GATE_MODES.
+    - fallback_speed_kmh (float): Average speed of the fallback estimate.
+    """
+
+    def __init__(self, column_names, lower, upper, mode: str = 'flag',
+                 fallback_speed_kmh: float = 14.0):
+        if mode not in GATE_MODES:
+            raise ValueError(f'Unknown outlier gate mode {mode}, expected one of {GATE_MODES}')
+        self.column_names = list(column_names)
+        self.lower = np.asarray(lower, dtype=np.float64)
+        self.upper = np.asarray(upper, dtype=np.float64)
+        self.mode = mode
+        self.fallback_speed_kmh = fallback_speed_kmh
+        self.checked = 0
+        self.out_of_range = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_outliers_remover(cls, outliers_remover, **kwargs):
+        """
+        Build the gate from the quantiles_ of a fitted OutliersRemover.
+        """
+        lower, upper = zip(*outliers_remover.quantiles_)
+        return cls(column_names=outliers_remover.col_subset, lower=lower, upper=upper, **kwargs)
+
+    @property
+    def short_circuits(self) -> bool:
+        # whether out of range trips skip the model
+        return self.mode in ('reject', 'fallback')
+
+    def check(self, columns: dict) -> np.ndarray:
+        """
+        Boolean mask of the trips with all their coordinates within bounds.
+
+        Parameters:
+        - columns (dict): Column name to the values of every trip, must
+          contain all of column_names.
+        """
+        in_range = None
+        for name, lower, upper in zip(self.column_names, self.lower, self.upper):
+            values = np.asarray(columns[name], dtype=np.float64)
+            column_in_range = (values >= lower) & (values <= upper)
+            in_range = column_in_range if in_range is None else in_range & column_in_range
+        n_out_of_range = int(len(in_range) - np.count_nonzero(in_range))
+        with self._lock:
+            self.checked += len(in_range)
+            self.out_of_range += n_out_of_range
+        return in_range
+
+    def fallback_durations(self, haversine_distance) -> np.ndarray:
+        """
+        Trip durations in minutes from the straight line distance at the
+        average speed, capped like the training target.
+        """
+        minutes = np.asarray(haversine_distance, dtype=np.float64) / self.fallback_speed_kmh * 60
+        return np.clip(minutes, 0.0, MAX_TRIP_MINUTES)
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {'mode': self.mode,
+                    'checked': self.checked,
+                    'out_of_range': self.out_of_range,
+                    'bounds': {name: [float(lower), float(upper)] for name, lower, upper
+                               in zip(self.column_names, self.lower, self.upper)}}
@@ -0,0 +1,93 @@
+import gc
+import os
+import signal
+import socket
+import logging
+
+logger = logging.getLogger("uvicorn.error")
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    # one listening socket shared by all the workers, the kernel spreads the connections
+    # asyncio only disables Nagle on the accepted connections of IPPROTO_TCP sockets,
+    # without it every response waits for the delayed ack of the client
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(app, sock: socket.socket, log_level: str):
+    import uvicorn
+
+    config = uvicorn.Config(app=app, log_level=log_level)
+    server = uvicorn.Server(config)
+    server.run(sockets=[sock])
+
+
+def serve(app_module, host: str = "0.0.0.0", port: int = 8000, workers: int = 1,
+          preload: bool = True, log_level: str = "info"):
+    """
+    Serve the app with a pre-forked pool of uvicorn worker processes.
+
+    With preload the artifacts are loaded once in the parent, the objects
+    are moved to the permanent generation of the garbage collector and the
+    workers are forked afterwards. The workers then share the model pages
+    with the parent copy-on-write instead of holding one copy each. Dead
+    workers are replaced until the parent gets SIGINT or SIGTERM.
+
+    Parameters:
+    - app_module (module): Module with the FastAPI `app` and `load_artifacts`.
+    - host, port: Address to listen on.
+    - workers (int): Number of worker processes.
+    - preload (bool): Load the artifacts before forking, otherwise every
+      worker loads its own copy at startup.
+    - log_level (str): Uvicorn log level of the workers.
+    """
+    if preload:
+        app_module.load_artifacts()
+        # later collections in the workers do not touch the shared objects,
+        # so their pages are not copied
+        gc.freeze()
+    sock = bind_socket(host, port)
+    logger.info(f"Listening on {host}:{port} with {workers} workers")
+
+    children = set()
+    stopping = False
+
+    def fork_worker():
+        pid = os.fork()
+        if pid == 0:
+            # the worker installs its own signal handlers in uvicorn
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            try:
+                run_worker(app_module.app, sock, log_level)
+            finally:
+                os._exit(0)
+        children.add(pid)
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            os.kill(pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    for _ in range(workers):
+        fork_worker()
+
+    # replace the workers that die until the pool is stopped
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        children.discard(pid)
+        if not stopping:
+            logger.warning(f"Worker {pid} exited with status {status}, starting a new one")
+            fork_worker()
+    sock.close()
@@ -0,0 +1,233 @@
+import sys
+import shutil
+import logging
+import threading
+from time import time
+from pathlib import Path
+from dataclasses import dataclass, field
+
+logger = logging.getLogger("uvicorn.error")
+
+# response header carrying the version of the model that scored the request
+VERSION_HEADER = b"x-model-version"
+# key of the request state where the endpoints store the version that scored the request
+VERSION_STATE_KEY = "model_version"
+
+
+@dataclass
+class ModelBundle:
+    """
+    Everything one model version needs to score trips. A bundle is never
+    modified after it is activated, requests keep using the bundle they
+    started with while a newer one is swapped in.
+    """
+    version: str
+    model: object = None
+    preprocessor: object = None
+    output_transformer: object = None
+    regressor_engine: object = None
+    compiled_preprocessor: object = None
+    inverse_transform_output: object = None
+    load_timings: dict = field(default_factory=dict)
+    loaded_at: float = field(default_factory=time)
+
+
+class ModelRegistry:
+    """
+    Holds the active ModelBundle and polls a directory of versioned
+    artifacts for newer versions.
+
+    Every subdirectory of registry_path is a version, laid out like
+    `models/` (models/, transformers/ and optionally export/). The latest
+    version is the greatest directory name, so names should sort in time
+    order, for example the timestamps given by `publish`. Removing the
+    latest directory rolls back to the one before it. Directories
+    starting with '.' are ignored, which lets `publish` copy under a
+    hidden name and rename it into place in one step.
+
+    A new version is loaded and warmed up by `load_version` in the polling
+    thread, then activated by replacing one reference, so requests are
+    neither dropped nor blocked by the reload. A version that fails to
+    load is logged and the active version keeps serving. The failed
+    version is skipped until its files change, so a version copied in
+    place without `publish` and loaded before the copy finished is
+    loaded again once it is complete.
+
+    Parameters:
+    - registry_path (Path): Directory of the versions, None for a single
+      bundle activated with `activate`.
+    - load_version (callable): Takes the version directory and its name
+      and returns a warmed up ModelBundle.
+    - poll_interval_s (float): Seconds between two checks for a new version.
+    """
+
+    def __init__(self, registry_path=None, load_version=None, poll_interval_s: float = 30.0):
+        self.registry_path = None if registry_path is None else Path(registry_path)
+        self.load_version = load_version
+        self.poll_interval_s = poll_interval_s
+        self.active = None
+        self.swaps = 0
+        self.failed_versions = {}
+        # files of every failed version when it was loaded, see version_fingerprint
+        self._failed_fingerprints = {}
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def versions(self) -> list:
+        if self.registry_path is None or not self.registry_path.is_dir():
+            return []
+        return sorted(path.name for path in self.registry_path.iterdir()
+                      if path.is_dir() and not path.name.startswith('.'))
+
+    def version_fingerprint(self, version: str) -> tuple:
+        # number of files, total size and latest modification of a version directory
+        files = [path.stat() for path in (self.registry_path / version).rglob('*')]
+        return (len(files), sum(stat.st_size for stat in files),
+                max((stat.st_mtime_ns for stat in files), default=0))
+
+    def has_failed(self, version: str) -> bool:
+        # failed with the files it still has, a modified version is tried again
+        return (version in self._failed_fingerprints
+                and self._failed_fingerprints[version] == self.version_fingerprint(version))
+
+    def activate(self, bundle: ModelBundle):
+        # a single assignment, readers see either the old or the new bundle
+        previous = self.active
+        self.active = bundle
+        if previous is not None:
+            self.swaps += 1
+            logger.info(f"Model version {previous.version} replaced by {bundle.version}")
+
+    def refresh(self) -> bool:
+        """
+        Load and activate the latest version if it is not active yet.
+
+        Returns:
+        - bool: True when a new version was activated.
+        """
+        with self._refresh_lock:
+            versions = [version for version in self.versions() if not self.has_failed(version)]
+            if not versions:
+                return False
+            latest = versions[-1]
+            if self.active is not None and latest == self.active.version:
+                return False
+            # taken before loading, files still being written change it afterwards
+            fingerprint = self.version_fingerprint(latest)
+            try:
+                bundle = self.load_version(self.registry_path / latest, latest)
+            except Exception as error:
+                # keep serving the active version and retry this one when its files change
+                logger.exception(f"Loading model version {latest} failed")
+                self.failed_versions[latest] = repr(error)
+                self._failed_fingerprints[latest] = fingerprint
+                return False
+            self.failed_versions.pop(latest, None)
+            self._failed_fingerprints.pop(latest, None)
+            self.activate(bundle)
+            return True
+
+    def _poll(self):
+        while not self._stop.wait(self.poll_interval_s):
+            self.refresh()
+
+    def start(self):
+        # poll in a daemon thread, nothing to do without a registry directory,
+        # a forked process starts its own thread
+        if self.registry_path is None or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._thread = threading.Thread(target=self._poll, name="model-registry", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def summary(self) -> dict:
+        return {'active_version': None if self.active is None else self.active.version,
+                'loaded_at': None if self.active is None else self.active.loaded_at,
+                'load_ms': {} if self.active is None else
+                {step: round(seconds * 1000, 1) for step, seconds in self.active.load_timings.items()},
+                'registry_path': None if self.registry_path is None else str(self.registry_path),
+                'versions': self.versions(),
+                'swaps': self.swaps,
+                'failed_versions': self.failed_versions}
+
+
+class VersionHeaderMiddleware:
+    """
+    ASGI middleware adding the model version to every HTTP response.
+
+    Endpoints that score trips store the version of the bundle that scored
+    them in the request state under VERSION_STATE_KEY, so the header names
+    that version even when a newer one was activated meanwhile. Other
+    responses carry the version active when the response starts.
+
+    Parameters:
+    - app: The ASGI application.
+    - get_version (callable): Returns the active version, or None before
+      the first bundle is loaded.
+    """
+
+    def __init__(self, app, get_version):
+        self.app = app
+        self.get_version = get_version
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        # request.state of the endpoints is this dictionary
+        state = scope.setdefault("state", {})
+
+        async def send_with_version(message):
+            if message["type"] != "http.response.start":
+                return await send(message)
+            version = state.get(VERSION_STATE_KEY) or self.get_version()
+            if version is not None:
+                message["headers"] = list(message.get("headers", [])) + [
+                    (VERSION_HEADER, version.encode())]
+            await send(message)
+
+        await self.app(scope, receive, send_with_version)
+
+
+def publish(artifacts_path, registry_path, version: str = None) -> Path:
+    """
+    Copy a trained artifacts directory into the registry as a new version.
+
+    The files are copied under a hidden name first and renamed into place,
+    so a polling registry never sees a half copied version.
+
+    Parameters:
+    - artifacts_path (Path): Directory with models/ and transformers/, like `models`.
+    - registry_path (Path): Directory of the versions.
+    - version (str): Name of the version, the current UTC time by default.
+
+    Returns:
+    - Path: Directory of the new version.
+    """
+    from datetime import datetime, timezone
+
+    artifacts_path, registry_path = Path(artifacts_path), Path(registry_path)
+    version = version or datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    version_path = registry_path / version
+    if version_path.exists():
+        raise FileExistsError(f'Version {version} already exists in {registry_path}')
+    staging_path = registry_path / f'.{version}'
+    shutil.rmtree(staging_path, ignore_errors=True)
+    for name in ['models', 'transformers', 'export']:
+        if (artifacts_path / name).is_dir():
+            shutil.copytree(artifacts_path / name, staging_path / name)
+    staging_path.rename(version_path)
+    return version_path
+
+
+if __name__ == "__main__":
+    # publish the trained artifacts of `models` into a registry directory
+    artifacts_path = sys.argv[1] if len(sys.argv) > 1 else 'models'
+    registry_path = sys.argv[2] if len(sys.argv) > 2 else 'model_registry'
+    version = sys.argv[3] if len(sys.argv) > 3 else None
+    print(f"Published {publish(artifacts_path, registry_path, version)}")
@@ -0,0 +1,113 @@
+import asyncio
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+EXECUTOR_KINDS = ("thread", "process")
+
+
+class Overloaded(Exception):
+    """
+    Raised when a request arrives while the scoring queue is full.
+    """
+
+
+def run_and_report(collect_report, fn, args: tuple) -> tuple:
+    # runs in a worker process, the report goes back with the result
+    result = fn(*args)
+    return result, collect_report()
+
+
+class ScoringExecutor:
+    """
+    Sized executor for the CPU bound scoring work of the async handlers,
+    with a limit on the number of requests waiting for it.
+
+    A request is admitted while fewer than `max_workers + max_queue_depth`
+    requests are being scored or waiting, otherwise it is rejected at once
+    with Overloaded instead of joining an unbounded queue. The counters are
+    only touched from the event loop, so they need no lock.
+
+    Parameters:
+    - kind (str): 'thread' shares the loaded model with the handlers, 'process'
+      scores in worker processes that each hold the artifacts, away from
+      the GIL of the event loop.
+    - max_workers (int): Threads or processes scoring at the same time.
+    - max_queue_depth (int): Requests allowed to wait for a worker, 0 for no limit.
+    - initializer (callable): Run once in every worker process, for example
+      to load the artifacts.
+    - collect_report (callable): Run in the worker process after every call,
+      returns what the call recorded there, such as metrics.
+    - apply_report (callable): Receives that report in the serving process.
+    """
+
+    def __init__(self, kind: str = "thread", max_workers: int = 4, max_queue_depth: int = 0,
+                 initializer=None, collect_report=None, apply_report=None):
+        if kind not in EXECUTOR_KINDS:
+            raise ValueError(f"Unknown executor kind {kind}, expected one of {EXECUTOR_KINDS}")
+        self.kind = kind
+        self.max_workers = max_workers
+        self.max_queue_depth = max_queue_depth
+        self.collect_report = collect_report
+        self.apply_report = apply_report
+        if kind == "thread":
+            self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="scoring")
+        else:
+            self.executor = ProcessPoolExecutor(max_workers=max_workers, initializer=initializer)
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.admitted = 0
+        self.rejected = 0
+
+    @property
+    def queue_depth(self) -> int:
+        # admitted requests that wait for a free worker
+        return max(0, self.in_flight - self.max_workers)
+
+    @asynccontextmanager
+    async def admit(self):
+        """
+        Hold a place in the scoring queue for the duration of the block.
+        """
+        if self.max_queue_depth and self.in_flight >= self.max_workers + self.max_queue_depth:
+            self.rejected += 1
+            raise Overloaded(f"{self.queue_depth} requests are already waiting for scoring")
+        self.in_flight += 1
+        self.admitted += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+
+    async def call(self, fn, *args):
+        """
+        Run fn(*args) on a worker without admission, for callers that
+        already hold a place, like the micro-batcher.
+        """
+        loop = asyncio.get_running_loop()
+        if self.kind == "process" and self.collect_report is not None:
+            result, report = await loop.run_in_executor(self.executor, run_and_report,
+                                                        self.collect_report, fn, args)
+            self.apply_report(report)
+            return result
+        return await loop.run_in_executor(self.executor, fn, *args)
+
+    async def run(self, fn, *args):
+        """
+        Admit the request and run fn(*args) on a worker.
+        """
+        async with self.admit():
+            return await self.call(fn, *args)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    def summary(self) -> dict:
+        return {'kind': self.kind,
+                'max_workers': self.max_workers,
+                'max_queue_depth': self.max_queue_depth,
+                'in_flight': self.in_flight,
+                'queue_depth': self.queue_depth,
+                'max_in_flight': self.max_in_flight,
+                'admitted': self.admitted,
+                'rejected': self.rejected}
@@ -0,0 +1,203 @@
+from pathlib import Path
+
+import numpy as np
+from src.serving.compiled_preprocessor import CompiledPreprocessor
+
+# names of the arrays that describe a tree ensemble
+TREE_ARRAY_NAMES = ['feature', 'threshold', 'left', 'right', 'default_left', 'value', 'roots']
+
+
+class TreeEnsemble:
+    """
+    Tree ensemble stored as flat node arrays and evaluated with NumPy.
+
+    Node i of any tree splits on feature[i] at threshold[i] and continues
+    at left[i] or right[i], leaves have left[i] == -1 and carry value[i].
+    Missing values follow default_left. The nodes of all trees share the
+    arrays and roots holds the root node of every tree.
+
+    Parameters:
+    - feature, threshold, left, right, default_left, value, roots (np.ndarray): Node arrays.
+    - max_depth (int): Depth of the deepest tree.
+    - base_score (float): Value added to the sum of the leaves.
+    - comparison (str): 'less' (XGBoost, x < threshold goes left) or
+      'less_equal' (sklearn, x <= threshold goes left).
+    - aggregation (str): 'sum' of the leaves in float32 (XGBoost) or
+      'mean' in float64 (RandomForest).
+    """
+
+    def __init__(self, feature, threshold, left, right, default_left, value, roots,
+                 max_depth: int, base_score: float = 0.0, comparison: str = 'less',
+                 aggregation: str = 'sum'):
+        self.feature = np.asarray(feature, dtype=np.intp)
+        self.threshold = np.asarray(threshold, dtype=np.float64)
+        self.left = np.asarray(left, dtype=np.intp)
+        self.right = np.asarray(right, dtype=np.intp)
+        self.default_left = np.asarray(default_left, dtype=bool)
+        self.value = np.asarray(value, dtype=np.float64)
+        self.roots = np.asarray(roots, dtype=np.intp)
+        self.max_depth = int(max_depth)
+        self.base_score = float(base_score)
+        self.comparison = str(comparison)
+        self.aggregation = str(aggregation)
+
+    @classmethod
+    def from_arrays(cls, arrays: dict, prefix: str = 'tree_'):
+        return cls(max_depth=int(arrays[prefix + 'max_depth']),
+                   base_score=float(arrays[prefix + 'base_score']),
+                   comparison=str(arrays[prefix + 'comparison']),
+                   aggregation=str(arrays[prefix + 'aggregation']),
+                   **{name: arrays[prefix + name] for name in TREE_ARRAY_NAMES})
+
+    def to_arrays(self, prefix: str = 'tree_') -> dict:
+        arrays = {prefix + name: getattr(self, name) for name in TREE_ARRAY_NAMES}
+        arrays.update({prefix + 'max_depth': np.array(self.max_depth),
+                       prefix + 'base_score': np.array(self.base_score),
+                       prefix + 'comparison': np.array(self.comparison),
+                       prefix + 'aggregation': np.array(self.aggregation)})
+        return arrays
+
+    def leaf_values(self, X: np.ndarray) -> np.ndarray:
+        """
+        Value of the leaf reached in every tree, shape (n_rows, n_trees).
+        """
+        # both libraries compare the features as float32
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        has_missing = bool(np.isnan(X).any())
+        # children[2 * i] and children[2 * i + 1] are the left and right child of
+        # node i, leaves point at themselves so every walk takes max_depth steps
+        is_leaf = self.left < 0
+        node_ids = np.arange(len(self.left))
+        children = np.stack([np.where(is_leaf, node_ids, self.left),
+                             np.where(is_leaf, node_ids, self.right)], axis=1).ravel()
+        # offset of every row in the flattened matrix
+        row_offsets = (np.arange(len(X)) * X.shape[1])[:, None]
+        X_flat = X.ravel()
+        node = np.repeat(self.roots[None, :], len(X), axis=0)
+        # all the rows walk down all the trees one level per step
+        for _ in range(self.max_depth):
+            values = X_flat.take(row_offsets + self.feature.take(node))
+            thresholds = self.threshold.take(node)
+            if self.comparison == 'less':
+                goes_left = values < thresholds
+            else:
+                goes_left = values <= thresholds
+            if has_missing:
+                goes_left |= np.isnan(values) & self.default_left.take(node)
+            node = children.take(2 * node + ~goes_left)
+        return self.value.take(node)
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        leaves = self.leaf_values(X)
+        if self.aggregation == 'mean':
+            # RandomForestRegressor adds the trees one by one in float64
+            predictions = np.zeros(len(leaves))
+            for tree in range(leaves.shape[1]):
+                predictions += leaves[:, tree]
+            return predictions / leaves.shape[1]
+        # XGBoost adds the trees one by one to the base score in float32
+        leaves = leaves.astype(np.float32)
+        predictions = np.full(len(leaves), self.base_score, dtype=np.float32)
+        for tree in range(leaves.shape[1]):
+            predictions += leaves[:, tree]
+        return predictions
+
+
+def yeo_johnson_inverse(x: np.ndarray, lmbda: float) -> np.ndarray:
+    # same operations as PowerTransformer._yeo_johnson_inverse_transform
+    x_inv = np.zeros_like(x)
+    pos = x >= 0
+    if abs(lmbda) < np.spacing(1.0):
+        x_inv[pos] = np.exp(x[pos]) - 1
+    else:
+        x_inv[pos] = np.power(x[pos] * lmbda + 1, 1 / lmbda) - 1
+    if abs(lmbda - 2) > np.spacing(1.0):
+        x_inv[~pos] = 1 - np.power(-(2 - lmbda) * x[~pos] + 1, 1 / (2 - lmbda))
+    else:
+        x_inv[~pos] = 1 - np.exp(-x[~pos])
+    return x_inv
+
+
+class ExportedModel:
+    """
+    Everything needed to go from the input features to minutes without
+    sklearn or xgboost: the compiled preprocessor, the tree ensemble and
+    the inverse of the yeo-johnson target transform.
+
+    Parameters:
+    - preprocessor (CompiledPreprocessor): Input features to model features.
+    - trees (TreeEnsemble): The regressor.
+    - output_mean, output_scale (np.ndarray): Standardization of the transformed target.
+    - output_lambdas (np.ndarray): Yeo-johnson lambdas of the target.
+    """
+
+    def __init__(self, preprocessor: CompiledPreprocessor, trees: TreeEnsemble,
+                 output_mean, output_scale, output_lambdas):
+        self.preprocessor = preprocessor
+        self.trees = trees
+        self.output_mean = np.asarray(output_mean, dtype=np.float64)
+        self.output_scale = np.asarray(output_scale, dtype=np.float64)
+        self.output_lambdas = np.asarray(output_lambdas, dtype=np.float64)
+
+    @classmethod
+    def load(cls, path, mmap_mode=None):
+        """
+        Load a model saved with `save`. A directory of .npy files can be
+        memory mapped with mmap_mode='r', the nodes are then paged in from
+        the page cache and shared by every process that maps them.
+        """
+        path = Path(path)
+        if path.is_dir():
+            arrays = {file.stem: np.load(file, mmap_mode=mmap_mode) for file in path.glob('*.npy')}
+            return cls.from_arrays(arrays)
+        with np.load(path) as arrays:
+            return cls.from_arrays(arrays)
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        return cls(preprocessor=CompiledPreprocessor.from_arrays(arrays, prefix='preprocessor_'),
+                   trees=TreeEnsemble.from_arrays(arrays),
+                   output_mean=arrays['output_mean'],
+                   output_scale=arrays['output_scale'],
+                   output_lambdas=arrays['output_lambdas'])
+
+    def to_arrays(self) -> dict:
+        return {'output_mean': self.output_mean,
+                'output_scale': self.output_scale,
+                'output_lambdas': self.output_lambdas,
+                **self.preprocessor.to_arrays(prefix='preprocessor_'),
+                **self.trees.to_arrays()}
+
+    def save(self, path):
+        """
+        Save to a single .npz file, or to a directory with one .npy file
+        per array when the path has no .npz suffix.
+        """
+        path = Path(path)
+        if path.suffix == '.npz':
+            np.savez(path, **self.to_arrays())
+            return
+        path.mkdir(parents=True, exist_ok=True)
+        for name, array in self.to_arrays().items():
+            np.save(path / f'{name}.npy', np.asarray(array))
+
+    def predict(self, X_features: np.ndarray) -> np.ndarray:
+        # model features to the transformed target, like XGBRegressor.predict
+        return self.trees.predict(X_features)
+
+    def inverse_transform(self, predictions: np.ndarray) -> np.ndarray:
+        # same dtypes and operations as PowerTransformer.inverse_transform
+        X = np.array(predictions).reshape(-1, len(self.output_lambdas))
+        X *= self.output_scale.astype(X.dtype)
+        X += self.output_mean.astype(X.dtype)
+        for ind, lmbda in enumerate(self.output_lambdas):
+            X[:, ind] = yeo_johnson_inverse(X[:, ind], lmbda)
+        return X
+
+    def predict_durations(self, X: np.ndarray) -> np.ndarray:
+        """
+        Durations in minutes from a matrix of the input features in
+        `preprocessor.input_names` order.
+        """
+        predictions = self.predict(self.preprocessor.transform(X))
+        return self.inverse_transform(predictions).ravel()
@@ -3,8 +3,9 @@ import sys
 import pandas as pd
 import matplotlib.pyplot as plt
 from pathlib import Path
+from src.data.storage import read_data
 from sklearn.metrics import r2_score
-from sklearn.model_selection import cross_val_score
+from src.models.cross_validation import read_cv_params, cross_validate
 
 
 TARGET = 'trip_duration'
@@ -12,7 +13,7 @@ model_name = 'xgbreg.joblib'
 
 
 def load_dataframe(path):
-    df = pd.read_csv(path)
+    df = read_data(path)
     return df
     
     
@@ -42,24 +43,30 @@ def main():
     root_path = current_path.parent.parent.parent
     # read input file path
     data_path = root_path / 'data/processed/final'
+    # model path
+    model_path = root_path / 'models' / 'models' / model_name
+    # load the model
+    model = joblib.load(model_path)
+    # folds and threads of the cross validation
+    cv_params = read_cv_params('params.yaml')
     for i in range(1,3):
         filename = sys.argv[i]
         # load the data 
         data = load_dataframe(data_path / filename)
         # split the data into X and y
         X, y = make_X_y(dataframe=data,target_column=TARGET)
-        # model path
-        model_path = root_path / 'models' / 'models' / model_name
-        # load the model
-        model = joblib.load(model_path)
-        if filename == "train.csv":
-            # get predictions from model
-            cross_val = cross_val_score(estimator=model,
-                                        X=X,y=y,
-                                        cv=10,scoring='r2',
-                                        n_jobs=-1)
-            x_axis_list = [f'fold_{axis}' for axis in range(1,11)]
-            y_axis_list = list(cross_val)  
+        if Path(filename).stem == "train":
+            # cross validate within the thread budget
+            cross_val = cross_validate(model=model,X=X,y=y,
+                                       folds=cv_params['folds'],
+                                       thread_budget=cv_params['thread_budget'],
+                                       fold_jobs=cv_params['fold_jobs'])
+            print(f"\nCross validation with {cross_val['fold_jobs']} folds at once, "
+                  f"{cross_val['nthread']} threads each")
+            for fold, (score, seconds) in enumerate(zip(cross_val['r2'],cross_val['seconds']),start=1):
+                print(f"fold_{fold}: R2 {score:.4f} in {seconds:.1f}s")
+            x_axis_list = [f'fold_{axis}' for axis in range(1,cv_params['folds'] + 1)]
+            y_axis_list = list(cross_val['r2'])
         else:
             # calculate the y_pred
             y_pred = get_predictions(model=model,X=X)
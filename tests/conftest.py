@@ -0,0 +1,30 @@
+import pytest
+
+# a trip with all the model features, as sent to /predictions
+TRIP = {"vendor_id": 1, "passenger_count": 1, "pickup_longitude": -73.98,
+        "pickup_latitude": 40.75, "dropoff_longitude": -73.96, "dropoff_latitude": 40.77,
+        "pickup_hour": 10, "pickup_date": 5, "pickup_month": 3, "pickup_day": 2,
+        "is_weekend": 0, "haversine_distance": 2.5, "euclidean_distance": 0.03,
+        "manhattan_distance": 0.04}
+
+
+@pytest.fixture(scope='session')
+def service():
+    # the app module with the artifacts of container_models loaded
+    import app
+
+    app.load_artifacts()
+    return app
+
+
+@pytest.fixture(scope='session')
+def client(service):
+    from fastapi.testclient import TestClient
+
+    with TestClient(service.app) as client:
+        yield client
+
+
+@pytest.fixture
+def trip() -> dict:
+    return dict(TRIP)
@@ -0,0 +1,123 @@
+import asyncio
+import random
+from time import perf_counter
+
+import pytest
+
+from src.serving.batching import MicroBatcher
+
+
+class FakeScorer:
+    # scores every item as ten times its value and records the batches
+    def __init__(self, delay_s: float = 0.0):
+        self.delay_s = delay_s
+        self.batches = []
+        self.running = 0
+        self.max_running = 0
+
+    def __call__(self, items: list) -> list:
+        self.batches.append(list(items))
+        return [item * 10 for item in items]
+
+    async def call(self, fn, items: list) -> list:
+        # stands in for ScoringExecutor.call, scoring takes delay_s
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await asyncio.sleep(self.delay_s)
+            return fn(items)
+        finally:
+            self.running -= 1
+
+
+async def run_batcher(batcher: MicroBatcher, coroutine):
+    await batcher.start()
+    try:
+        return await asyncio.wait_for(coroutine, timeout=5)
+    finally:
+        await batcher.stop()
+
+
+def test_full_batch_is_scored_without_waiting():
+    scorer = FakeScorer()
+    batcher = MicroBatcher(scorer, max_batch_size=4, max_wait_ms=10000, call=scorer.call)
+
+    async def submit_all():
+        return await asyncio.gather(*[batcher.submit(item) for item in range(8)])
+
+    start = perf_counter()
+    results = asyncio.run(run_batcher(batcher, submit_all()))
+    assert perf_counter() - start < 1
+    assert results == [item * 10 for item in range(8)]
+    assert scorer.batches == [[0, 1, 2, 3], [4, 5, 6, 7]]
+    assert batcher.stats.summary()['largest_batch_size'] == 4
+
+
+def test_partial_batch_is_scored_after_max_wait():
+    scorer = FakeScorer()
+    batcher = MicroBatcher(scorer, max_batch_size=64, max_wait_ms=50, call=scorer.call)
+
+    async def submit_all():
+        start = perf_counter()
+        results = await asyncio.gather(*[batcher.submit(item) for item in range(3)])
+        return results, perf_counter() - start
+
+    results, elapsed = asyncio.run(run_batcher(batcher, submit_all()))
+    assert results == [0, 10, 20]
+    assert scorer.batches == [[0, 1, 2]]
+    assert 0.04 <= elapsed < 1
+    assert batcher.stats.summary()['max_queue_delay_ms'] >= 40
+
+
+def test_concurrent_submitters_get_their_own_results_in_order():
+    scorer = FakeScorer(delay_s=0.005)
+    batcher = MicroBatcher(scorer, max_batch_size=8, max_wait_ms=2,
+                           max_concurrent_batches=2, call=scorer.call)
+    rng = random.Random(0)
+    submitted = []
+
+    async def submitter(item):
+        await asyncio.sleep(rng.uniform(0, 0.02))
+        submitted.append(item)
+        return item, await batcher.submit(item)
+
+    async def submit_all():
+        return await asyncio.gather(*[submitter(item) for item in range(200)])
+
+    results = asyncio.run(run_batcher(batcher, submit_all()))
+    assert all(result == item * 10 for item, result in results)
+    # batches keep the arrival order and hold every item once
+    assert [item for batch in scorer.batches for item in batch] == submitted
+    assert max(len(batch) for batch in scorer.batches) <= 8
+    assert len(scorer.batches) > 1
+    assert scorer.max_running == 2
+
+
+def test_batches_run_on_the_executor_without_call():
+    scorer = FakeScorer()
+    batcher = MicroBatcher(scorer, max_batch_size=2, max_wait_ms=1)
+
+    async def submit_all():
+        return await asyncio.gather(*[batcher.submit(item) for item in range(4)])
+
+    assert asyncio.run(run_batcher(batcher, submit_all())) == [0, 10, 20, 30]
+
+
+def test_errors_reach_every_caller_of_the_batch():
+    def fail(items):
+        raise ValueError('model failed')
+
+    batcher = MicroBatcher(fail, max_batch_size=4, max_wait_ms=1)
+
+    async def submit_all():
+        return await asyncio.gather(*[batcher.submit(item) for item in range(3)],
+                                    return_exceptions=True)
+
+    results = asyncio.run(run_batcher(batcher, submit_all()))
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+def test_submit_needs_a_running_batcher():
+    batcher = MicroBatcher(FakeScorer())
+    with pytest.raises(RuntimeError):
+        asyncio.run(batcher.submit(1))
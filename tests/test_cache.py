@@ -0,0 +1,95 @@
+from dataclasses import replace
+from types import SimpleNamespace
+
+import pytest
+
+from data_models import PredictionDataset
+from src.serving.cache import PredictionCache
+
+FEATURE_NAMES = list(PredictionDataset.model_fields)
+
+
+class FakeClock:
+    # time that only moves when the test advances it
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = PredictionCache(FEATURE_NAMES, ttl_seconds=10, clock=clock)
+    cache.put('trip', 12.5)
+    clock.now += 9.9
+    assert cache.get('trip') == 12.5
+    clock.now += 0.1
+    assert cache.get('trip') is None
+    summary = cache.summary()
+    assert (summary['hits'], summary['misses'], summary['expirations'], summary['size']) == (1, 1, 1, 0)
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = PredictionCache(FEATURE_NAMES, max_size=2, clock=clock)
+    cache.put('first', 1.0)
+    cache.put('second', 2.0)
+    # reading first makes second the least recently used
+    assert cache.get('first') == 1.0
+    cache.put('third', 3.0)
+    assert cache.get('second') is None
+    assert cache.get('first') == 1.0
+    assert cache.get('third') == 3.0
+    assert cache.summary()['evictions'] == 1
+
+
+def test_exact_keys_hold_every_feature(trip):
+    cache = PredictionCache(FEATURE_NAMES)
+    nearby = dict(trip, pickup_latitude=trip['pickup_latitude'] + 1e-6)
+    assert cache.make_key(SimpleNamespace(**trip)) == cache.make_key(SimpleNamespace(**trip))
+    assert cache.make_key(SimpleNamespace(**trip)) != cache.make_key(SimpleNamespace(**nearby))
+
+
+def test_quantized_keys_round_the_coordinates(trip):
+    cache = PredictionCache(FEATURE_NAMES, coordinate_decimals=3)
+    key = cache.make_key(SimpleNamespace(**trip))
+    # the coordinates round to the same values, the distances are not in the key
+    nearby = dict(trip, pickup_latitude=trip['pickup_latitude'] + 0.0004,
+                  haversine_distance=trip['haversine_distance'] + 1)
+    assert cache.make_key(SimpleNamespace(**nearby)) == key
+    farther = dict(trip, pickup_latitude=trip['pickup_latitude'] + 0.001)
+    assert cache.make_key(SimpleNamespace(**farther)) != key
+    for name, value in [('vendor_id', 2), ('pickup_hour', 11), ('pickup_day', 3)]:
+        assert cache.make_key(SimpleNamespace(**dict(trip, **{name: value}))) != key
+
+
+def test_counts_move_between_processes(clock):
+    worker, parent = PredictionCache(FEATURE_NAMES, clock=clock), PredictionCache(FEATURE_NAMES, clock=clock)
+    worker.put('trip', 1.0)
+    worker.get('trip')
+    worker.get('other')
+    parent.add_counts(worker.take_counts())
+    assert (parent.hits, parent.misses) == (1, 1)
+    assert (worker.hits, worker.misses) == (0, 0)
+
+
+def test_cached_durations_are_kept_per_model_version(service, trip, monkeypatch, clock):
+    cache = PredictionCache(FEATURE_NAMES, clock=clock)
+    monkeypatch.setattr(service, 'prediction_cache', cache)
+    bundle = service.model_registry.active
+    monkeypatch.setattr(service.model_registry, 'active', bundle)
+    trips = [PredictionDataset(**trip)]
+
+    version, durations = service.predict_trips(trips)
+    assert service.predict_trips(trips) == (version, durations)
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # a new version never answers from the entries of the previous one
+    service.model_registry.active = replace(bundle, version='newer')
+    assert service.predict_trips(trips) == ('newer', durations)
+    assert (cache.hits, cache.misses) == (1, 2)
+    assert cache.summary()['size'] == 2
@@ -0,0 +1,48 @@
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.serving.compiled_preprocessor import CompiledPreprocessor, check_parity
+
+# artifacts shipped with the container
+artifacts_path = Path(__file__).parent.parent / 'container_models'
+
+
+@pytest.fixture(scope='module')
+def preprocessor():
+    return joblib.load(artifacts_path / 'transformers' / 'preprocessor.joblib')
+
+
+@pytest.fixture(scope='module')
+def compiled(preprocessor):
+    return CompiledPreprocessor.from_column_transformer(preprocessor)
+
+
+@pytest.fixture(scope='module')
+def probe(compiled):
+    # values around the fitted statistics and unseen categories
+    return compiled.make_probe(n_rows=10000)
+
+
+def test_transform_matches_column_transformer(preprocessor, compiled, probe):
+    expected = np.asarray(preprocessor.transform(pd.DataFrame(probe, columns=compiled.input_names)),
+                          dtype=np.float32)
+    actual = compiled.transform(probe)
+    assert actual.shape == expected.shape
+    assert np.max(np.abs(expected - actual)) == 0
+
+
+def test_predictions_match_column_transformer(preprocessor, compiled, probe):
+    model = joblib.load(artifacts_path / 'models' / 'xgbreg.joblib')
+    assert check_parity(preprocessor, compiled, X=probe, model=model, atol=0) == 0
+
+
+def test_arrays_round_trip(compiled, probe):
+    restored = CompiledPreprocessor.from_arrays(compiled.to_arrays(prefix='preprocessor_'),
+                                                prefix='preprocessor_')
+    assert restored.input_names == compiled.input_names
+    assert restored.output_names == compiled.output_names
+    assert np.max(np.abs(restored.transform(probe) - compiled.transform(probe))) == 0
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+from sklearn.metrics import r2_score, mean_squared_error, mean_absolute_error, mean_squared_log_error
+
+from src.models.evaluation import RegressionMetrics
+
+
+@pytest.fixture(scope='module')
+def data():
+    # durations in minutes with noisy predictions and a slice of every row
+    rng = np.random.default_rng(0)
+    actual = rng.lognormal(mean=2.5, sigma=0.6, size=50000)
+    predicted = np.clip(actual + rng.normal(scale=3.0, size=len(actual)), 0, None)
+    slices = rng.integers(0, 24, size=len(actual))
+    return actual, predicted, slices
+
+
+def sklearn_metrics(actual: np.ndarray, predicted: np.ndarray) -> dict:
+    return {'rows': len(actual),
+            'r2': r2_score(actual, predicted),
+            'rmse': np.sqrt(mean_squared_error(actual, predicted)),
+            'mae': mean_absolute_error(actual, predicted),
+            'rmsle': np.sqrt(mean_squared_log_error(actual, predicted))}
+
+
+def assert_metrics_equal(result: dict, expected: dict):
+    assert result['rows'] == expected['rows']
+    for name in ['r2', 'rmse', 'mae', 'rmsle']:
+        assert result[name] == pytest.approx(expected[name], rel=1e-9), name
+
+
+def test_merged_chunk_states_match_sklearn(data):
+    actual, predicted, _ = data
+    # every chunk in its own state, combined in an uneven order
+    bounds = [0, 7, 1000, 1001, 20000, 33333, len(actual)]
+    states = []
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        state = RegressionMetrics()
+        state.update(actual[start:stop], predicted[start:stop])
+        states.append(state)
+    merged = RegressionMetrics()
+    for state in states[3:] + states[:3]:
+        merged.merge(state)
+    assert_metrics_equal(merged.results()[0], sklearn_metrics(actual, predicted))
+
+
+def test_chunked_updates_match_sklearn(data):
+    actual, predicted, _ = data
+    metrics = RegressionMetrics()
+    for start in range(0, len(actual), 4096):
+        metrics.update(actual[start:start + 4096], predicted[start:start + 4096])
+    assert_metrics_equal(metrics.results()[0], sklearn_metrics(actual, predicted))
+
+
+def test_slices_match_sklearn_on_every_slice(data):
+    actual, predicted, slices = data
+    halves = [RegressionMetrics(24), RegressionMetrics(24)]
+    middle = len(actual) // 2
+    halves[0].update(actual[:middle], predicted[:middle], slices=slices[:middle])
+    halves[1].update(actual[middle:], predicted[middle:], slices=slices[middle:])
+    results = halves[0].merge(halves[1]).results()
+    for ind, result in enumerate(results):
+        rows = slices == ind
+        assert_metrics_equal(result, sklearn_metrics(actual[rows], predicted[rows]))
+
+
+def test_empty_slices_have_no_metrics():
+    metrics = RegressionMetrics(3)
+    metrics.update([10.0, 12.0], [11.0, 12.0], slices=np.array([0, 0]))
+    assert metrics.results()[1] == {'rows': 0, 'r2': None, 'rmse': None, 'mae': None, 'rmsle': None}
+    # a slice of one row has no variance, so no R²
+    metrics.update([5.0], [6.0], slices=np.array([2]))
+    assert metrics.results()[2]['r2'] is None
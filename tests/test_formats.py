@@ -0,0 +1,125 @@
+import msgpack
+import numpy as np
+import pyarrow
+import pyarrow.ipc
+import pytest
+
+from src.serving import formats
+from src.serving.formats import JSON, MSGPACK, ARROW, UnsupportedFormat
+
+
+def arrow_body(columns: dict) -> bytes:
+    table = pyarrow.table(columns)
+    sink = pyarrow.BufferOutputStream()
+    with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def read_arrow(body: bytes) -> dict:
+    return pyarrow.ipc.open_stream(body).read_all().to_pydict()
+
+
+@pytest.fixture
+def columns(trip) -> dict:
+    # two trips as columns, the second one longer
+    second = dict(trip, vendor_id=2, haversine_distance=8.0)
+    return {name: [trip[name], second[name]] for name in trip}
+
+
+@pytest.fixture
+def json_durations(client, columns) -> list:
+    return client.post('/predictions/columnar', json=columns).json()['durations']
+
+
+def test_formats_follow_the_headers():
+    assert formats.request_format(None) == JSON
+    assert formats.request_format('application/x-msgpack') == MSGPACK
+    assert formats.request_format('Application/JSON; charset=utf-8') == JSON
+    with pytest.raises(UnsupportedFormat):
+        formats.request_format('text/csv')
+    # the first supported type in the order listed, the request format for wildcards
+    assert formats.response_format('text/html, application/msgpack, application/json') == MSGPACK
+    assert formats.response_format('*/*', default=ARROW) == ARROW
+    assert formats.response_format(None, default=MSGPACK) == MSGPACK
+    with pytest.raises(UnsupportedFormat):
+        formats.response_format('text/csv')
+
+
+def test_unknown_content_type_is_refused(client, columns):
+    response = client.post('/predictions/columnar', content=b'a,b', headers={'Content-Type': 'text/csv'})
+    assert response.status_code == 415
+
+
+def test_unsupported_accept_is_refused(client, columns):
+    response = client.post('/predictions/columnar', json=columns, headers={'Accept': 'text/csv'})
+    assert response.status_code == 406
+
+
+def test_msgpack_round_trip(client, columns, json_durations):
+    for path, body in [('/predictions/columnar', columns),
+                       ('/predictions/batch', {'trips': [dict(zip(columns, values))
+                                                         for values in zip(*columns.values())]})]:
+        response = client.post(path, content=msgpack.packb(body),
+                               headers={'Content-Type': MSGPACK, 'Accept': MSGPACK})
+        assert response.status_code == 200
+        assert response.headers['content-type'] == MSGPACK
+        assert msgpack.unpackb(response.content)['durations'] == json_durations
+
+
+def test_arrow_round_trip(client, columns, json_durations):
+    response = client.post('/predictions/columnar', content=arrow_body(columns),
+                           headers={'Content-Type': ARROW, 'Accept': ARROW})
+    assert response.status_code == 200
+    assert response.headers['content-type'] == ARROW
+    assert read_arrow(response.content)['duration'] == json_durations
+    # answered in JSON when asked
+    response = client.post('/predictions/columnar', content=arrow_body(columns),
+                           headers={'Content-Type': ARROW, 'Accept': JSON})
+    assert response.json()['durations'] == json_durations
+
+
+def test_arrow_response_has_the_gate_columns():
+    body = formats.encode_response({'durations': [1.5, None], 'out_of_range': [False, True]}, ARROW)
+    assert read_arrow(body) == {'duration': [1.5, None], 'out_of_range': [False, True]}
+
+
+@pytest.mark.parametrize('change', [
+    lambda columns: dict(columns, vendor_id=1),
+    lambda columns: dict(columns, vendor_id=None),
+    lambda columns: dict(columns, vendor_id=[1, None]),
+    lambda columns: dict(columns, vendor_id=['one', 'two']),
+    lambda columns: dict(columns, vendor_id=[1]),
+    lambda columns: {name: values for name, values in columns.items() if name != 'vendor_id'},
+    lambda columns: {'trips': [{'vendor_id': 1}]},
+    lambda columns: [1, 2],
+])
+def test_invalid_msgpack_columns_are_refused(client, columns, change):
+    response = client.post('/predictions/columnar', content=msgpack.packb(change(columns)),
+                           headers={'Content-Type': MSGPACK})
+    assert response.status_code == 422
+
+
+@pytest.mark.parametrize('change', [
+    lambda columns: dict(columns, vendor_id=[1, None]),
+    lambda columns: dict(columns, pickup_latitude=[40.75, None]),
+    lambda columns: dict(columns, vendor_id=['one', 'two']),
+    lambda columns: {name: values for name, values in columns.items() if name != 'vendor_id'},
+])
+def test_invalid_arrow_columns_are_refused(client, columns, change):
+    response = client.post('/predictions/columnar', content=arrow_body(change(columns)),
+                           headers={'Content-Type': ARROW})
+    assert response.status_code == 422
+
+
+def test_invalid_binary_bodies_are_refused(client):
+    for fmt in [MSGPACK, ARROW]:
+        response = client.post('/predictions/columnar', content=b'\xc1 not a body',
+                               headers={'Content-Type': fmt})
+        assert response.status_code == 422
+
+
+def test_decoded_columns_are_float64(columns):
+    decoded = formats.decode_columns(msgpack.packb(columns), MSGPACK, list(columns))
+    assert all(column.dtype == np.float64 for column in decoded.values())
+    np.testing.assert_array_equal(decoded['haversine_distance'], columns['haversine_distance'])
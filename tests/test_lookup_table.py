@@ -0,0 +1,102 @@
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.models.build_lookup_table import (build_table, error_report, make_grid_features,
+                                           read_lookup_params)
+from src.models.scoring_utils import predict_minutes
+from src.serving.lookup_table import DurationLookupTable
+
+# artifacts shipped with the container
+artifacts_path = Path(__file__).parent.parent / 'container_models'
+
+
+@pytest.fixture(scope='module')
+def artifacts():
+    transformers_path = artifacts_path / 'transformers'
+    return {'model': joblib.load(artifacts_path / 'models' / 'xgbreg.joblib'),
+            'preprocessor': joblib.load(transformers_path / 'preprocessor.joblib'),
+            'output_transformer': joblib.load(transformers_path / 'output_transformer.joblib'),
+            'bounds': joblib.load(transformers_path / 'outliers.joblib').quantiles_}
+
+
+@pytest.fixture(scope='module')
+def small_grid(artifacts):
+    # a 2 x 2 grid keeps the table small enough to build in the test
+    lookup_params = dict(read_lookup_params(), grid_size=2)
+    grid = build_table(artifacts['model'], artifacts['preprocessor'], artifacts['output_transformer'],
+                       bounds=artifacts['bounds'], lookup_params=lookup_params)
+    return grid, lookup_params
+
+
+@pytest.fixture(scope='module')
+def center_trips(artifacts, small_grid) -> pd.DataFrame:
+    # every dropoff cell x hour x weekday x vendor from the last pickup cell
+    grid, lookup_params = small_grid
+    input_names = list(artifacts['preprocessor'].feature_names_in_)
+    X = make_grid_features(grid, 3, input_names, lookup_params)
+    return pd.DataFrame(X, columns=input_names).astype({'vendor_id': int,
+                                                        'pickup_hour': int,
+                                                        'pickup_day': int})
+
+
+def test_table_matches_the_model_at_the_cell_centers(artifacts, small_grid, center_trips):
+    grid, _ = small_grid
+    expected = predict_minutes(artifacts['model'], artifacts['preprocessor'],
+                               artifacts['output_transformer'], center_trips)
+    actual = grid.lookup({name: center_trips[name].to_numpy() for name in center_trips.columns})
+    # the table is stored as float16
+    np.testing.assert_allclose(actual, expected, rtol=1e-3)
+
+
+def test_vendors_have_their_own_slots(small_grid, center_trips):
+    grid, _ = small_grid
+    columns = {name: center_trips[name].to_numpy()[:1] for name in center_trips.columns}
+    durations = [grid.lookup(dict(columns, vendor_id=[vendor_id]))[0] for vendor_id in grid.vendor_ids]
+    assert len(set(durations)) == len(grid.vendor_ids)
+
+
+def test_unknown_vendor_is_refused(small_grid, center_trips):
+    grid, _ = small_grid
+    columns = {name: center_trips[name].to_numpy()[:1] for name in center_trips.columns}
+    with pytest.raises(ValueError):
+        grid.lookup(dict(columns, vendor_id=[3]))
+
+
+def test_error_report_against_the_model(artifacts, small_grid, center_trips):
+    grid, _ = small_grid
+    report = error_report(grid, artifacts['model'], artifacts['preprocessor'],
+                          artifacts['output_transformer'], center_trips)
+    assert report['rows'] == len(center_trips)
+    assert report['outside_grid_fraction'] == 0
+    assert report['table_vs_model']['mae'] < 0.05
+
+
+def test_save_and_load_round_trip(small_grid, tmp_path):
+    grid, _ = small_grid
+    grid.save(tmp_path / 'duration_table.npy')
+    loaded = DurationLookupTable.load(tmp_path / 'duration_table.npy')
+    assert loaded.grid_size == grid.grid_size
+    assert loaded.vendor_ids == grid.vendor_ids
+    np.testing.assert_array_equal(loaded.bounds, grid.bounds)
+    np.testing.assert_array_equal(loaded.table, grid.table)
+
+
+def test_fast_endpoint_uses_the_shipped_table(client, service, trip):
+    assert service.lookup_table is not None
+    body = {name: trip[name] for name in ['vendor_id', 'pickup_longitude', 'pickup_latitude',
+                                          'dropoff_longitude', 'dropoff_latitude',
+                                          'pickup_hour', 'pickup_day']}
+    response = client.post('/predictions/fast', json=body)
+    assert response.status_code == 200
+    expected = service.lookup_table.lookup({name: [value] for name, value in body.items()})[0]
+    assert response.json() == f"Trip duration for the trip is {expected:.2f} minutes"
+
+
+@pytest.mark.parametrize('change', [{'pickup_hour': 24}, {'pickup_day': 7}, {'vendor_id': 3}])
+def test_fast_endpoint_refuses_values_outside_the_table(client, trip, change):
+    response = client.post('/predictions/fast', json=dict(trip, **change))
+    assert response.status_code == 422
@@ -0,0 +1,82 @@
+import joblib
+import numpy as np
+import pytest
+
+from src.serving.outlier_gate import OutlierGate, MAX_TRIP_MINUTES
+
+
+@pytest.fixture
+def use_gate(service, monkeypatch):
+    # switch the service to a gate mode built from the shipped OutliersRemover
+    outliers_remover = joblib.load(service.outliers_path)
+
+    def use(mode: str) -> OutlierGate:
+        gate = None if mode == 'off' else OutlierGate.from_outliers_remover(outliers_remover, mode=mode)
+        monkeypatch.setattr(service, 'outlier_gate', gate)
+        return gate
+
+    return use
+
+
+@pytest.fixture
+def far_trip(trip) -> dict:
+    # pickup far outside the coordinates seen in training
+    return dict(trip, pickup_latitude=10.0, haversine_distance=7.0)
+
+
+def test_unknown_mode_is_refused():
+    with pytest.raises(ValueError):
+        OutlierGate(['pickup_latitude'], [0.0], [1.0], mode='drop')
+
+
+def test_fallback_durations_are_capped_like_the_target():
+    gate = OutlierGate(['pickup_latitude'], [0.0], [1.0], mode='fallback', fallback_speed_kmh=14.0)
+    np.testing.assert_allclose(gate.fallback_durations([7.0, 1000.0]), [30.0, MAX_TRIP_MINUTES])
+
+
+def test_off_scores_every_trip(client, use_gate, trip, far_trip):
+    use_gate('off')
+    response = client.post('/predictions', json=far_trip)
+    assert response.status_code == 200
+    assert 'x-out-of-range' not in response.headers
+    body = client.post('/predictions/batch', json={'trips': [trip, far_trip]}).json()
+    assert 'out_of_range' not in body
+    assert all(duration is not None for duration in body['durations'])
+
+
+def test_flag_scores_and_reports_out_of_range_trips(client, use_gate, trip, far_trip):
+    gate = use_gate('flag')
+    response = client.post('/predictions', json=far_trip)
+    assert response.status_code == 200
+    assert response.headers['x-out-of-range'] == 'true'
+    assert client.post('/predictions', json=trip).headers['x-out-of-range'] == 'false'
+    body = client.post('/predictions/batch', json={'trips': [trip, far_trip]}).json()
+    assert body['out_of_range'] == [False, True]
+    assert all(duration is not None for duration in body['durations'])
+    assert (gate.checked, gate.out_of_range) == (4, 2)
+
+
+def test_reject_refuses_out_of_range_trips(client, use_gate, trip, far_trip):
+    use_gate('reject')
+    assert client.post('/predictions', json=far_trip).status_code == 422
+    assert client.post('/predictions', json=trip).status_code == 200
+    body = client.post('/predictions/batch', json={'trips': [trip, far_trip, trip]}).json()
+    assert body['out_of_range'] == [False, True, False]
+    assert body['durations'][1] is None
+    assert body['durations'][0] == body['durations'][2] is not None
+    columns = {name: [trip[name], far_trip[name]] for name in trip}
+    assert client.post('/predictions/columnar', json=columns).json()['durations'][1] is None
+
+
+def test_fallback_estimates_out_of_range_trips(client, use_gate, trip, far_trip):
+    use_gate('fallback')
+    response = client.post('/predictions', json=far_trip)
+    assert response.status_code == 200
+    assert response.headers['x-out-of-range'] == 'true'
+    # 7 km at the default 14 km/h
+    assert response.json() == "Trip duration for the trip is 30.00 minutes"
+    very_far_trip = dict(far_trip, haversine_distance=1000.0)
+    body = client.post('/predictions/batch', json={'trips': [trip, far_trip, very_far_trip]}).json()
+    assert body['out_of_range'] == [False, True, True]
+    assert body['durations'][1:] == [30.0, MAX_TRIP_MINUTES]
+    assert body['durations'][0] is not None
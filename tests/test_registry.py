@@ -0,0 +1,129 @@
+import shutil
+from dataclasses import replace
+from pathlib import Path
+
+import pytest
+
+from src.serving.registry import ModelBundle, ModelRegistry, publish
+
+# artifacts shipped with the container
+artifacts_path = Path(__file__).parent.parent / 'container_models'
+
+
+def write_artifacts(path: Path, name: str) -> Path:
+    # a fake artifacts directory, the model file holds the name of the model
+    (path / 'models').mkdir(parents=True)
+    (path / 'models' / 'model.txt').write_text(name)
+    return path
+
+
+class FakeLoader:
+    # loads the name written by write_artifacts and counts the loads
+    def __init__(self):
+        self.loads = []
+
+    def __call__(self, version_path: Path, version: str) -> ModelBundle:
+        self.loads.append(version)
+        return ModelBundle(version=version, model=(version_path / 'models' / 'model.txt').read_text())
+
+
+@pytest.fixture
+def loader():
+    return FakeLoader()
+
+
+@pytest.fixture
+def registry(tmp_path, loader):
+    return ModelRegistry(registry_path=tmp_path / 'registry', load_version=loader)
+
+
+def test_publish_renames_a_complete_copy_into_place(tmp_path):
+    registry_path = tmp_path / 'registry'
+    version_path = publish(write_artifacts(tmp_path / 'trained', 'first'), registry_path, 'v001')
+    assert version_path == registry_path / 'v001'
+    assert (version_path / 'models' / 'model.txt').read_text() == 'first'
+    # nothing is left under the hidden staging name
+    assert [path.name for path in registry_path.iterdir()] == ['v001']
+    with pytest.raises(FileExistsError):
+        publish(tmp_path / 'trained', registry_path, 'v001')
+
+
+def test_latest_version_is_activated_and_swapped(tmp_path, registry):
+    publish(write_artifacts(tmp_path / 'first', 'first'), registry.registry_path, 'v001')
+    assert registry.refresh()
+    assert registry.active.version == 'v001'
+    assert not registry.refresh()
+
+    publish(write_artifacts(tmp_path / 'second', 'second'), registry.registry_path, 'v002')
+    assert registry.refresh()
+    assert (registry.active.version, registry.active.model) == ('v002', 'second')
+    assert registry.swaps == 1
+
+
+def test_removing_the_latest_version_rolls_back(tmp_path, registry):
+    publish(write_artifacts(tmp_path / 'first', 'first'), registry.registry_path, 'v001')
+    publish(write_artifacts(tmp_path / 'second', 'second'), registry.registry_path, 'v002')
+    registry.refresh()
+    shutil.rmtree(registry.registry_path / 'v002')
+    assert registry.refresh()
+    assert registry.active.version == 'v001'
+
+
+def test_broken_version_is_skipped_until_its_files_change(tmp_path, registry, loader):
+    publish(write_artifacts(tmp_path / 'first', 'first'), registry.registry_path, 'v001')
+    registry.refresh()
+    # a version copied without publish, seen before its model file is written
+    broken_path = registry.registry_path / 'v002'
+    (broken_path / 'models').mkdir(parents=True)
+    assert not registry.refresh()
+    assert registry.active.version == 'v001'
+    assert 'v002' in registry.failed_versions
+
+    # not loaded again while the files stay the same
+    assert not registry.refresh()
+    assert loader.loads.count('v002') == 1
+
+    (broken_path / 'models' / 'model.txt').write_text('second')
+    assert registry.refresh()
+    assert registry.active.version == 'v002'
+    assert registry.failed_versions == {}
+
+
+def test_shipped_artifacts_load_from_the_registry(tmp_path, service):
+    registry = ModelRegistry(registry_path=tmp_path / 'registry',
+                             load_version=lambda path, version: service.load_bundle(path, version))
+    publish(artifacts_path, registry.registry_path, 'v001')
+    publish(artifacts_path, registry.registry_path, 'v002')
+    assert registry.refresh()
+    assert registry.active.version == 'v002'
+    assert registry.active.load_timings['warm_up'] > 0
+
+
+def test_version_header_names_the_version_that_scored(client, service, trip, monkeypatch):
+    arrival_bundle = service.model_registry.active
+    scoring_bundle = replace(arrival_bundle, version='scoring')
+    newer_bundle = replace(arrival_bundle, version='newer')
+    parse_json, score_trips = service.parse_json, service.score_trips
+
+    def parse_then_swap(model, body):
+        # a version is activated after the request arrived and before it is scored
+        parsed = parse_json(model, body)
+        service.model_registry.active = scoring_bundle
+        return parsed
+
+    def score_then_swap(trips, bundle):
+        # and another one while the request is being scored
+        durations = score_trips(trips, bundle)
+        service.model_registry.active = newer_bundle
+        return durations
+
+    monkeypatch.setattr(service, 'parse_json', parse_then_swap)
+    monkeypatch.setattr(service, 'score_trips', score_then_swap)
+    monkeypatch.setattr(service.model_registry, 'active', arrival_bundle)
+    for path, body in [('/predictions', trip), ('/predictions/batch', {'trips': [trip]})]:
+        service.model_registry.active = arrival_bundle
+        response = client.post(path, json=body)
+        assert response.status_code == 200
+        assert response.headers['x-model-version'] == 'scoring'
+    # responses that score nothing carry the active version
+    assert client.get('/health/live').headers['x-model-version'] == 'newer'
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.data.storage import ChunkWriter, iter_chunks, read_data, write_data
+
+pa = pytest.importorskip('pyarrow')
+
+
+@pytest.fixture
+def dataframe() -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({'vendor_id': rng.integers(1, 3, 1000),
+                         'pickup_latitude': rng.normal(40.75, 0.03, 1000)})
+
+
+@pytest.mark.parametrize('extension', ['.csv', '.parquet', '.feather'])
+def test_round_trip(dataframe, tmp_path, extension):
+    path = tmp_path / f'data{extension}'
+    write_data(dataframe, path)
+    pd.testing.assert_frame_equal(read_data(path), dataframe)
+
+
+@pytest.mark.parametrize('extension', ['.csv', '.parquet', '.feather'])
+def test_chunks_round_trip(dataframe, tmp_path, extension):
+    path = tmp_path / f'data{extension}'
+    with ChunkWriter(path) as writer:
+        for offset in range(0, len(dataframe), 300):
+            writer.write(dataframe.iloc[offset:offset + 300])
+    chunks = list(iter_chunks(path, chunksize=400))
+    assert [len(chunk) for chunk in chunks] == [400, 400, 200]
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), dataframe)
+
+
+def test_feather_is_read_without_copies(dataframe, tmp_path):
+    import pyarrow.feather as feather
+
+    path = tmp_path / 'data.feather'
+    write_data(dataframe, path)
+    # compressed columns would be decompressed into new buffers
+    allocated = pa.total_allocated_bytes()
+    table = feather.read_table(path, memory_map=True)
+    assert pa.total_allocated_bytes() == allocated
+    assert table.num_rows == len(dataframe)
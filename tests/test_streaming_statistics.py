@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.features.tdigest import TDigest
+from src.features.sampling import ReservoirSample
+
+QUANTILES = np.array([0.001, 0.002, 0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99, 0.998, 0.999])
+
+
+@pytest.fixture(scope='module')
+def values() -> np.ndarray:
+    # skewed like trip durations, with missing values
+    rng = np.random.default_rng(0)
+    values = rng.lognormal(mean=2.5, sigma=0.8, size=200000)
+    values[rng.choice(len(values), 1000, replace=False)] = np.nan
+    return values
+
+
+def rank_errors(values: np.ndarray, estimates: np.ndarray) -> np.ndarray:
+    # distance between the target quantiles and the fraction of values below the estimates
+    finite = np.sort(values[~np.isnan(values)])
+    return np.abs(np.searchsorted(finite, estimates) / len(finite) - QUANTILES)
+
+
+def test_quantiles_match_nanquantile(values):
+    digest = TDigest().update(values)
+    estimates = digest.quantile(QUANTILES)
+    assert rank_errors(values, estimates).max() < 0.001
+    np.testing.assert_allclose(estimates, np.nanquantile(values, QUANTILES), rtol=0.01)
+    # the extremes are exact and the memory is bounded
+    assert digest.quantile([0.0, 1.0]).tolist() == [np.nanmin(values), np.nanmax(values)]
+    assert digest.count == np.count_nonzero(~np.isnan(values))
+    assert len(digest.means) <= digest.compression
+
+
+def test_merged_sketches_match_a_single_sketch(values):
+    single = TDigest().update(values)
+    merged = TDigest()
+    for chunk in np.array_split(values, 13):
+        merged.merge(TDigest().update(chunk))
+    assert merged.count == single.count
+    assert (merged.min, merged.max) == (single.min, single.max)
+    assert rank_errors(values, merged.quantile(QUANTILES)).max() < 0.001
+    np.testing.assert_allclose(merged.quantile(QUANTILES), single.quantile(QUANTILES), rtol=0.01)
+
+
+def test_empty_sketch_has_no_quantiles():
+    digest = TDigest().update([np.nan])
+    assert np.isnan(digest.quantile([0.5])).all()
+    assert digest.merge(TDigest()).count == 0
+
+
+def test_reservoir_does_not_depend_on_the_chunks():
+    stream = pd.DataFrame({'value': np.arange(100000)})
+    whole = ReservoirSample(size=5000, random_state=1).update(stream)
+    chunked = ReservoirSample(size=5000, random_state=1)
+    for start in range(0, len(stream), 7919):
+        chunked.update(stream.iloc[start:start + 7919])
+    assert chunked.rows_seen == len(stream)
+    pd.testing.assert_frame_equal(chunked.sample, whole.sample)
+
+
+def test_reservoir_is_a_uniform_sample():
+    stream = pd.DataFrame({'value': np.arange(100000)})
+    reservoir = ReservoirSample(size=5000, random_state=2)
+    for start in range(0, len(stream), 5000):
+        reservoir.update(stream.iloc[start:start + 5000])
+    sample = reservoir.sample['value'].to_numpy()
+    assert len(sample) == 5000
+    # distinct rows of the stream, kept in stream order
+    assert (np.diff(sample) > 0).all()
+    # every tenth of the stream holds about a tenth of the sample
+    counts = np.bincount(sample // 10000, minlength=10)
+    assert np.abs(counts - 500).max() < 100
+
+
+def test_reservoir_keeps_short_streams_whole():
+    reservoir = ReservoirSample(size=100, random_state=0).update(pd.DataFrame({'value': range(10)}))
+    assert reservoir.sample['value'].tolist() == list(range(10))